@@ -0,0 +1,80 @@
+'''Compares the regex parsers that were used for the changes page and
+the staff directory with the tokenizer-based ones from html_parsers.
+Pages of growing size are built by repeating the fixtures' contents;
+the time per kilobyte should stay flat for a linear-time parser.
+
+Run from the repository root: python -m __tests__.bench_parsers'''
+import re
+import timeit
+from html_parsers import ChangesParser, StaffParser
+
+
+sect_ptn = re.compile('ИЗМЕНЕНИЯ В РАСПИСАНИИ НА '
+                      '([А-Я]+), ([0-9]+) ([А-Я]+)\\s*?'
+                      '</h1>(.+?)(?=(?:</body>|<h1>))', re.S)
+class_chg_ptn = re.compile('<h2>([0-9]{1,2}[А-Яа-я])</h2>'
+                           '(.+?)(?=(?:<h2>|$))', re.S)
+chg_item_ptn = re.compile('<p>([^<]+?)</p>')
+info_ptn = re.compile('<tr>'
+                      '<td>([^<]+?)</td>'
+                      '<td>([^<]+?)</td>'
+                      '<td>([^<]+?)</td>'
+                      '<td class=\'c\'>')
+
+sizes = (1, 10, 100, 1000)
+repeat = 3
+
+
+def regex_changes(page: str) -> list:
+    days = []
+    for wkday, day, month, content in sect_ptn.findall(page):
+        chg_obj = {'wkday': wkday, 'day': day, 'month': month.lower()}
+        for cls, chg_content in class_chg_ptn.findall(content):
+            chg_obj[cls.upper()] = [i.replace('&nbsp;&mdash;', ' –')
+                                    for i in chg_item_ptn.findall(chg_content)]
+        days.append(chg_obj)
+    return days
+
+
+def regex_staff(page: str) -> list:
+    return info_ptn.findall(page.replace('&nbsp;', ' '))
+
+
+def changes_page(n: int) -> str:
+    with open('__tests__/test_files/changes.html') as f:
+        page = f.read()
+    head, rest = page.split('<body>')
+    body, tail = rest.split('</body>')
+    return head + '<body>' + body * n + '</body>' + tail
+
+
+def staff_page(n: int) -> str:
+    rows = []
+    for name in ('single_teacher_data.html', 'double_teacher_data.html'):
+        with open('__tests__/test_files/' + name) as f:
+            rows += re.findall('<tr><td>.+?</tr>', f.read())
+    return '<table>' + ''.join(rows) * n + '</table>'
+
+
+def bench(name: str, build, old, new):
+    print(name)
+    print('{:>6} {:>10} {:>14} {:>14}'.format('size', 'KB',
+                                              'regex us/KB',
+                                              'tokenizer us/KB'))
+    for n in sizes:
+        page = build(n)
+        kb = len(page.encode()) / 1024
+        t_old = min(timeit.repeat(lambda: old(page), number=1,
+                                  repeat=repeat))
+        t_new = min(timeit.repeat(lambda: new(page), number=1,
+                                  repeat=repeat))
+        print('{:>6} {:>10.1f} {:>14.1f} {:>14.1f}'.format(
+            n, kb, t_old / kb * 1e6, t_new / kb * 1e6))
+    print()
+
+
+if __name__ == '__main__':
+    bench('changes.html', changes_page,
+          regex_changes, lambda page: ChangesParser().parse(page))
+    bench('staff directory', staff_page,
+          regex_staff, lambda page: StaffParser().parse(page))
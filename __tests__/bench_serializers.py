@@ -0,0 +1,57 @@
+'''Compares the JSON backends of `serializer` on the fixtures' timetables,
+teachers and vacant rooms scaled up to a school of growing size: encoding
+for storage (canonical), encoding a payload and decoding, plus decoding
+with the lesson pool's hook.
+
+Run from the repository root: python -m __tests__.bench_serializers'''
+import json
+import timeit
+from lessons import LessonPool
+from serializer import backends
+
+sizes = (1, 10, 100)
+repeat = 5
+
+
+def load(name: str):
+    with open('__tests__/test_files/' + name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def school(n: int) -> dict:
+    '''Returns the data of a school with `n` times the fixtures' classes
+    and teachers'''
+    tmtbl = load('act_perm_timetable.json')
+    tchrs = load('act_teachers.json')
+    return {'full_perm_timetable': {'{}{}'.format(i, j): tmtbl
+                                    for i in range(n) for j in 'АБВ'},
+            'teachers': [dict(t, abbr='{}{}'.format(t.get('abbr'), i))
+                         for i in range(n) for t in tchrs],
+            'vacant_rooms': load('act_vacant_rooms.json') * n}
+
+
+def bench(name: str, serializer):
+    canon = serializer.encoder(sort_keys=True)
+    encoder = serializer.encoder()
+    hook = LessonPool().hook
+    print(name)
+    print('{:>6} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'size', 'KB', 'canon us', 'encode us', 'decode us', 'hook us'))
+    for n in sizes:
+        data = school(n)
+        text = canon.encode(data)
+        kb = len(text.encode()) / 1024
+        times = [min(timeit.repeat(func, number=1, repeat=repeat)) * 1e6
+                 for func in (lambda: canon.encode(data),
+                              lambda: encoder.encode(data),
+                              lambda: serializer.loads(text),
+                              lambda: serializer.loads(text,
+                                                       object_hook=hook))]
+        print('{:>6} {:>10.1f} {:>10.0f} {:>10.0f} {:>10.0f} {:>10.0f}'
+              .format(n, kb, *times))
+    print()
+
+
+if __name__ == '__main__':
+    for name, backend in backends.items():
+        bench(name, backend())
@@ -0,0 +1,171 @@
+import json
+import unittest
+from httmock import HTTMock, all_requests
+import requests
+from cache import Fingerprints, ResponseCache, HOUR
+from session import ApiSession
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.storage = {}
+        self.now = 1000000
+        self.cache = ResponseCache(self.storage, clock=lambda: self.now)
+        self.session = ApiSession(cache=self.cache, sleep=lambda s: None,
+                                  rate=None)
+        self.calls = []
+
+    def tearDown(self):
+        self.session.close()
+
+    def count(self, resp):
+        @all_requests
+        def handler(url, req):
+            self.calls.append(req.body)
+            return resp
+        return handler
+
+    def test_key(self):
+        url = 'http://lyceum.urfu.ru/offic/?id=6'
+        self.assertEqual(self.cache.key('get', url),
+                         self.cache.key('GET', url))
+        self.assertNotEqual(self.cache.key('POST', url, 'famStaff=a'),
+                            self.cache.key('POST', url, b'famStaff=b'))
+        self.assertTrue(self.cache.key('GET', url).startswith('cache/'))
+
+    def test_ttl(self):
+        url = 'http://lyceum.urfu.ru/study/mobile.php?f=1&k=8a'
+        with HTTMock(self.count({'status_code': 200,
+                                 'content': '{"8a": "timetable"}',
+                                 'headers': {'ETag': '"abc"'}})):
+            resp1 = self.session.get(url)
+            self.now += HOUR - 1
+            resp2 = self.session.get(url)
+            self.assertEqual(len(self.calls), 1)
+
+            self.now += 2
+            self.session.get(url)
+            self.assertEqual(len(self.calls), 2)
+
+        self.assertEqual(resp1.text, resp2.text)
+        self.assertEqual(resp2.status_code, 200)
+        self.assertEqual(resp2.headers['etag'], '"abc"')
+        self.assertEqual(len(self.storage), 1)
+
+    def test_body(self):
+        url = 'http://lyceum.urfu.ru/offic/?id=6'
+        with HTTMock(self.count('directory')):
+            self.session.post(url, data='famStaff=a')
+            self.session.post(url, data='famStaff=b')
+            self.session.post(url, data='famStaff=a')
+        self.assertListEqual(self.calls, ['famStaff=a', 'famStaff=b'])
+
+    def test_stale(self):
+        url = 'http://lyceum.urfu.ru/study/izmenHtml.php'
+        with HTTMock(self.count('changes')):
+            self.session.get(url)
+
+        self.now += HOUR
+        with HTTMock(self.count({'status_code': 503, 'content': ''})):
+            resp = self.session.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, 'changes')
+
+        self.now += self.cache.max_stale
+        with HTTMock(self.count({'status_code': 503, 'content': ''})):
+            resp = self.session.get(url)
+        self.assertEqual(resp.status_code, 503)
+
+        # Failed responses are not cached
+        entry = json.loads(next(iter(self.storage.values())))
+        self.assertEqual(entry['status'], 200)
+
+    def test_not_modified(self):
+        url = 'http://lyceum.urfu.ru/study/izmenHtml.php'
+        etag = {'If-None-Match': '"a"'}
+        with HTTMock(self.count({'status_code': 200, 'content': 'A',
+                                 'headers': {'ETag': '"a"'}})):
+            self.session.get(url)
+
+        # 304 is returned as is and renews the cached body it refers to
+        self.now += HOUR
+        with HTTMock(self.count({'status_code': 304, 'content': ''})):
+            resp = self.session.get(url, headers=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(self.session.get(url).text, 'A')
+        self.assertEqual(len(self.calls), 2)
+
+        # A cached body that the server didn't confirm is not served
+        self.now += HOUR
+        with HTTMock(self.count({'status_code': 200, 'content': 'B',
+                                 'headers': {'ETag': '"b"'}})):
+            self.session.get(url)
+        self.now += HOUR
+        with HTTMock(self.count({'status_code': 304, 'content': ''})):
+            resp = self.session.get(url, headers=etag)
+        self.assertEqual(resp.status_code, 304)
+        entry = json.loads(next(iter(self.storage.values())))
+        self.assertEqual(entry['time'], self.now - HOUR)
+
+        # Client errors are not replaced with stale responses either
+        with HTTMock(self.count({'status_code': 404, 'content': ''})):
+            self.assertEqual(self.session.get(url).status_code, 404)
+
+    def test_uncached(self):
+        url = 'http://example.com/'
+        with HTTMock(self.count('page')):
+            self.session.get(url)
+            self.session.get(url)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_binary(self):
+        url = 'http://lyceum.urfu.ru/study/calgraf.odt'
+        with open('__tests__/test_files/study_plan.odt', 'rb') as f:
+            data = f.read()
+
+        with HTTMock(self.count(data)):
+            self.session.get(url)
+            resp = self.session.get(url)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(resp.content, data)
+
+
+class TestFingerprints(unittest.TestCase):
+    def setUp(self):
+        self.storage = {}
+        self.fprs = Fingerprints(self.storage)
+
+    @staticmethod
+    def response(body: bytes, status: int = 200, **headers):
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers.update(headers)
+        resp._content = body
+        return resp
+
+    def test_fingerprints(self):
+        self.assertDictEqual(self.fprs.headers('changes'), {})
+        self.assertFalse(self.fprs.unchanged('changes',
+                                             self.response(b'body')))
+
+        self.fprs.save('changes', self.response(b'body'))
+        self.assertDictEqual(self.fprs.headers('changes'), {})
+        self.assertTrue(self.fprs.unchanged('changes',
+                                            self.response(b'body')))
+        self.assertFalse(self.fprs.unchanged('changes',
+                                             self.response(b'new body')))
+        self.assertFalse(self.fprs.unchanged('changes',
+                                             self.response(b'body', 500)))
+        self.assertFalse(self.fprs.unchanged('study_plan',
+                                             self.response(b'body')))
+
+    def test_validators(self):
+        modified = 'Tue, 26 Sep 2017 10:00:00 GMT'
+        self.fprs.save('changes', self.response(b'body',
+                                                ETag='"abc"',
+                                                **{'Last-Modified': modified}))
+        self.assertDictEqual(self.fprs.headers('changes'),
+                             {'If-None-Match': '"abc"',
+                              'If-Modified-Since': modified})
+        self.assertTrue(self.fprs.unchanged('changes',
+                                            self.response(b'', 304)))
@@ -0,0 +1,38 @@
+import unittest
+from checkpoint import Checkpoints
+from storage import MemoryStorage
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000000
+        self.storage = MemoryStorage()
+        self.ckpt = Checkpoints(self.storage, max_age=100,
+                                clock=lambda: self.now)
+
+    def test_resume(self):
+        self.ckpt.save('teachers', 'Учитель По Истории', {'abbr': 'И'})
+        self.ckpt.save('teachers', 'Учитель По Физике', None)
+        self.ckpt.save('other', 'Учитель По Химии', {'abbr': 'Х'})
+
+        self.assertDictEqual(
+            self.ckpt.load('teachers', ['Учитель По Истории',
+                                        'Учитель По Физике',
+                                        'Учитель По Химии']),
+            {'Учитель По Истории': {'abbr': 'И'},
+             'Учитель По Физике': None})
+
+    def test_expiry(self):
+        self.ckpt.save('full_perm_timetable', '8А', [[]])
+        self.now += 50
+        self.ckpt.save('full_perm_timetable', '9Б', [[]])
+        self.now += 60
+        self.assertListEqual(
+            list(self.ckpt.load('full_perm_timetable', ['8А', '9Б'])),
+            ['9Б'])
+
+    def test_clear(self):
+        self.ckpt.save('full_perm_timetable', '8А', [[]])
+        self.ckpt.save('full_perm_timetable', '9Б', [[]])
+        self.ckpt.clear('full_perm_timetable', ['8А', '9Б', '10В'])
+        self.assertDictEqual(dict(self.storage), {})
@@ -0,0 +1,83 @@
+import copy
+import json
+import unittest
+from compact import CompactEncoder, version
+from diff_computer import DiffComputer
+from encoder import NoWSEncoder
+from storage import MemoryStorage
+
+
+def load(name: str):
+    with open('__tests__/test_files/' + name, encoding='utf-8') as file:
+        return json.load(file)
+
+
+class TestCompactEncoder(unittest.TestCase):
+    def round_trip(self, key: str, value) -> dict:
+        payload = CompactEncoder(key).encode(copy.deepcopy(value))
+        payload = json.loads(json.dumps(payload))
+        self.assertEqual(CompactEncoder.decode(payload), value)
+        return payload
+
+    def test_full_perm_timetable(self):
+        tmtbl = load('act_perm_timetable.json')
+        full_tmtbl = {'8А': tmtbl, '8Б': tmtbl, '9А': None}
+        payload = self.round_trip('full_perm_timetable', full_tmtbl)
+        self.assertEqual(payload['v'], version)
+        self.assertListEqual(payload['fields'],
+                             ['name', 'teacher', 'room'])
+        self.assertListEqual(payload['data']['8А'][0][0], [[0, 1, 2]])
+        self.assertListEqual(payload['strings'][:3],
+                             ['История', 'Учитель П. И.', '101'])
+        self.assertEqual(len(payload['strings']),
+                         len(set(payload['strings'])))
+
+        encoder = NoWSEncoder()
+        self.assertLess(len(encoder.encode(payload)),
+                        len(encoder.encode(full_tmtbl)) / 2)
+
+    def test_teachers(self):
+        tchrs = load('act_teachers.json')
+        tchrs.append({'abbr': 't1', 'full': None})
+        payload = self.round_trip('teachers', tchrs)
+        self.assertIsInstance(payload['data'][0]['timetable'][0][0], list)
+
+        # Teachers' timetables are sent as the teachers
+        self.round_trip('teacher_timetables', tchrs)
+
+    def test_diff(self):
+        # Diffs have unchanged lessons and fields set to None, lessons
+        # without the expected fields are kept as they are
+        diff = {'8А': [[None, [{'name': 'maths', 'teacher': None,
+                                'room': None}]], None],
+                '8Б': [[[{'name': 'pe'}, 'ict']]]}
+        payload = self.round_trip('full_perm_timetable', diff)
+        self.assertListEqual(payload['strings'], ['maths'])
+        self.assertEqual(payload['data']['8Б'], diff['8Б'])
+
+        self.round_trip('class_teachers',
+                        {'8А': [{'teacher': 'Учитель П. И.',
+                                 'subject': 'История'}],
+                         '8Б': None})
+
+    def test_version(self):
+        payload = CompactEncoder('teachers').encode([])
+        payload['v'] = version + 1
+        with self.assertRaises(ValueError):
+            CompactEncoder.decode(payload)
+
+    def test_diff_computer(self):
+        comp = DiffComputer(MemoryStorage(), compact=True)
+        plain = DiffComputer(MemoryStorage())
+        tmtbl = {'8А': load('act_perm_timetable.json')}
+        for i in range(2):
+            diff = comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+            self.assertEqual(
+                CompactEncoder.decode(json.loads(diff)),
+                json.loads(plain.diff_full_perm_timetable(
+                    copy.deepcopy(tmtbl))))
+            tmtbl['8А'][0][0][0]['room'] = '999'
+
+        # Data without lessons is sent as is
+        self.assertEqual(json.loads(comp.diff_class_list({'8': ['8А']})),
+                         {'8': ['8А']})
@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from data_updater import DataUpdater
+
+
+class TestDataUpdater(unittest.TestCase):
+    def test_lazy_setup(self):
+        self.assertIsNone(DataUpdater.store)
+        self.assertIsNone(DataUpdater.gth)
+
+    def test_plan(self):
+        self.assertListEqual(DataUpdater.plan(['changes']), [])
+        self.assertListEqual(DataUpdater.plan(['teachers', 'class_list']),
+                             ['cls_list', 'full_tmtbl'])
+        self.assertListEqual(DataUpdater.plan(['teacher_timetables']),
+                             ['stored_tmtbl', 'dirty'])
+
+    def test_help(self):
+        env = dict(os.environ)
+        env.pop('DATABASE_URL', None)
+        env.pop('ONESIGNAL_AUTH', None)
+        out = subprocess.check_output([sys.executable, 'data_updater.py'],
+                                      env=env,
+                                      universal_newlines=True)
+        self.assertIn('Usage', out)
+        self.assertIn('class_teachers', out)
+
+    def test_light_import(self):
+        code = ('import sys, data_updater; '
+                'print(any(i in sys.modules for i in '
+                '("requests", "psycopg2", "odf")))')
+        out = subprocess.check_output([sys.executable, '-c', code],
+                                      universal_newlines=True)
+        self.assertEqual(out.strip(), 'False')
+
+    def test_run_many(self):
+        from unittest import mock
+        from diff_computer import DiffComputer
+        from gatherer import DataGatherer
+        from normalizer import Normalizer
+        from session import ApiSession
+        from storage import MemoryStorage
+
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            tmtbl = json.load(f)
+        requests = []
+
+        class Gatherer(DataGatherer):
+            def get_class_list(self, group=True, cls_list=None):
+                requests.append('cls_list')
+                return ['8А', '9Б']
+
+            def get_perm_timetable(self, cls):
+                requests.append(cls)
+                return tmtbl
+
+        gth = Gatherer(silent=True,
+                       session=ApiSession(sleep=lambda s: None, rate=None))
+        store = MemoryStorage()
+        with mock.patch.multiple(DataUpdater, store=store, gth=gth,
+                                 comp=DiffComputer(store),
+                                 norm=Normalizer()), \
+                mock.patch('data_updater.OneSignal.send') as send:
+            DataUpdater.run_many(['full_perm_timetable', 'class_teachers'])
+
+        # The timetables are fetched once for both commands
+        self.assertCountEqual(requests, ['cls_list', '8А', '9Б'])
+        self.assertListEqual([i[0][0] for i in send.call_args_list],
+                             ['full_perm_timetable', 'class_teachers'])
+
+    def test_fingerprint_after_diff(self):
+        from unittest import mock
+        from httmock import HTTMock, urlmatch
+        from cache import Fingerprints
+        from gatherer import DataGatherer
+        from normalizer import Normalizer
+        from session import ApiSession
+        from storage import MemoryStorage
+
+        @urlmatch(path='/study/izmenHtml.php')
+        def mock_changes(url, req):
+            with open('__tests__/test_files/changes.html') as f:
+                return f.read()
+
+        store = MemoryStorage()
+        fingerprints = Fingerprints(store)
+        gth = DataGatherer(silent=True,
+                           session=ApiSession(sleep=lambda s: None, rate=None),
+                           fingerprints=fingerprints)
+        comp = mock.Mock()
+        comp.diff_changes.side_effect = RuntimeError
+        with mock.patch.multiple(DataUpdater, store=store, gth=gth,
+                                 comp=comp, norm=Normalizer()), \
+                mock.patch('data_updater.OneSignal.send'), \
+                HTTMock(mock_changes):
+            # The changes weren't stored, so they are fetched again
+            with self.assertRaises(RuntimeError):
+                DataUpdater.run('changes')
+            self.assertIsNone(fingerprints.load('changes'))
+
+            comp.diff_changes.side_effect = None
+            DataUpdater.run('changes')
+            self.assertIsNotNone(fingerprints.load('changes'))
@@ -1,11 +1,35 @@
+import copy
 import json
 import unittest
 from diff_computer import DiffComputer, NoUpdate
+from patch import PatchEngine
+from storage import MemoryStorage, content_hash
+
+
+class CountingStorage(MemoryStorage):
+    '''MemoryStorage that records reads of the values'''
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+        # Hashes that differ from the values', removed on writes
+        self.hashes = {}
+
+    def __getitem__(self, key: str) -> str:
+        self.reads.append(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: str, value: str):
+        self.hashes.pop(key, None)
+        super().__setitem__(key, value)
+
+    def get_hash(self, key: str) -> str:
+        value = super().__getitem__(key)
+        return self.hashes.get(key, content_hash(value))
 
 
 class TestDiffComputer(unittest.TestCase):
     def setUp(self):
-        self.storage = {}
+        self.storage = MemoryStorage()
         self.comp = DiffComputer(self.storage)
 
     def tearDown(self):
@@ -31,6 +55,42 @@ class TestDiffComputer(unittest.TestCase):
         with self.assertRaises(NoUpdate):
             self.comp.exchange('key3', None)
 
+    def test_exchange_hash(self):
+        storage = CountingStorage()
+        comp = DiffComputer(storage)
+        storage['key1'] = '{"b":[1,2],"a":null}'
+
+        # Same data in a different order is still decoded and rewritten
+        # in the canonical encoding, so it's not decoded the next time
+        with self.assertRaises(NoUpdate):
+            comp.exchange('key1', {'a': None, 'b': [1, 2]})
+        self.assertListEqual(storage.reads, ['key1'])
+        self.assertEqual(dict.get(storage, 'key1'), '{"a":null,"b":[1,2]}')
+
+        del storage.reads[:]
+        with self.assertRaises(NoUpdate):
+            comp.exchange('key1', {'b': [1, 2], 'a': None})
+        self.assertListEqual(storage.reads, [])
+
+        comp.exchange('key1', {'a': None, 'b': [1, 2, 3]})
+        self.assertEqual(dict.get(storage, 'key1'),
+                         '{"a":null,"b":[1,2,3]}')
+
+        del storage.reads[:]
+        with self.assertRaises(NoUpdate):
+            comp.exchange('key1', {'b': [1, 2, 3], 'a': None})
+        self.assertListEqual(storage.reads, [])
+
+        # Rows stored without a hash get one
+        storage['key2'] = '[1]'
+        storage.hashes['key2'] = None
+        with self.assertRaises(NoUpdate):
+            comp.exchange('key2', [1])
+        del storage.reads[:]
+        with self.assertRaises(NoUpdate):
+            comp.exchange('key2', [1])
+        self.assertListEqual(storage.reads, [])
+
     def test_class_list(self):
         self.storage['class_list'] = 'null'
 
@@ -153,6 +213,15 @@ class TestDiffComputer(unittest.TestCase):
                              [[{'1': None, '2': ['201']}, {}, {}, {}, {}],
                               [], [], [], [], []])
 
+        # Diffed by the hash tree kept since the previous update
+        self.assertIn('vacant_rooms/tree', self.storage)
+        vacant2 = [[{'1': ['101'], '2': ['201']}, {}, {}, {}, {}],
+                   [{'3': ['301']}], [], [], [], []]
+        diff3 = self.comp.diff_vacant_rooms(vacant2)
+        self.assertListEqual(json.loads(diff3),
+                             [[{'1': ['101'], '2': None}, {}, {}, {}, {}],
+                              [{'3': ['301']}], [], [], [], []])
+
     def test_changes(self):
         self.storage['changes'] = 'null'
 
@@ -198,3 +267,294 @@ class TestDiffComputer(unittest.TestCase):
         diff2 = self.comp.diff_class_teachers(tchrs)
         self.assertDictEqual(json.loads(diff2),
                              tchrs)
+
+
+class TestShardedDiffComputer(unittest.TestCase):
+    def setUp(self):
+        self.storage = MemoryStorage()
+        self.comp = DiffComputer(self.storage, sharded=True)
+        self.plain = DiffComputer(MemoryStorage())
+
+    def diff_both(self, method: str, value):
+        sharded = getattr(self.comp, method)(copy.deepcopy(value))
+        plain = getattr(self.plain, method)(copy.deepcopy(value))
+        self.assertEqual(sharded, plain)
+        return json.loads(sharded)
+
+    def test_full_perm_timetable(self):
+        tmtbl = {'8А': [[['maths'], ['pe']], []],
+                 '8Б': [[['ict']]],
+                 '9А': [[]]}
+        self.diff_both('diff_full_perm_timetable', tmtbl)
+        self.assertListEqual(
+            json.loads(self.storage['full_perm_timetable/manifest']),
+            [['8А', self.comp.hash(tmtbl['8А'])],
+             ['8Б', self.comp.hash(tmtbl['8Б'])],
+             ['9А', self.comp.hash(tmtbl['9А'])]])
+        self.assertNotIn('full_perm_timetable', self.storage)
+
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+
+        # The stored data is the same whether it's sharded or not
+        self.assertDictEqual(self.comp.load('full_perm_timetable'), tmtbl)
+        self.assertDictEqual(self.plain.load('full_perm_timetable'), tmtbl)
+        self.assertIsNone(self.comp.load('teachers'))
+
+        version = self.comp.version('full_perm_timetable')
+        cls_version = self.comp.version('full_perm_timetable', '8Б')
+        day_version = self.comp.version('full_perm_timetable', '8А', 1)
+
+        reads = []
+        get_many = self.storage.get_many
+        self.storage.get_many = lambda keys: reads.extend(keys) or \
+            get_many(keys)
+
+        tmtbl['8А'][0][1] = ['english']
+        del tmtbl['9А']
+        tmtbl['10А'] = [[['biology']]]
+        diff = self.diff_both('diff_full_perm_timetable', tmtbl)
+        self.assertDictEqual(diff,
+                             {'8А': [[None, ['english']], []],
+                              '8Б': [[None]],
+                              '10А': [[['biology']]]})
+        self.assertListEqual(reads, ['full_perm_timetable/8А'])
+        self.assertNotIn('full_perm_timetable/9А', self.storage)
+
+        # Versions change only for the parts that changed
+        self.assertNotEqual(self.comp.version('full_perm_timetable'),
+                            version)
+        self.assertEqual(self.comp.version('full_perm_timetable', '8Б'),
+                         cls_version)
+        self.assertEqual(self.comp.version('full_perm_timetable', '8А', 1),
+                         day_version)
+        self.assertIsNone(self.comp.version('full_perm_timetable', '9А'))
+        self.assertIsNone(self.plain.version('full_perm_timetable'))
+
+        # Failed fetches keep the old data
+        tmtbl['8Б'] = None
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+        self.assertIn('full_perm_timetable/8Б', self.storage)
+
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_full_perm_timetable(None)
+
+    def test_migration(self):
+        tmtbl = {'8А': [[['maths']]], '8Б': [[['ict']]]}
+        self.storage['full_perm_timetable'] = json.dumps(tmtbl)
+
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+        self.assertNotIn('full_perm_timetable', self.storage)
+        self.assertEqual(json.loads(self.storage['full_perm_timetable/8Б']),
+                         [[['ict']]])
+
+        tmtbl['8Б'] = [[['pe']]]
+        diff = self.comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+        self.assertDictEqual(json.loads(diff),
+                             {'8А': [[None]], '8Б': [[['pe']]]})
+
+        # Turning sharding off merges the shards back
+        plain = DiffComputer(self.storage)
+        with self.assertRaises(NoUpdate):
+            plain.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+        self.assertListEqual(list(self.storage), ['full_perm_timetable'])
+        self.assertDictEqual(json.loads(self.storage['full_perm_timetable']),
+                             tmtbl)
+
+    def test_failed_migration(self):
+        tmtbl = {'8А': [[['maths']]]}
+        self.storage['full_perm_timetable'] = json.dumps(tmtbl)
+        # Shards are lost on the way to the storage
+        self.storage.set_many = lambda items: None
+
+        with self.assertRaises(RuntimeError):
+            self.comp.diff_full_perm_timetable(copy.deepcopy(tmtbl))
+        self.assertListEqual(list(self.storage), ['full_perm_timetable'])
+
+    def test_teachers(self):
+        tchrs = [{'abbr': 't1',
+                  'full': 'Teacher 1',
+                  'job': 'teacher',
+                  'timetable': [[{'class': '8А'}, None], None],
+                  'classes': ['8А']},
+                 {'abbr': 't2',
+                  'full': 'Teacher 2'},
+                 {'job': 'test_wrecker'}]
+        self.diff_both('diff_teachers', tchrs)
+
+        reads = []
+        get_many = self.storage.get_many
+        self.storage.get_many = lambda keys: reads.extend(keys) or \
+            get_many(keys)
+
+        tchrs[1]['job'] = 'teacher'
+        del tchrs[2]
+        diff = self.diff_both('diff_teachers', tchrs)
+        # Diffed by the hash tree without reading the old teachers
+        self.assertListEqual(reads, [])
+        self.assertListEqual(diff,
+                             [{'abbr': 't1',
+                               'full': None,
+                               'job': None,
+                               'timetable': [[None, None], None],
+                               'classes': None},
+                              {'abbr': 't2',
+                               'full': None,
+                               'job': 'teacher'}])
+        self.assertNotIn('teachers/#2', self.storage)
+
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_teachers(copy.deepcopy(tchrs))
+
+    def test_teacher_timetables(self):
+        def lesson(teacher):
+            return [{'name': 'maths', 'room': '101', 'teacher': teacher}]
+
+        tmtbl = {'8А': [[lesson('t1'), lesson('t2')]],
+                 '8Б': [[lesson('t3')]]}
+        self.diff_both('diff_full_perm_timetable', tmtbl)
+        # It's unknown which teachers changed before the first update
+        self.assertIsNone(self.comp.dirty_teachers())
+
+        tchrs = [{'abbr': 't1', 'full': 'Teacher 1', 'job': 'teacher',
+                  'timetable': [[{'class': '8А'}, None]], 'classes': ['8А']},
+                 {'abbr': 't2', 'full': 'Teacher 2',
+                  'timetable': [[None, {'class': '8А'}]], 'classes': ['8А']},
+                 {'abbr': 't3', 'full': 'Teacher 3',
+                  'timetable': [[{'class': '8Б'}, None]], 'classes': ['8Б']}]
+        self.diff_both('diff_teachers', tchrs)
+        self.assertListEqual(self.comp.dirty_teachers(), [])
+
+        tmtbl['8А'][0][1] = lesson('t1')
+        self.diff_both('diff_full_perm_timetable', tmtbl)
+        self.assertListEqual(self.comp.dirty_teachers(), ['t1', 't2'])
+        self.assertListEqual(self.plain.dirty_teachers(), ['t1', 't2'])
+
+        reads = []
+        get_many = self.storage.get_many
+        self.storage.get_many = lambda keys: reads.extend(keys) or \
+            get_many(keys)
+
+        new = {'t1': {'timetable': [[{'class': '8А'}, {'class': '8А'}]],
+                      'classes': ['8А']},
+               't2': {'timetable': None, 'classes': None}}
+        diff = self.diff_both('diff_teacher_timetables', new)
+        self.assertListEqual(diff,
+                             [{'abbr': 't1',
+                               'full': None,
+                               'job': None,
+                               'timetable': [[None, {'class': '8А'}]],
+                               'classes': None},
+                              {'abbr': 't2',
+                               'full': None}])
+        self.assertNotIn('teachers/t3', reads)
+        self.assertListEqual(self.comp.dirty_teachers(), [])
+        self.assertDictEqual(json.loads(self.storage['teachers/t2']),
+                             {'abbr': 't2', 'full': 'Teacher 2'})
+
+        with self.assertRaises(NoUpdate):
+            self.comp.diff_teacher_timetables(copy.deepcopy(new))
+
+    def test_duplicate_abbr(self):
+        tchrs = [{'abbr': 't1', 'full': 'Teacher One', 'job': 'teacher'},
+                 {'abbr': 't1', 'full': 'Teacher Other', 'job': 'head'},
+                 {'abbr': 't1#2', 'full': 'Teacher Odd'}]
+        self.diff_both('diff_teachers', tchrs)
+        self.assertListEqual(
+            [name for name, value_hash in
+             json.loads(self.storage['teachers/manifest'])],
+            ['t1', 't1#2', 't1#2#2'])
+        self.assertListEqual(self.comp.load('teachers'), tchrs)
+
+        # Both teachers with the abbreviated name are updated
+        new = {'t1': {'timetable': [[{'class': '8А'}]], 'classes': ['8А']}}
+        diff = self.diff_both('diff_teacher_timetables', new)
+        self.assertEqual(len(diff), 2)
+        self.assertListEqual(
+            [i.get('classes') for i in self.comp.load('teachers')],
+            [['8А'], ['8А'], None])
+
+
+class TestPatchDiffComputer(unittest.TestCase):
+    def setUp(self):
+        self.comps = [DiffComputer(MemoryStorage(), patches=True),
+                      DiffComputer(MemoryStorage(), sharded=True,
+                                   patches=True)]
+        self.docs = [{}, {}]
+
+    def update(self, key: str, method: str, value, doc_key: str = None):
+        '''Diffs a value with both computers and applies the patches to
+        the clients' copies of the data. Returns the patches'''
+        doc_key = doc_key or key
+        patches = []
+        for comp, docs in zip(self.comps, self.docs):
+            patch = json.loads(getattr(comp, method)(copy.deepcopy(value)))
+            docs[doc_key] = PatchEngine.apply(docs.get(doc_key), patch)
+            patches.append(patch)
+        self.assertEqual(patches[0], patches[1])
+        return patches[0]
+
+    def test_plain(self):
+        values = {'class_list': [{'8': ['8А']}, {'8': ['8А', '8Б']}],
+                  'study_plan': [[[1, 2]], [[1, 3], [4]]],
+                  'rings_timetable': [[['09:00']], [['09:00'], ['10:00']]],
+                  'changes': [[{'day': '1', 'month': 'сентября',
+                                '8А': ['Уроков нет']}],
+                              [{'day': '2', 'month': 'сентября',
+                                '8Б': ['Уроков нет']}]],
+                  'vacant_rooms': [[[{'1': ['101']}]],
+                                   [[{'1': ['101', '102']}]]],
+                  'class_teachers': [{'8А': ['t1']}, {'8А': ['t1', 't2']}]}
+        for key, versions in values.items():
+            for value in versions:
+                self.update(key, 'diff_' + key, value)
+                for docs in self.docs:
+                    self.assertEqual(docs[key], value)
+
+            with self.assertRaises(NoUpdate):
+                getattr(self.comps[0], 'diff_' + key)(versions[-1])
+
+    def test_full_perm_timetable(self):
+        tmtbl = {'8А': [[['maths'], ['pe']], []],
+                 '8Б': [[['ict']]],
+                 '9А': [[]]}
+        self.update('full_perm_timetable', 'diff_full_perm_timetable', tmtbl)
+
+        tmtbl['8А'][0][1] = ['english']
+        del tmtbl['9А']
+        tmtbl['10А'] = [[['biology']]]
+        patch = self.update('full_perm_timetable',
+                            'diff_full_perm_timetable', tmtbl)
+        self.assertListEqual(patch,
+                             [{'op': 'remove', 'path': '/9А'},
+                              {'op': 'replace', 'path': '/8А/0/1/0',
+                               'value': 'english'},
+                              {'op': 'add', 'path': '/10А',
+                               'value': [[['biology']]]}])
+        for docs in self.docs:
+            self.assertEqual(docs['full_perm_timetable'], tmtbl)
+
+    def test_teachers(self):
+        tchrs = [{'abbr': 't1', 'full': 'Teacher 1',
+                  'timetable': [[{'class': '8А'}, None]], 'classes': ['8А']},
+                 {'abbr': 't2', 'full': 'Teacher 2'},
+                 {'job': 'test_wrecker'}]
+        self.update('teachers', 'diff_teachers', tchrs)
+
+        del tchrs[0]
+        tchrs[0]['job'] = 'teacher'
+        tchrs.append({'abbr': 't3', 'full': 'Teacher 3'})
+        patch = self.update('teachers', 'diff_teachers', tchrs)
+        self.assertIn({'op': 'remove', 'path': '/0'}, patch)
+        for docs in self.docs:
+            self.assertEqual(docs['teachers'], tchrs)
+
+        new = {'t2': {'timetable': [[None, {'class': '8Б'}]],
+                      'classes': ['8Б']}}
+        self.update('teachers', 'diff_teacher_timetables', new)
+        tchrs[0].update(new['t2'])
+        for docs in self.docs:
+            self.assertEqual(docs['teachers'], tchrs)
+
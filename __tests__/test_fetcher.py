@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from fetcher import FetchEngine
+
+
+class TestFetchEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = FetchEngine(workers=4)
+
+    def test_order(self):
+        def slow_square(i):
+            time.sleep(0.01 * (5 - i))
+            return i * i
+
+        results, failed = self.engine.map(slow_square, range(5))
+        self.assertListEqual(results,
+                             [0, 1, 4, 9, 16])
+        self.assertListEqual(failed, [])
+
+    def test_failures(self):
+        def picky(i):
+            if i == 'bad':
+                raise RuntimeError('bad item')
+            if i == 'none':
+                return None
+            return i.upper()
+
+        results, failed = self.engine.map(picky, ['a', 'bad', 'b', 'none'])
+        self.assertListEqual(results,
+                             ['A', None, 'B', None])
+        self.assertListEqual(failed,
+                             ['bad', 'none'])
+
+        self.assertEqual(self.engine.map(picky, []),
+                         ([], []))
+
+    def test_imap(self):
+        def picky(i):
+            if i == 'bad':
+                raise ValueError(i)
+            return i.upper()
+
+        self.engine.log.disabled = True
+        self.assertDictEqual(dict(self.engine.imap(picky,
+                                                   ['a', 'bad', 'b'])),
+                             {'a': 'A', 'bad': None, 'b': 'B'})
+        self.assertListEqual(list(self.engine.imap(picky, [])), [])
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        counters = {'curr': 0, 'max': 0}
+
+        def tracked(i):
+            with lock:
+                counters['curr'] += 1
+                counters['max'] = max(counters['max'], counters['curr'])
+            time.sleep(0.01)
+            with lock:
+                counters['curr'] -= 1
+            return i
+
+        self.engine.map(tracked, range(20))
+        self.assertLessEqual(counters['max'], 4)
+
+        with self.assertRaises(ValueError):
+            FetchEngine(workers=0)
@@ -1,9 +1,15 @@
 import unittest
 from urllib.parse import urlencode, quote_plus
 import json
+import os
 import re
 from httmock import HTTMock, urlmatch, all_requests
-from gatherer import DataGatherer
+from cache import Fingerprints, ResponseCache, HOUR
+from checkpoint import Checkpoints
+from diff_computer import NoUpdate
+from gatherer import DataGatherer, ODTParser, ODTStreamParser
+from session import ApiSession
+from storage import MemoryStorage
 
 
 @all_requests
@@ -59,6 +65,19 @@ def mock_teacher_timetable2(url, req):
     with open('__tests__/test_files/teacher_timetable3.json') as f:
         return f.read()
 
+@urlmatch(query='f=4')
+def mock_single_class(url, req):
+    return '8а'
+
+@urlmatch(query='f=4')
+def mock_no_class_list(url, req):
+    return {'status_code': 500,
+            'content': ''}
+
+@urlmatch(query='f=7')
+def mock_timetable_teacher_list(url, req):
+    return 'Учитель По Истории\nУчитель По Математике\nНовый Учитель Без'
+
 @urlmatch(path='/offic/', query='id=6')
 def mock_teacher_data(url, req):
     single = urlencode({'famStaff': 'Учитель'}, encoding='cp1251')
@@ -70,6 +89,12 @@ def mock_teacher_data(url, req):
     elif single in req.body:
         with open('__tests__/test_files/single_teacher_data.html') as f:
             return f.read()
+    elif req.body.endswith('famStaff='):
+        # The whole directory
+        with open('__tests__/test_files/double_teacher_data.html') as f:
+            page = f.read()
+        with open('__tests__/test_files/single_teacher_data.html') as f:
+            return page + f.read()
 
 @urlmatch(query='f=6')
 def mock_all_rooms(url, req):
@@ -87,7 +112,8 @@ def mock_room_occupation(url, req):
 
 class TestDataGatherer(unittest.TestCase):
     def setUp(self):
-        self.gth = DataGatherer(silent=True)
+        self.gth = DataGatherer(silent=True,
+                                session=ApiSession(sleep=lambda s: None, rate=None))
 
     def test_class_list(self):
         act_classes = ['8А', '9Б', '10Я', '11О', '10П']
@@ -117,6 +143,18 @@ class TestDataGatherer(unittest.TestCase):
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_study_plan())
 
+    def test_study_plan_stream(self):
+        filename = '__tests__/test_files/study_plan.odt'
+        with open(filename, 'rb') as f:
+            data = f.read()
+
+        self.assertListEqual(ODTStreamParser(data).parse().to_list(),
+                             ODTParser(filename).parse().to_list())
+
+        with HTTMock(mock_study_plan):
+            self.gth.get_study_plan()
+        self.assertFalse(os.path.exists('study_plan.odt'))
+
     def test_rings_timetable(self):
         act_rings = [{'start': '9:00', 'end': '9:40', 'type': 'lesson'},
                      {'len': 10, 'type': 'break'},
@@ -144,10 +182,15 @@ class TestDataGatherer(unittest.TestCase):
             act_timetable = json.load(f)
 
         with HTTMock(mock_perm_timetable):
-            self.assertListEqual(act_timetable,
-                                 self.gth.get_perm_timetable('8а'))
+            tmtbl = self.gth.get_perm_timetable('8а')
+            self.assertListEqual(act_timetable, tmtbl)
             self.assertIsNone(self.gth.get_perm_timetable('8б'))
 
+            # Equal lessons are shared
+            self.assertIs(tmtbl[0][4][0], tmtbl[0][5][0])
+            self.assertIs(self.gth.get_perm_timetable('8а')[0][0][0],
+                          tmtbl[0][0][0])
+
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_perm_timetable('8а'))
 
@@ -172,6 +215,55 @@ class TestDataGatherer(unittest.TestCase):
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_full_perm_timetable())
 
+    def test_resume(self):
+        storage = MemoryStorage()
+        gth = DataGatherer(silent=True,
+                           session=ApiSession(sleep=lambda s: None, rate=None),
+                           checkpoints=Checkpoints(storage))
+        requested = []
+        missing = ['9б']
+
+        @urlmatch(query='.*f=1.*')
+        def mock_partial(url, req):
+            requested.append(url.query)
+            if any(quote_plus(i, encoding='cp1251') in url.query
+                   for i in missing):
+                return {'status_code': 404}
+            with open('__tests__/test_files/perm_timetable.json') as f:
+                tmtbl = json.load(f)['8а']
+            return json.dumps({'8а': tmtbl, '9б': tmtbl})
+
+        with HTTMock(mock_partial):
+            full_tmtbl = gth.get_full_perm_timetable(['8а', '9Б'])
+        self.assertIsNone(full_tmtbl['9Б'])
+        self.assertListEqual(list(storage),
+                             ['checkpoint/full_perm_timetable/8а'])
+
+        requested.clear()
+        missing.clear()
+        with HTTMock(mock_partial):
+            resumed = gth.get_full_perm_timetable(['8а', '9Б'])
+        self.assertEqual(len(requested), 1)
+        self.assertEqual(resumed['8а'], full_tmtbl['8а'])
+        self.assertIsNotNone(resumed['9Б'])
+        self.assertDictEqual(dict(storage), {})
+
+    def test_server_down(self):
+        calls = []
+
+        @urlmatch(query='.*f=1.*')
+        def down(url, req):
+            calls.append(url)
+            return {'status_code': 503}
+
+        self.gth.http.failure_threshold = 3
+        with HTTMock(down):
+            self.assertIsNone(self.gth.get_full_perm_timetable(
+                ['{}А'.format(i) for i in range(8, 12)] * 5))
+        # Every failed request is tried 4 times
+        self.assertLessEqual(len(calls), 4 * (3 + 7))
+        self.assertTrue(self.gth.http.is_open(self.gth.api_url(f=1)))
+
     def test_teacher_timetable(self):
         with open('__tests__/test_files/act_teacher_timetable.json') as f:
             act_timetable = json.load(f)
@@ -195,6 +287,7 @@ class TestDataGatherer(unittest.TestCase):
             act_teachers = json.load(f)
 
         with HTTMock(mock_teacher_list,
+                     mock_no_class_list,
                      mock_teacher_timetable2,
                      mock_teacher_data):
             teachers = self.gth.get_teachers()
@@ -212,6 +305,102 @@ class TestDataGatherer(unittest.TestCase):
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_teachers())
 
+    def test_staff_directory(self):
+        bodies = []
+
+        @urlmatch(path='/offic/', query='id=6')
+        def mock_staff(url, req):
+            bodies.append(req.body)
+            return mock_teacher_data(url, req)
+
+        with HTTMock(mock_teacher_list,
+                     mock_no_class_list,
+                     mock_teacher_timetable2,
+                     mock_staff):
+            teachers = self.gth.get_teachers()
+        self.assertEqual(len(bodies), 1)
+        self.assertTrue(bodies[0].endswith('famStaff='))
+        self.assertSetEqual({i['dep'] for i in teachers},
+                            {'Кафедра математики',
+                             'Кафедра гуманитарного образования'})
+
+        @urlmatch(path='/offic/', query='id=6')
+        def mock_search_only(url, req):
+            bodies.append(req.body)
+            if req.body.endswith('famStaff='):
+                return {'status_code': 404}
+            return mock_teacher_data(url, req)
+
+        bodies.clear()
+        with HTTMock(mock_teacher_list,
+                     mock_no_class_list,
+                     mock_teacher_timetable2,
+                     mock_search_only):
+            teachers = self.gth.get_teachers()
+        self.assertEqual(len(bodies), 3)
+        self.assertSetEqual({i['job'] for i in teachers},
+                            {'Преподаватель', 'Доцент'})
+
+    def test_teachers_from_timetables(self):
+        history = {'class': '8А', 'room': '101', 'name': 'История'}
+        maths = {'class': '8А', 'room': '102', 'name': 'Математика'}
+        requested = []
+
+        @urlmatch(query='.*f=2.*')
+        def mock_teacher_timetable(url, req):
+            requested.append(url.query)
+            return 'Teacher does not exist or has no lessons'
+
+        with HTTMock(mock_single_class,
+                     mock_perm_timetable,
+                     mock_timetable_teacher_list,
+                     mock_teacher_timetable,
+                     mock_teacher_data):
+            teachers = self.gth.get_teachers()
+
+        self.assertEqual(len(requested), 1)
+        self.assertIn(quote_plus('Новый У. Б.', encoding='cp1251'),
+                      requested[0])
+
+        self.assertEqual(teachers[0]['abbr'], 'Учитель П. И.')
+        self.assertListEqual(teachers[0]['timetable'],
+                             [[history] + [None] * 6,
+                              [None, history] + [None] * 5,
+                              None, None, None, None])
+        self.assertListEqual(teachers[0]['classes'], ['8А'])
+
+        self.assertListEqual(teachers[1]['timetable'],
+                             [[None, maths] + [None] * 5,
+                              None, None, None, None, None])
+        self.assertEqual(teachers[1]['dep'], 'Кафедра математики')
+
+        self.assertNotIn('timetable', teachers[2])
+
+    def test_teacher_timetables(self):
+        with HTTMock(mock_perm_timetable):
+            full_tmtbl = {'8А': self.gth.get_perm_timetable('8а')}
+
+        with HTTMock(mock_failure):
+            tmtbls = self.gth.get_teacher_timetables(
+                full_tmtbl, ['Учитель П. И.', 'Нет Т. У.'])
+        self.assertListEqual(sorted(tmtbls), ['Нет Т. У.', 'Учитель П. И.'])
+        self.assertListEqual(tmtbls['Учитель П. И.']['classes'], ['8А'])
+        self.assertEqual(len(tmtbls['Учитель П. И.']['timetable']), 6)
+        self.assertDictEqual(tmtbls['Нет Т. У.'],
+                             {'timetable': None, 'classes': None})
+
+        self.assertDictEqual(self.gth.get_teacher_timetables(full_tmtbl, []),
+                             {})
+        self.assertIn('Учитель П. И.',
+                      self.gth.get_teacher_timetables(full_tmtbl))
+        self.assertIsNone(self.gth.get_teacher_timetables({'8А': None}))
+
+        # The stored timetables are used instead of fetching them
+        with HTTMock(mock_failure):
+            tmtbls = self.gth.get_teacher_timetables(
+                dirty=['Учитель П. И.'], stored_tmtbl=full_tmtbl)
+        self.assertListEqual(tmtbls['Учитель П. И.']['classes'], ['8А'])
+
     def test_changes(self):
         with open('__tests__/test_files/act_changes.json') as f:
             act_changes = json.load(f)
@@ -223,6 +412,91 @@ class TestDataGatherer(unittest.TestCase):
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_changes())
 
+    def test_conditional(self):
+        storage = {}
+        sent_headers = []
+
+        @urlmatch(path='/study/izmenHtml.php')
+        def mock_etag_changes(url, req):
+            sent_headers.append(req.headers.get('If-None-Match'))
+            if req.headers.get('If-None-Match') == '"v1"':
+                return {'status_code': 304, 'content': ''}
+            with open('__tests__/test_files/changes.html') as f:
+                return {'status_code': 200,
+                        'content': f.read(),
+                        'headers': {'ETag': '"v1"'}}
+
+        gth = DataGatherer(silent=True,
+                           session=ApiSession(sleep=lambda s: None, rate=None),
+                           fingerprints=Fingerprints(storage))
+
+        with HTTMock(mock_changes):
+            self.assertTrue(gth.get_changes())
+            # The fingerprint is only saved once it's confirmed
+            self.assertDictEqual(storage, {})
+            gth.confirm()
+            with self.assertRaises(NoUpdate):
+                gth.get_changes()
+
+        storage.clear()
+        with HTTMock(mock_etag_changes):
+            self.assertTrue(gth.get_changes())
+            gth.confirm()
+            with self.assertRaises(NoUpdate):
+                gth.get_changes()
+        self.assertListEqual(sent_headers, [None, '"v1"'])
+
+        # Responses whose data failed to be stored are processed again
+        storage.clear()
+        with HTTMock(mock_changes):
+            self.assertTrue(gth.get_changes())
+            gth.discard()
+            gth.confirm()
+            self.assertTrue(gth.get_changes())
+
+        with HTTMock(mock_failure):
+            self.assertIsNone(gth.get_changes())
+
+    def test_conditional_cache(self):
+        storage = {}
+        now = [1000000]
+        bodies = []
+
+        @urlmatch(path='/study/izmenHtml.php')
+        def mock_etag_changes(url, req):
+            body, etag = bodies[-1]
+            if req.headers.get('If-None-Match') == etag:
+                return {'status_code': 304, 'content': ''}
+            with open('__tests__/test_files/changes.html') as f:
+                return {'status_code': 200,
+                        'content': f.read() + body,
+                        'headers': {'ETag': etag}}
+
+        cache = ResponseCache(storage, clock=lambda: now[0])
+        gth = DataGatherer(silent=True,
+                           session=ApiSession(cache=cache,
+                                              sleep=lambda s: None,
+                                              rate=None),
+                           fingerprints=Fingerprints(storage))
+
+        with HTTMock(mock_etag_changes):
+            bodies.append(('<!-- A -->', '"a"'))
+            gth.get_changes()
+            gth.confirm()
+
+            # The new data failed to be stored
+            now[0] += HOUR
+            bodies.append(('<!-- B -->', '"b"'))
+            gth.get_changes()
+            gth.discard()
+
+            # The server is back to the confirmed data, the cached
+            # response that wasn't confirmed is not used instead
+            now[0] += HOUR
+            bodies.append(('<!-- A -->', '"a"'))
+            with self.assertRaises(NoUpdate):
+                gth.get_changes()
+
     def test_vacant_rooms(self):
         with open('__tests__/test_files/act_vacant_rooms.json') as f:
             act_vacant_rooms = json.load(f)
@@ -240,6 +514,23 @@ class TestDataGatherer(unittest.TestCase):
         with HTTMock(mock_failure):
             self.assertIsNone(self.gth.get_vacant_rooms())
 
+    def test_vacant_rooms_from_timetables(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            full_tmtbl = {'8А': json.load(f)}
+
+        with HTTMock(mock_all_rooms):
+            vacant_rooms = self.gth.get_vacant_rooms(full_tmtbl)
+
+        self.assertEqual(len(vacant_rooms), 6)
+        self.assertDictEqual(vacant_rooms[0][3],
+                             {'1': ['101', '102'],
+                              '2': ['202', '203'],
+                              '3': ['302', '303']})
+        self.assertDictEqual(vacant_rooms[1][0],
+                             {'1': ['101', '102', '103'],
+                              '2': ['201', '202', '203'],
+                              '3': ['301', '302', '303']})
+
     def test_class_teachers(self):
         act_class_teachers = {'8А': [{'teacher': 'Учитель П. И.',
                                       'subject': 'История'},
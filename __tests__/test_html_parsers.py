@@ -0,0 +1,59 @@
+import json
+import unittest
+from html_parsers import ChangesParser, StaffParser
+
+
+class TestChangesParser(unittest.TestCase):
+    def test_fixture(self):
+        with open('__tests__/test_files/changes.html') as f:
+            page = f.read()
+        with open('__tests__/test_files/act_changes.json') as f:
+            act_changes = json.load(f)
+
+        self.assertListEqual(ChangesParser().parse(page), act_changes)
+
+    def test_sections(self):
+        page = ('<h1>ИЗМЕНЕНИЯ В РАСПИСАНИИ НА СУББОТУ, 7 ОКТЯБРЯ </h1>'
+                '<p>Без класса</p>'
+                '<h2>10в</h2>'
+                '<p>2 урок&nbsp;&mdash; физика</p>'
+                '<p>3 урок <b>отменён</b></p>'
+                '<p></p>'
+                '<h2>Примечание</h2>'
+                '<p>Не относится к классу</p>'
+                '<h1>Другой заголовок</h1>'
+                '<h2>11а</h2>'
+                '<p>Не относится к дню</p>')
+        self.assertListEqual(ChangesParser().parse(page),
+                             [{'wkday': 'Суббота',
+                               'day': '7',
+                               'month': 'октября',
+                               '10В': ['2 урок – физика']}])
+
+    def test_empty(self):
+        self.assertListEqual(ChangesParser().parse(''), [])
+
+
+class TestStaffParser(unittest.TestCase):
+    def test_fixtures(self):
+        with open('__tests__/test_files/single_teacher_data.html') as f:
+            rows = StaffParser().parse(f.read())
+        self.assertListEqual(rows,
+                             [{'full': 'Учитель По Математике',
+                               'dep': 'Кафедра математики',
+                               'job': 'Преподаватель'}])
+
+        with open('__tests__/test_files/double_teacher_data.html') as f:
+            rows = StaffParser().parse(f.read())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['full'],
+                         'Учитель-Преподаватель По Экономике')
+
+    def test_entities(self):
+        page = ('<tr><td>Учитель&nbsp;По Истории</td><td>Кафедра</td>'
+                '<td>Доцент&amp;</td><td class=\'c\'>1</td></tr>'
+                '<tr><th>Фамилия</th><th>Подразделение</th></tr>')
+        self.assertListEqual(StaffParser().parse(page),
+                             [{'full': 'Учитель По Истории',
+                               'dep': 'Кафедра',
+                               'job': 'Доцент&amp;'}])
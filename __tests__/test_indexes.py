@@ -0,0 +1,114 @@
+import json
+import unittest
+from indexes import RoomOccupancy, StaffIndex, TeacherIndex
+
+
+class TestTeacherIndex(unittest.TestCase):
+    def test_teacher_index(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            tmtbl = json.load(f)
+
+        index = TeacherIndex({'8А': tmtbl,
+                              '9Б': [[], [[], [{'name': 'Химия',
+                                                'teacher': 'Учитель П. Х.',
+                                                'room': '302'}]]],
+                              '10В': [[[{'name': 'Самоподготовка',
+                                         'teacher': None,
+                                         'room': None}]]]})
+
+        self.assertIn('Учитель П. Л.', index)
+        self.assertNotIn('Нет Т. У.', index)
+        self.assertNotIn(None, index)
+
+        chem_tmtbl, chem_classes = index.get('Учитель П. Х.')
+        self.assertListEqual(chem_classes, ['8А', '9Б'])
+        self.assertListEqual(chem_tmtbl[0],
+                             [None, None,
+                              {'class': '8А', 'room': '301', 'name': 'Химия'},
+                              {'class': '8А', 'room': '301', 'name': 'Химия'},
+                              None, None, None])
+        self.assertListEqual(chem_tmtbl[1],
+                             [None,
+                              {'class': '9Б', 'room': '302', 'name': 'Химия'},
+                              None, None, None, None, None])
+        self.assertListEqual(chem_tmtbl[2:], [None] * 4)
+
+        with self.assertRaises(KeyError):
+            index.get('Нет Т. У.')
+
+
+class TestRoomOccupancy(unittest.TestCase):
+    def setUp(self):
+        self.rooms = ['302', '101', '102', '201', '301']
+
+    def test_from_timetables(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            tmtbl = json.load(f)
+
+        occ = RoomOccupancy.from_timetables(self.rooms, {'8А': tmtbl})
+        self.assertEqual(len(occ.slots), 6)
+        self.assertListEqual(occ.vacant(0, 0),
+                             ['102', '201', '301', '302'])
+        # Room 103 is not tracked
+        self.assertListEqual(occ.vacant(0, 3),
+                             ['101', '102', '302'])
+        self.assertListEqual(occ.vacant(5, 6),
+                             ['101', '102', '201', '301', '302'])
+
+        vacant = occ.vacant_by_floor()
+        self.assertEqual(len(vacant[0]), 7)
+        self.assertDictEqual(vacant[0][3],
+                             {'1': ['101', '102'],
+                              '2': [],
+                              '3': ['302']})
+
+    def test_from_occupied(self):
+        week = [[{'101', '201'}, set()],
+                [{'302'}]]
+
+        occ = RoomOccupancy.from_occupied(self.rooms, week)
+        vacant = occ.vacant_by_floor()
+        self.assertListEqual([len(day) for day in vacant], [7] * 6)
+        self.assertListEqual(vacant[0][:2],
+                             [{'1': ['102'],
+                               '2': [],
+                               '3': ['301', '302']},
+                              {'1': ['101', '102'],
+                               '2': ['201'],
+                               '3': ['301', '302']}])
+        self.assertListEqual(vacant[1][:2],
+                             [{'1': ['101', '102'],
+                               '2': ['201'],
+                               '3': ['301']},
+                              {'1': ['101', '102'],
+                               '2': ['201'],
+                               '3': ['301', '302']}])
+
+    def test_same_shape(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            tmtbl = json.load(f)
+
+        # The same occupied rooms as the API would report them
+        week = [[{group['room'] for group in lesson} for lesson in day]
+                for day in tmtbl]
+        from_tmtbl = RoomOccupancy.from_timetables(self.rooms, {'8А': tmtbl})
+        from_occupied = RoomOccupancy.from_occupied(self.rooms, week)
+        self.assertListEqual(from_occupied.vacant_by_floor(),
+                             from_tmtbl.vacant_by_floor())
+
+
+class TestStaffIndex(unittest.TestCase):
+    def test_staff_index(self):
+        index = StaffIndex([{'full': 'Учитель По Математике',
+                             'dep': 'Кафедра математики',
+                             'job': 'Преподаватель'},
+                            {'full': 'Учитель По Истории',
+                             'dep': 'Кафедра истории',
+                             'job': 'Доцент'}])
+        self.assertEqual(len(index), 2)
+        self.assertIn('Учитель По Истории', index)
+        self.assertNotIn('Учитель По Физике', index)
+        self.assertTupleEqual(index.get('Учитель По Математике'),
+                              ('Кафедра математики', 'Преподаватель'))
+        with self.assertRaises(KeyError):
+            index.get('Учитель По Физике')
@@ -0,0 +1,85 @@
+import copy
+import json
+import pickle
+import tracemalloc
+import unittest
+from diff_computer import DiffComputer
+from lessons import Lesson, LessonPool
+from storage import MemoryStorage
+
+
+class TestLessonPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = LessonPool()
+
+    def test_shared(self):
+        name = ''.join(['Хим', 'ия'])
+        lesson = self.pool.get(name=name, teacher='Учитель П. Х.',
+                               room='301')
+        self.assertIs(self.pool.get(room='301', name='Химия',
+                                    teacher='Учитель П. Х.'), lesson)
+        self.assertIsNot(self.pool.get(name='Химия', teacher=None,
+                                       room='301'), lesson)
+        self.assertEqual(len(self.pool), 2)
+        self.assertIs(lesson['name'], self.pool.intern('Химия'))
+
+        # Lessons are dictionaries
+        self.assertEqual(lesson, {'name': 'Химия',
+                                  'teacher': 'Учитель П. Х.',
+                                  'room': '301'})
+        self.assertEqual(json.loads(json.dumps([lesson])), [lesson])
+
+    def test_read_only(self):
+        lesson = self.pool.get(**{'class': '8А', 'name': 'Химия',
+                                  'room': '301'})
+        with self.assertRaises(TypeError):
+            lesson['room'] = '302'
+        with self.assertRaises(TypeError):
+            lesson.pop('room')
+        with self.assertRaises(AttributeError):
+            lesson.note = 'changed'
+
+        self.assertIs(copy.deepcopy([lesson])[0], lesson)
+        self.assertEqual(pickle.loads(pickle.dumps(lesson)), lesson)
+        self.assertIsInstance(pickle.loads(pickle.dumps(lesson)), Lesson)
+
+    def test_hook(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            text = f.read()
+
+        tmtbl = json.loads(text, object_hook=self.pool.hook)
+        self.assertEqual(tmtbl, json.loads(text))
+        self.assertIs(tmtbl[0][4][0], tmtbl[0][5][0])
+        self.assertIs(json.loads(text, object_hook=self.pool.hook)[0][0][0],
+                      tmtbl[0][0][0])
+
+        # Other dictionaries are kept
+        tchr = json.loads('{"abbr":"t1","timetable":[[{"class":"8А",'
+                          '"name":"Химия","room":"301"}]]}',
+                          object_hook=self.pool.hook)
+        self.assertNotIsInstance(tchr, Lesson)
+        self.assertIsInstance(tchr['timetable'][0][0], Lesson)
+
+    def test_memory(self):
+        with open('__tests__/test_files/act_perm_timetable.json') as f:
+            tmtbl = json.load(f)
+        text = json.dumps({str(i): tmtbl for i in range(200)})
+
+        def size(**kwargs) -> int:
+            tracemalloc.start()
+            value = json.loads(text, **kwargs)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del value
+            return size
+
+        self.assertLess(size(object_hook=self.pool.hook), size() / 2)
+
+    def test_diff_computer(self):
+        comp = DiffComputer(MemoryStorage(), lessons=self.pool)
+        lesson = self.pool.get(name='Химия', teacher=None, room='301')
+        comp.diff_full_perm_timetable({'8А': [[[lesson]]]})
+
+        # The old lessons are decoded as the shared ones
+        old = comp.exchange('full_perm_timetable', {'8А': [[[lesson]], []]})
+        self.assertIs(old['8А'][0][0][0], lesson)
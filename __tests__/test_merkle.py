@@ -0,0 +1,54 @@
+import unittest
+from merkle import HashTree
+
+
+class TestHashTree(unittest.TestCase):
+    def setUp(self):
+        self.tree = HashTree()
+
+    def test_build(self):
+        tmtbl = [[['maths'], ['pe']], []]
+        tree = self.tree.build(tmtbl, 2)
+        self.assertEqual(len(self.tree.root(tree)), HashTree.hash_len)
+        self.assertEqual(len(tree[1]), 2)
+        self.assertIsInstance(self.tree.child(self.tree.child(tree, 0), 1),
+                              str)
+        self.assertIsNone(self.tree.child(self.tree.child(tree, 0), 2))
+        self.assertIsNone(self.tree.child(self.tree.child(
+            self.tree.child(tree, 0), 1), 0))
+
+        # Leaves are whole values
+        self.assertIsInstance(self.tree.build(tmtbl, 0), str)
+        self.assertNotEqual(self.tree.build(tmtbl, 0),
+                            self.tree.root(tree))
+
+    def test_same(self):
+        old = self.tree.build({'8А': [[['maths'], ['pe']]],
+                               '8Б': [[['ict']]]}, 3)
+        new = self.tree.build({'8Б': [[['ict']]],
+                               '8А': [[['maths'], ['english']]]}, 3)
+        self.assertFalse(self.tree.same(old, new))
+        self.assertTrue(self.tree.same(self.tree.child(old, '8Б'),
+                                       self.tree.child(new, '8Б')))
+
+        day = (self.tree.child(self.tree.child(old, '8А'), 0),
+               self.tree.child(self.tree.child(new, '8А'), 0))
+        self.assertFalse(self.tree.same(*day))
+        self.assertTrue(self.tree.same(self.tree.child(day[0], 0),
+                                       self.tree.child(day[1], 0)))
+        self.assertFalse(self.tree.same(self.tree.child(day[0], 1),
+                                        self.tree.child(day[1], 1)))
+
+        # Key order doesn't matter, missing trees are never the same
+        self.assertTrue(self.tree.same(
+            self.tree.build({'a': 1, 'b': 2}, 1),
+            self.tree.build({'b': 2, 'a': 1}, 1)))
+        self.assertFalse(self.tree.same(None, None))
+        self.assertFalse(self.tree.same(None, old))
+
+    def test_node(self):
+        children = {'8А': self.tree.build([[]], 2),
+                    '8Б': self.tree.build([[['ict']]], 2)}
+        self.assertEqual(self.tree.root(self.tree.node(children)),
+                         self.tree.root(self.tree.build(
+                             {'8А': [[]], '8Б': [[['ict']]]}, 3)))
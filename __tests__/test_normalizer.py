@@ -0,0 +1,58 @@
+import json
+import unittest
+from encoder import NoWSEncoder
+from normalizer import Normalizer
+
+
+class TestNormalizer(unittest.TestCase):
+    def setUp(self):
+        self.norm = Normalizer()
+        self.json = NoWSEncoder()
+
+    def test_passthrough(self):
+        self.assertIsNone(self.norm.normalize('vacant_rooms', None))
+        rings = [{'type': 'lesson'}]
+        self.assertIs(self.norm.normalize('rings_timetable', rings), rings)
+
+    def test_vacant_rooms(self):
+        run1 = [[{'1': ['103', '101'], '2': [], '3': ['302', '99']}]]
+        run2 = [[{'1': ['101', '103'], '2': [], '3': ['99', '302']}]]
+        norm1 = self.norm.normalize('vacant_rooms', run1)
+        norm2 = self.norm.normalize('vacant_rooms', run2)
+        self.assertEqual(self.json.encode(norm1), self.json.encode(norm2))
+        self.assertListEqual(norm1,
+                             [[{'1': ['101', '103'],
+                                '2': [],
+                                '3': ['99', '302']}]])
+
+    def test_teachers(self):
+        tchrs = [{'abbr': 't1', 'classes': ['9Б', '8А', '9Б']},
+                 {'abbr': 't2'},
+                 {'abbr': 't3', 'classes': None}]
+        self.assertListEqual(self.norm.normalize('teachers', tchrs),
+                             [{'abbr': 't1', 'classes': ['8А', '9Б']},
+                              {'abbr': 't2'},
+                              {'abbr': 't3', 'classes': None}])
+
+    def test_changes(self):
+        with open('__tests__/test_files/act_changes.json') as f:
+            act_changes = json.load(f)
+
+        chgs = json.loads(json.dumps(act_changes))
+        chgs[0]['8А'][0] = '  ' + chgs[0]['8А'][0].replace(' ', '\n ')
+        self.assertListEqual(self.norm.normalize('changes', chgs),
+                             act_changes)
+
+    def test_class_teachers(self):
+        tchrs = {'8А': [{'teacher': 'Учитель П. М.', 'subject': 'Математика'},
+                        {'teacher': None, 'subject': 'Самоподготовка'},
+                        {'teacher': 'Учитель П. И.', 'subject': 'История'}]}
+        self.assertListEqual(
+            [i['subject'] for i in self.norm.normalize('class_teachers',
+                                                       tchrs)['8А']],
+            ['История', 'Математика', 'Самоподготовка'])
+
+    def test_class_list(self):
+        self.assertDictEqual(self.norm.normalize('class_list',
+                                                 {'10': ['10Я', '10П']}),
+                             {'10': ['10П', '10Я']})
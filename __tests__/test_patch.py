@@ -0,0 +1,139 @@
+import copy
+import json
+import unittest
+from patch import PatchEngine, list_keys
+
+
+def load(name: str):
+    with open('__tests__/test_files/' + name, encoding='utf-8') as file:
+        return json.load(file)
+
+
+class TestPatchEngine(unittest.TestCase):
+    def round_trip(self, key: str, old, new) -> list:
+        engine = PatchEngine(list_keys.get(key))
+        ops = engine.diff(copy.deepcopy(old), copy.deepcopy(new))
+        # Operations survive the JSON encoding
+        ops = json.loads(json.dumps(ops))
+        self.assertEqual(engine.apply(copy.deepcopy(old), ops), new)
+        return ops
+
+    def test_diff(self):
+        engine = PatchEngine()
+        self.assertListEqual(engine.diff({'a': [1, 2]}, {'a': [1, 2]}), [])
+        self.assertListEqual(
+            engine.diff({'a': [1, 2], 'b/c': 1, 'd': 1},
+                        {'a': [1, 3, 4], 'b/c': 2, 'e': 1}),
+            [{'op': 'remove', 'path': '/d'},
+             {'op': 'replace', 'path': '/a/1', 'value': 3},
+             {'op': 'add', 'path': '/a/2', 'value': 4},
+             {'op': 'replace', 'path': '/b~1c', 'value': 2},
+             {'op': 'add', 'path': '/e', 'value': 1}])
+        self.assertListEqual(engine.diff([1, 2, 3], [1]),
+                             [{'op': 'remove', 'path': '/2'},
+                              {'op': 'remove', 'path': '/1'}])
+
+        # Containers that changed as a whole are replaced
+        self.assertListEqual(engine.diff({'a': [1, 2]}, {'a': [3, 4]}),
+                             [{'op': 'replace', 'path': '/a',
+                               'value': [3, 4]}])
+        self.assertListEqual(engine.diff(None, [1]),
+                             [{'op': 'replace', 'path': '', 'value': [1]}])
+
+    def test_keyed(self):
+        engine = PatchEngine({'': ('abbr',), '/*/items': ('id',)})
+        old = [{'abbr': 't1', 'job': 'teacher'},
+               {'abbr': 't2', 'job': 'teacher'},
+               {'abbr': 't3', 'items': [{'id': 1}, {'id': 2}]}]
+        new = [{'abbr': 't0'},
+               {'abbr': 't1', 'job': 'teacher'},
+               {'abbr': 't3', 'items': [{'id': 2}]}]
+        self.assertListEqual(engine.diff(old, new),
+                             [{'op': 'remove', 'path': '/1'},
+                              {'op': 'add', 'path': '/0',
+                               'value': {'abbr': 't0'}},
+                              {'op': 'remove', 'path': '/2/items/0'}])
+        self.assertEqual(engine.apply(copy.deepcopy(old),
+                                      engine.diff(old, new)), new)
+
+        # Reordered items replace the list
+        self.assertListEqual(engine.diff(old, old[::-1]),
+                             [{'op': 'replace', 'path': '',
+                               'value': old[::-1]}])
+
+    def test_class_list(self):
+        old = {'8': ['8А', '8Б'], '9': ['9А']}
+        new = {'8': ['8А', '8Б', '8В'], '10': ['10А']}
+        self.round_trip('class_list', old, new)
+
+    def test_study_plan(self):
+        old = [[1, 2, 3], [4, 5]]
+        new = [[1, 2, 3], [4, 6], [7]]
+        self.round_trip('study_plan', old, new)
+
+    def test_rings_timetable(self):
+        old = [['09:00', '09:45'], ['09:55', '10:40']]
+        new = [['09:00', '09:40'], ['09:50', '10:30'], ['10:40', '11:25']]
+        self.round_trip('rings_timetable', old, new)
+
+    def test_full_perm_timetable(self):
+        tmtbl = load('act_perm_timetable.json')
+        old = {'8А': tmtbl, '8Б': copy.deepcopy(tmtbl), '9А': [[]]}
+        new = copy.deepcopy(old)
+        new['8А'][0][0][0]['room'] = '999'
+        new['8Б'][1].append([{'name': 'PE', 'teacher': None,
+                              'room': None}])
+        del new['9А']
+        new['10А'] = tmtbl
+        ops = self.round_trip('full_perm_timetable', old, new)
+        self.assertIn({'op': 'replace', 'path': '/8А/0/0/0/room',
+                       'value': '999'}, ops)
+        self.assertIn({'op': 'remove', 'path': '/9А'}, ops)
+
+    def test_teachers(self):
+        old = load('act_teachers.json')
+        new = copy.deepcopy(old)
+        removed = new.pop(0)
+        new[0]['job'] = 'Завуч'
+        new.append(dict(removed, abbr='Новый У. П.'))
+        ops = self.round_trip('teachers', old, new)
+        self.assertEqual(ops[0], {'op': 'remove', 'path': '/0'})
+        self.assertIn({'op': 'replace', 'path': '/0/job',
+                       'value': 'Завуч'}, ops)
+
+        # Teacher timetables are patched into the teachers
+        new[0]['timetable'] = load('act_teacher_timetable.json')
+        self.round_trip('teacher_timetables', old, new)
+
+    def test_changes(self):
+        old = load('act_changes.json')
+        new = copy.deepcopy(old[1:])
+        new[0]['8Б'].append('5 урок – нет')
+        new.append({'day': '28', 'month': 'сентября',
+                    'wkday': 'Четверг', '9А': ['Уроков нет']})
+        ops = self.round_trip('changes', old, new)
+        self.assertEqual(ops[0], {'op': 'remove', 'path': '/0'})
+        self.assertIn({'op': 'add', 'path': '/0/8Б/1',
+                       'value': '5 урок – нет'}, ops)
+
+    def test_vacant_rooms(self):
+        old = load('act_vacant_rooms.json')
+        new = copy.deepcopy(old)
+        new[0][0]['1'] = ['102']
+        new[0][1]['1'] = ['101']
+        del new[2][0]['3']
+        ops = self.round_trip('vacant_rooms', old, new)
+        self.assertListEqual(ops,
+                             [{'op': 'replace', 'path': '/0/0/1',
+                               'value': ['102']},
+                              {'op': 'add', 'path': '/0/1/1/0',
+                               'value': '101'},
+                              {'op': 'remove', 'path': '/2/0/3'}])
+
+    def test_class_teachers(self):
+        old = {'8А': ['Учитель П. И.', 'Учитель П. М.'],
+               '9Б': ['Учитель П. Х.']}
+        new = {'8А': ['Учитель П. И.'],
+               '9Б': ['Учитель П. Х.'],
+               '10В': ['Учитель П. М.']}
+        self.round_trip('class_teachers', old, new)
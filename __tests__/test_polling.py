@@ -0,0 +1,92 @@
+import datetime
+import json
+import random
+import unittest
+from polling import PollingPolicy, DAY, HOUR
+from scheduler import AdaptiveJob
+
+
+class TestPollingPolicy(unittest.TestCase):
+    def setUp(self):
+        with open('__tests__/test_files/december.json') as dec:
+            plan = [[] for i in range(10)]
+            plan[3] = json.load(dec)
+
+        rings = [{'start': '9:00', 'end': '9:40', 'type': 'lesson'},
+                 {'len': 10, 'type': 'break'},
+                 {'start': '9:50', 'end': '15:15', 'type': 'lesson'}]
+
+        self.storage = {'study_plan': json.dumps(plan),
+                        'rings_timetable': json.dumps(rings)}
+        self.policy = PollingPolicy(self.storage)
+
+    def time(self, month: int, day: int, hour: int, minute: int = 0):
+        return datetime.datetime(2017, month, day, hour, minute,
+                                 tzinfo=self.policy.tz).timestamp()
+
+    def test_day_type(self):
+        self.policy.load(0)
+        self.assertEqual(self.policy.day_type(datetime.date(2017, 12, 4)),
+                         'study')
+        self.assertEqual(self.policy.day_type(datetime.date(2017, 12, 3)),
+                         'weekend')
+        self.assertEqual(self.policy.day_type(datetime.date(2017, 12, 20)),
+                         'session')
+        self.assertEqual(self.policy.day_type(datetime.date(2017, 12, 30)),
+                         'holidays')
+        self.assertIsNone(self.policy.day_type(datetime.date(2017, 7, 1)))
+        self.assertIsNone(self.policy.day_type(datetime.date(2017, 11, 1)))
+
+    def test_changes(self):
+        busy = self.policy.busy_interval
+        idle = self.policy.idle_interval
+        interval = self.policy.interval
+
+        # Study day: school hours, early morning and evening
+        self.assertEqual(interval('changes', self.time(12, 4, 10)), busy)
+        self.assertEqual(interval('changes', self.time(12, 4, 8, 5)), busy)
+        self.assertEqual(interval('changes', self.time(12, 4, 7, 30)), idle)
+        self.assertEqual(interval('changes', self.time(12, 4, 20)), idle)
+        # Session
+        self.assertEqual(interval('changes', self.time(12, 20, 12)), busy)
+        # Sunday before a study day
+        self.assertEqual(interval('changes', self.time(12, 3, 12)), idle)
+        # Holidays and summer
+        self.assertIsNone(interval('changes', self.time(12, 30, 12)))
+        self.assertIsNone(interval('changes', self.time(7, 10, 12)))
+
+    def test_vacant_rooms(self):
+        interval = self.policy.interval
+        self.assertEqual(interval('vacant_rooms', self.time(12, 4, 3)), DAY)
+        self.assertIsNone(interval('vacant_rooms', self.time(12, 3, 3)))
+        self.assertIsNone(interval('vacant_rooms', self.time(12, 30, 3)))
+
+    def test_no_plan(self):
+        policy = PollingPolicy({})
+        self.assertEqual(policy.interval('changes', self.time(7, 10, 23)),
+                         policy.busy_interval)
+        self.assertEqual(policy.interval('vacant_rooms', self.time(7, 10, 3)),
+                         DAY)
+        self.assertTupleEqual(policy.hours, policy.default_hours)
+
+    def test_reload(self):
+        now = self.time(12, 30, 12)
+        self.assertIsNone(self.policy.interval('changes', now))
+
+        del self.storage['study_plan']
+        self.assertIsNone(self.policy.interval('changes', now + HOUR - 1))
+        self.assertEqual(self.policy.interval('changes', now + HOUR),
+                         self.policy.busy_interval)
+
+    def test_adaptive_job(self):
+        job = AdaptiveJob('changes', self.policy)
+        rand = random.Random(0)
+        self.assertTrue(job.allowed(self.time(12, 4, 10)))
+        self.assertFalse(job.allowed(self.time(12, 30, 10)))
+
+        last = self.time(12, 4, 10)
+        self.assertEqual(job.next_run(last, rand),
+                         last + self.policy.busy_interval)
+        last = self.time(12, 4, 21)
+        self.assertEqual(job.next_run(last, rand),
+                         last + self.policy.idle_interval)
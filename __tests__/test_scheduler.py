@@ -0,0 +1,115 @@
+import datetime
+import json
+import random
+import unittest
+from scheduler import Job, Scheduler, DAY, MINUTE
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        # Monday, 2 October 2017
+        self.now = datetime.datetime(2017, 10, 2, 12).timestamp()
+        self.storage = {}
+        self.runs = []
+
+    def scheduler(self, jobs, run=None):
+        return Scheduler(run or self.runs.append, self.storage,
+                         jobs=jobs,
+                         clock=lambda: self.now,
+                         sleep=lambda s: None,
+                         rand=random.Random(0))
+
+    def test_intervals(self):
+        sched = self.scheduler([Job('changes', 15 * MINUTE),
+                                Job('full_perm_timetable', DAY)])
+        self.assertEqual(sched.run_pending(), 15 * MINUTE)
+        self.assertListEqual(self.runs, ['changes', 'full_perm_timetable'])
+
+        self.now += 15 * MINUTE
+        sched.run_pending()
+        self.now += 10 * MINUTE
+        sched.run_pending()
+        self.assertListEqual(self.runs[2:], ['changes'])
+
+        self.assertDictEqual(json.loads(self.storage['scheduler/last_run']),
+                             {'changes': self.now - 10 * MINUTE,
+                              'full_perm_timetable': self.now - 25 * MINUTE})
+
+    def test_restart(self):
+        self.storage['scheduler/last_run'] = json.dumps({
+            'changes': self.now - 20 * MINUTE,
+            'teachers': self.now - DAY})
+        sched = self.scheduler([Job('changes', 15 * MINUTE),
+                                Job('teachers', 30 * DAY),
+                                Job('class_list', 300 * DAY)])
+        sched.run_pending()
+        self.assertListEqual(self.runs, ['changes', 'class_list'])
+
+    def test_jitter(self):
+        job = Job('changes', 15 * MINUTE, jitter=MINUTE)
+        rand = random.Random(0)
+        for i in range(20):
+            delay = job.next_run(self.now, rand) - self.now
+            self.assertGreaterEqual(delay, 15 * MINUTE)
+            self.assertLessEqual(delay, 16 * MINUTE)
+
+    def test_allowed(self):
+        sched = self.scheduler([Job('vacant_rooms', DAY, weekdays=range(6)),
+                                Job('class_list', DAY, months=(9,))])
+        sched.run_pending()
+        self.assertListEqual(self.runs, ['vacant_rooms'])
+
+        # Sunday
+        self.now += 6 * DAY
+        sched.run_pending()
+        self.assertListEqual(self.runs, ['vacant_rooms'])
+
+    def test_allowed_tz(self):
+        utc5 = datetime.timezone(datetime.timedelta(hours=5))
+        job = Job('vacant_rooms', DAY, weekdays=range(6))
+        # Sunday 23:00 in UTC is already Monday in UTC+5
+        sunday = datetime.datetime(2017, 10, 1, 23,
+                                   tzinfo=datetime.timezone.utc).timestamp()
+        self.assertFalse(job.allowed(sunday, datetime.timezone.utc))
+        self.assertTrue(job.allowed(sunday, utc5))
+
+        self.now = sunday
+        sched = Scheduler(self.runs.append, self.storage,
+                          jobs=[job],
+                          clock=lambda: self.now,
+                          sleep=lambda s: None,
+                          tz=utc5)
+        sched.run_pending()
+        self.assertListEqual(self.runs, ['vacant_rooms'])
+
+    def test_follows(self):
+        sched = self.scheduler([Job('full_perm_timetable', DAY),
+                                Job('teacher_timetables', DAY,
+                                    follows='full_perm_timetable')])
+        self.assertEqual(sched.run_pending(), DAY)
+        self.assertListEqual(self.runs, ['full_perm_timetable',
+                                         'teacher_timetables'])
+
+        # The follower has no timer of its own
+        self.now += DAY
+        sched.run_pending()
+        self.assertListEqual(self.runs[2:], ['full_perm_timetable',
+                                             'teacher_timetables'])
+
+        # Without the job it follows it runs at its own interval
+        del self.runs[:]
+        self.storage.clear()
+        sched = self.scheduler([Job('teacher_timetables', DAY,
+                                    follows='full_perm_timetable')])
+        self.assertEqual(sched.run_pending(), DAY)
+        self.assertListEqual(self.runs, ['teacher_timetables'])
+
+    def test_failure(self):
+        def run(cmd):
+            self.runs.append(cmd)
+            raise RuntimeError('upstream is down')
+
+        sched = self.scheduler([Job('teachers', 30 * DAY)], run=run)
+        sched.log.disabled = True
+        self.assertEqual(sched.run_pending(), sched.retry_delay)
+        self.assertNotIn('scheduler/last_run', self.storage)
@@ -0,0 +1,77 @@
+import json
+import unittest
+from diff_computer import DiffComputer
+from encoder import NoWSEncoder
+from lessons import Lesson, LessonPool
+from serializer import Serializer, backends, get_serializer
+from storage import MemoryStorage
+
+
+def load(name: str):
+    with open('__tests__/test_files/' + name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TestSerializer(unittest.TestCase):
+    def setUp(self):
+        self.data = {'full_perm_timetable': {
+                         '8А': load('act_perm_timetable.json')},
+                     'teachers': load('act_teachers.json'),
+                     'changes': load('act_changes.json'),
+                     'control': ['\x00\x1f ', 1, None, True],
+                     'lesson': Lesson(name='Химия', teacher=None,
+                                       room='301')}
+
+    def test_backends(self):
+        self.assertIsInstance(get_serializer('json'), Serializer)
+        self.assertEqual(get_serializer().name,
+                         'orjson' if 'orjson' in backends else 'json')
+        with self.assertRaises(KeyError):
+            get_serializer('yaml')
+
+    def test_output(self):
+        # Every backend encodes as NoWSEncoder does, so that the stored
+        # hashes don't depend on the backend
+        for name in backends:
+            serializer = get_serializer(name)
+            for sort_keys in (False, True):
+                self.assertEqual(
+                    serializer.encoder(sort_keys=sort_keys).encode(self.data),
+                    NoWSEncoder(sort_keys=sort_keys).encode(self.data))
+
+            text = serializer.encoder().encode(self.data)
+            self.assertEqual(serializer.loads(text), self.data)
+
+            pool = LessonPool()
+            decoded = serializer.loads(text, object_hook=pool.hook)
+            self.assertIsInstance(decoded['lesson'], Lesson)
+            self.assertEqual(decoded, self.data)
+
+    def test_encode_once(self):
+        # Data sent as a whole is the stored encoding
+        storage = MemoryStorage()
+        comp = DiffComputer(storage)
+        encoded = comp.diff_rings_timetable([['09:00', '09:45']])
+        self.assertIs(encoded, storage['rings_timetable'])
+        self.assertIs(comp.diff_changes(load('act_changes.json')),
+                      storage['changes'])
+
+        old, encoded = comp.exchange_encoded('class_list', {'8': ['8А']})
+        self.assertIsNone(old)
+        self.assertIs(encoded, storage['class_list'])
+
+    @unittest.skipUnless('orjson' in backends, 'orjson is not installed')
+    def test_diff_computer(self):
+        tmtbl = {'8А': load('act_perm_timetable.json')}
+        diffs = []
+        for name in ('json', 'orjson'):
+            comp = DiffComputer(MemoryStorage(), sharded=True,
+                                serializer=get_serializer(name))
+            diffs.append(comp.diff_full_perm_timetable(
+                json.loads(json.dumps(tmtbl))))
+            changed = json.loads(json.dumps(tmtbl))
+            changed['8А'][0][0][0]['room'] = '999'
+            diffs.append(comp.diff_full_perm_timetable(changed))
+            diffs.append(comp.storage['full_perm_timetable/manifest'])
+
+        self.assertListEqual(diffs[:3], diffs[3:])
@@ -0,0 +1,121 @@
+import unittest
+import requests
+from httmock import HTTMock, all_requests
+from session import ApiSession, Policy
+from throttle import CircuitOpen
+
+
+class TestApiSession(unittest.TestCase):
+    def setUp(self):
+        self.delays = []
+        self.session = ApiSession(sleep=self.delays.append)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_endpoint(self):
+        api = 'http://lyceum.urfu.ru/study/mobile.php?'
+        self.assertEqual(self.session.endpoint(api + 'f=1&k=8%E0'),
+                         'perm_timetable')
+        self.assertEqual(self.session.endpoint(api + 'f=3&d=2'),
+                         'occupied_rooms')
+        self.assertEqual(self.session.endpoint(api + 'f=7'),
+                         'teacher_list')
+        self.assertEqual(self.session.endpoint(
+            'http://lyceum.urfu.ru/study/izmenHtml.php'), 'changes')
+        self.assertEqual(self.session.endpoint(
+            'http://lyceum.urfu.ru/study/calgraf.odt'), 'study_plan')
+        self.assertEqual(self.session.endpoint(
+            'http://lyceum.urfu.ru/offic/?id=6'), 'staff')
+        self.assertIsNone(self.session.endpoint('http://example.com/'))
+
+    def test_retry(self):
+        calls = []
+
+        @all_requests
+        def flaky(url, req):
+            calls.append(url)
+            if len(calls) < 3:
+                return {'status_code': 503, 'content': ''}
+            return 'ok'
+
+        with HTTMock(flaky):
+            resp = self.session.get('http://lyceum.urfu.ru/study/?id=0')
+        self.assertEqual(resp.text, 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertListEqual(self.delays, [0.5, 1])
+
+    def test_give_up(self):
+        session = ApiSession(policies={'changes': Policy(1, 1, 2)},
+                             sleep=self.delays.append)
+
+        @all_requests
+        def failure(url, req):
+            return {'status_code': 500, 'content': ''}
+
+        with HTTMock(failure):
+            resp = session.get('http://lyceum.urfu.ru/study/izmenHtml.php')
+        self.assertEqual(resp.status_code, 500)
+        self.assertListEqual(self.delays, [2])
+
+        @all_requests
+        def not_found(url, req):
+            return {'status_code': 404, 'content': ''}
+
+        with HTTMock(not_found):
+            resp = session.get('http://lyceum.urfu.ru/study/izmenHtml.php')
+        self.assertEqual(resp.status_code, 404)
+        self.assertListEqual(self.delays, [2])
+
+        @all_requests
+        def timeout(url, req):
+            raise requests.Timeout('timed out')
+
+        with HTTMock(timeout):
+            with self.assertRaises(requests.Timeout):
+                session.get('http://lyceum.urfu.ru/study/izmenHtml.php')
+        self.assertListEqual(self.delays, [2, 2])
+
+    def test_circuit_breaker(self):
+        now = [0]
+        session = ApiSession(policies={None: Policy(1, 1, 2)},
+                             failure_threshold=2,
+                             reset_timeout=60,
+                             sleep=self.delays.append,
+                             clock=lambda: now[0])
+        calls = []
+
+        @all_requests
+        def down(url, req):
+            calls.append(url)
+            raise requests.ConnectionError('connection refused')
+
+        url = 'http://example.com/'
+        with HTTMock(down):
+            for i in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    session.get(url)
+            self.assertEqual(len(calls), 4)
+            self.assertTrue(session.is_open(url))
+
+            with self.assertRaises(CircuitOpen):
+                session.get(url)
+            self.assertEqual(len(calls), 4)
+
+        # Other hosts are not affected
+        self.assertFalse(session.is_open('http://lyceum.urfu.ru/'))
+
+        now[0] += 60
+
+        @all_requests
+        def up(url, req):
+            return 'ok'
+
+        with HTTMock(up):
+            self.assertEqual(session.get(url).text, 'ok')
+        self.assertFalse(session.is_open(url))
+
+        stats = session.stats.summary()[None]
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['errors'], 4)
+
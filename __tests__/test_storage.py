@@ -2,7 +2,7 @@ import os
 import unittest
 from urllib.parse import urlparse
 import psycopg2
-from storage import Storage
+from storage import MemoryStorage, Storage, content_hash
 
 
 class TestStorage(unittest.TestCase):
@@ -63,3 +63,110 @@ class TestStorage(unittest.TestCase):
 
         self.db.commit()
         c.close()
+
+    def test_get_many(self):
+        c = self.db.cursor()
+        c.execute('''INSERT INTO storage
+                     VALUES ('key1', '1'), ('key2', '2'), ('key3', '3')''')
+        self.db.commit()
+        c.close()
+
+        self.assertDictEqual(self.storage.get_many(['key1', 'key3',
+                                                    'non-existent']),
+                             {'key1': '1', 'key3': '3'})
+        self.assertDictEqual(self.storage.get_many([]), {})
+
+    def test_set_many(self):
+        self.storage['key1'] = 'old'
+        self.storage.set_many({'key1': 'new',
+                               'key2': '["value"]'})
+        self.storage.set_many({})
+
+        c = self.db.cursor()
+        c.execute('''SELECT key, value FROM storage ORDER BY key''')
+        self.assertListEqual(c.fetchall(),
+                             [('key1', 'new'),
+                              ('key2', '["value"]')])
+        self.db.commit()
+        c.close()
+
+    def test_delete_many(self):
+        self.storage.set_many({'key1': '1', 'key2': '2', 'key3': '3'})
+        self.storage.delete_many(['key1', 'key3', 'non-existent'])
+        self.storage.delete_many([])
+
+        self.assertDictEqual(self.storage.get_many(['key1', 'key2', 'key3']),
+                             {'key2': '2'})
+        with self.assertRaises(KeyError):
+            self.storage['key1']
+
+    def test_hash(self):
+        self.storage['key1'] = '["value"]'
+        self.storage.set_many({'key2': '2'})
+        self.assertEqual(self.storage.get_hash('key1'),
+                         content_hash('["value"]'))
+        self.assertEqual(self.storage.get_hash('key2'),
+                         content_hash('2'))
+
+        c = self.db.cursor()
+        c.execute('''INSERT INTO storage (key, value)
+                     VALUES ('legacy', '1')''')
+        self.db.commit()
+        c.close()
+        self.assertIsNone(self.storage.get_hash('legacy'))
+
+        with self.assertRaises(KeyError):
+            self.storage.get_hash('non-existent')
+
+    def test_reconnect(self):
+        self.storage['key1'] = '1'
+        self.storage.close()
+        self.storage.ensure_connection()
+        self.assertEqual(self.storage['key1'], '1')
+
+        db = self.storage.db
+        self.storage.ensure_connection()
+        self.assertIs(self.storage.db, db)
+
+    def test_read_transactions(self):
+        idle = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.storage['key1'] = '1'
+        self.assertEqual(self.storage['key1'], '1')
+        self.storage.get_many(['key1'])
+        # Reads don't leave the connection in a transaction
+        self.assertEqual(self.storage.db.get_transaction_status(), idle)
+
+        # A failed read doesn't break the next ones
+        with self.assertRaises(psycopg2.Error):
+            self.storage.get_many([1])
+        self.assertEqual(self.storage.db.get_transaction_status(), idle)
+        self.assertEqual(self.storage['key1'], '1')
+
+        # Neither does a transaction aborted by a query outside of Storage
+        c = self.storage.db.cursor()
+        with self.assertRaises(psycopg2.Error):
+            c.execute('''SELECT no_such_column FROM storage''')
+        c.close()
+        self.storage.ensure_connection()
+        self.assertEqual(self.storage['key1'], '1')
+
+
+class TestMemoryStorage(unittest.TestCase):
+    def test_interface(self):
+        storage = MemoryStorage()
+        storage.set('key1', '["value"]')
+        storage['key2'] = '2'
+        storage.set_many({'key3': '3', 'key4': 4})
+
+        self.assertEqual(storage.get('key1'), '["value"]')
+        self.assertEqual(storage['key4'], '4')
+        with self.assertRaises(KeyError):
+            storage.get('non-existent')
+
+        self.assertDictEqual(storage.get_many(['key1', 'key3', 'key5']),
+                             {'key1': '["value"]', 'key3': '3'})
+
+        storage.delete_many(['key1', 'key2', 'key5'])
+        self.assertDictEqual(dict(storage),
+                             {'key3': '3', 'key4': '4'})
+        self.assertEqual(storage.get_hash('key3'), content_hash('3'))
@@ -0,0 +1,91 @@
+import unittest
+from throttle import CircuitBreaker, EndpointStats, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.delays = []
+        self.bucket = TokenBucket(rate=2, burst=2, min_rate=0.5,
+                                  clock=lambda: self.now,
+                                  sleep=self.sleep)
+
+    def sleep(self, delay: float):
+        self.delays.append(delay)
+        self.now += delay
+
+    def test_burst(self):
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertEqual(self.bucket.acquire(), 0.5)
+        self.assertListEqual(self.delays, [0.5])
+
+        self.now += 10
+        self.assertEqual(self.bucket.acquire(), 0)
+
+    def test_adaptive(self):
+        self.bucket.failure()
+        self.assertEqual(self.bucket.rate, 1)
+        self.bucket.failure()
+        self.bucket.failure()
+        self.assertEqual(self.bucket.rate, 0.5)
+
+        for i in range(20):
+            self.bucket.success()
+        self.assertEqual(self.bucket.rate, 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.breaker = CircuitBreaker(threshold=3, reset_timeout=60,
+                                      clock=lambda: self.now)
+
+    def test_open(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.breaker.failure()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.is_open())
+
+        self.breaker.failure()
+        self.assertTrue(self.breaker.is_open())
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open(self):
+        for i in range(3):
+            self.breaker.failure()
+
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+        # Only one trial request is let through
+        self.assertFalse(self.breaker.allow())
+        self.breaker.failure()
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.success()
+        self.assertFalse(self.breaker.is_open())
+        self.assertTrue(self.breaker.allow())
+
+
+class TestEndpointStats(unittest.TestCase):
+    def test_summary(self):
+        stats = EndpointStats()
+        stats.record('changes', 0.5, True)
+        stats.record('changes', 1.5, False)
+        stats.record(None, 1, True)
+        self.assertDictEqual(stats.summary(),
+                             {'changes': {'requests': 2,
+                                          'errors': 1,
+                                          'avg_latency': 1,
+                                          'max_latency': 1.5},
+                              None: {'requests': 1,
+                                     'errors': 0,
+                                     'avg_latency': 1,
+                                     'max_latency': 1}})
+        stats.reset()
+        self.assertDictEqual(stats.summary(), {})
@@ -0,0 +1,179 @@
+from typing import Callable
+import base64
+import hashlib
+import json
+import threading
+import time
+import requests
+import requests.structures
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+class ResponseCache:
+    '''Cache of successful HTTP responses kept in a key-value storage.
+    Entries are keyed by the method, URL and request body and expire after
+    a time-to-live set per endpoint'''
+
+    # TTLs are shorter than the update intervals of the jobs that use
+    # the endpoints, so a scheduled job always gets fresh data, while jobs
+    # that run close to each other share the responses
+    default_ttls = {'class_list': DAY,
+                    'room_list': DAY,
+                    'teacher_list': DAY,
+                    # The staff directory is only used by the monthly
+                    # teachers job
+                    'staff': 29 * DAY,
+                    'study_plan': DAY,
+                    'rings_timetable': DAY,
+                    'perm_timetable': HOUR,
+                    'teacher_timetable': HOUR,
+                    'occupied_rooms': HOUR,
+                    'changes': 5 * MINUTE,
+                    None: 0}
+
+    key_prefix = 'cache/'
+
+    def __init__(self, storage, ttls: dict = None,
+                 max_stale: float = 7 * DAY,
+                 clock: Callable = time.time):
+        '''Initializes self. `storage` is a mapping-like object
+        (e.g. Storage) to keep the entries in. `ttls` maps endpoint names
+        to time-to-live in seconds and overrides the default ones.
+        Expired entries younger than `max_stale` seconds are served if
+        the upstream server fails'''
+        self.storage = storage
+        self.ttls = dict(self.default_ttls)
+        if ttls is not None:
+            self.ttls.update(ttls)
+
+        self.max_stale = max_stale
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def key(self, method: str, url: str, body=None) -> str:
+        '''Returns the storage key for a request'''
+        if isinstance(body, str):
+            body = body.encode()
+        digest = hashlib.sha1(method.upper().encode() + b' ' +
+                              url.encode() + b'\n' + (body or b''))
+        return self.key_prefix + digest.hexdigest()
+
+    def ttl(self, endpoint: str) -> float:
+        '''Returns the time-to-live for an endpoint, 0 means that
+        the responses are not cached'''
+        return self.ttls.get(endpoint, self.ttls[None])
+
+    def get(self, key: str, endpoint: str,
+            stale: bool = False) -> requests.Response:
+        '''Returns the cached response by key or None if there is no entry
+        or it has expired. If `stale` is True, expired entries are returned
+        as long as they are younger than `max_stale`'''
+        with self.lock:
+            try:
+                entry = json.loads(self.storage[key])
+            except KeyError:
+                return None
+
+        age = self.clock() - entry['time']
+        max_age = self.max_stale if stale else self.ttl(endpoint)
+        if age > max_age:
+            return None
+
+        resp = requests.Response()
+        resp.status_code = entry['status']
+        resp.url = entry['url']
+        resp.encoding = entry['encoding']
+        resp.headers = requests.structures.CaseInsensitiveDict(
+            entry['headers'])
+        resp._content = base64.b64decode(entry['body'])
+        return resp
+
+    def refresh(self, key: str, headers: dict):
+        '''Renews the entry by key after the server replied that it's not
+        modified to a request with the given headers. The entry is only
+        renewed if it has the validators sent in the request, otherwise
+        it's not known to be the current one'''
+        headers = requests.structures.CaseInsensitiveDict(headers or {})
+        with self.lock:
+            try:
+                entry = json.loads(self.storage[key])
+            except KeyError:
+                return
+
+            cached = requests.structures.CaseInsensitiveDict(entry['headers'])
+            etag = headers.get('If-None-Match')
+            modified = headers.get('If-Modified-Since')
+            if not ((etag and cached.get('ETag') == etag) or
+                    (modified and cached.get('Last-Modified') == modified)):
+                return
+
+            entry['time'] = self.clock()
+            self.storage[key] = json.dumps(entry, separators=(',', ':'))
+
+    def put(self, key: str, resp: requests.Response):
+        '''Stores a response by key'''
+        entry = {'time': self.clock(),
+                 'status': resp.status_code,
+                 'url': resp.url,
+                 'encoding': resp.encoding,
+                 'headers': dict(resp.headers),
+                 'body': base64.b64encode(resp.content).decode()}
+
+        with self.lock:
+            self.storage[key] = json.dumps(entry, separators=(',', ':'))
+
+
+class Fingerprints:
+    '''Validators of the last processed response for every endpoint:
+    the ETag and Last-Modified headers if the server sent them and
+    the SHA-256 of the body. Used to skip parsing of unchanged data'''
+
+    key_prefix = 'fingerprint/'
+
+    def __init__(self, storage):
+        '''Initializes self. `storage` is a mapping-like object
+        (e.g. Storage) to keep the fingerprints in'''
+        self.storage = storage
+
+    def load(self, name: str) -> dict:
+        '''Returns the stored fingerprint for a given name or None'''
+        try:
+            return json.loads(self.storage[self.key_prefix + name])
+        except KeyError:
+            return None
+
+    def headers(self, name: str) -> dict:
+        '''Returns the headers for a conditional request'''
+        fpr = self.load(name)
+        if fpr is None:
+            return {}
+
+        headers = {}
+        if fpr.get('etag'):
+            headers['If-None-Match'] = fpr['etag']
+        if fpr.get('last_modified'):
+            headers['If-Modified-Since'] = fpr['last_modified']
+        return headers
+
+    def unchanged(self, name: str, resp: requests.Response) -> bool:
+        '''Checks whether a response is the same as the last saved one'''
+        if resp.status_code == 304:
+            return True
+        if resp.status_code != 200:
+            return False
+
+        fpr = self.load(name)
+        if fpr is None:
+            return False
+        return fpr['sha256'] == hashlib.sha256(resp.content).hexdigest()
+
+    def save(self, name: str, resp: requests.Response):
+        '''Saves the fingerprint of a processed response'''
+        fpr = {'etag': resp.headers.get('ETag'),
+               'last_modified': resp.headers.get('Last-Modified'),
+               'sha256': hashlib.sha256(resp.content).hexdigest()}
+        self.storage[self.key_prefix + name] = json.dumps(fpr)
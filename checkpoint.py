@@ -0,0 +1,54 @@
+from typing import Callable, Iterable
+import json
+import time
+
+
+HOUR = 60 * 60
+
+
+class Checkpoints:
+    '''Results of the items of a long gathering job (classes, teachers)
+    saved to a key-value storage as soon as each of them is fetched.
+    A job that was interrupted resumes from the saved items instead of
+    fetching everything again'''
+
+    key_prefix = 'checkpoint/'
+
+    def __init__(self, storage, max_age: float = 12 * HOUR,
+                 clock: Callable = time.time):
+        '''Initializes self. `storage` is a mapping-like object
+        (e.g. Storage) to keep the results in. Results older than
+        `max_age` seconds are fetched again'''
+        self.storage = storage
+        self.max_age = max_age
+        self.clock = clock
+
+    def key(self, job: str, item: str) -> str:
+        '''Returns the storage key for an item of a job'''
+        return '{}{}/{}'.format(self.key_prefix, job, item)
+
+    def load(self, job: str, items: Iterable[str]) -> dict:
+        '''Returns a dictionary of the saved results of a job's items.
+        Items without a fresh result are left out'''
+        items = list(items)
+        keys = {self.key(job, i): i for i in items}
+        now = self.clock()
+
+        results = {}
+        for key, value in self.storage.get_many(keys).items():
+            entry = json.loads(value)
+            if now - entry['time'] <= self.max_age:
+                results[keys[key]] = entry['value']
+
+        return results
+
+    def save(self, job: str, item: str, value):
+        '''Saves the result of an item'''
+        entry = {'time': self.clock(), 'value': value}
+        self.storage[self.key(job, item)] = json.dumps(entry,
+                                                       ensure_ascii=False,
+                                                       separators=(',', ':'))
+
+    def clear(self, job: str, items: Iterable[str]):
+        '''Deletes the saved results of a job once it's complete'''
+        self.storage.delete_many(self.key(job, i) for i in items)
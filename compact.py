@@ -0,0 +1,94 @@
+# Version of the compact format, increased on incompatible changes
+version = 1
+
+# Data to the path of its lessons ('*' matches every item of a list or
+# every value of a dictionary) and the fields of a lesson
+layouts = {'full_perm_timetable': ('*/*/*/*', ('name', 'teacher', 'room')),
+           'teachers': ('*/timetable/*/*', ('class', 'name', 'room')),
+           'teacher_timetables': ('*/timetable/*/*',
+                                  ('class', 'name', 'room')),
+           'class_teachers': ('*/*', ('teacher', 'subject'))}
+
+
+def walk(value, tokens: list, func):
+    '''Returns a copy of a value with `func` applied to everything at
+    the path given as a list of tokens'''
+    if value is None:
+        return None
+    if not tokens:
+        return func(value)
+
+    token, rest = tokens[0], tokens[1:]
+    if token == '*':
+        if isinstance(value, list):
+            return [walk(i, rest, func) for i in value]
+        if isinstance(value, dict):
+            return {k: walk(v, rest, func) for k, v in value.items()}
+    elif isinstance(value, dict) and token in value:
+        value = dict(value)
+        value[token] = walk(value[token], rest, func)
+
+    return value
+
+
+class CompactEncoder:
+    '''Encodes data with lessons into a compact form: every distinct
+    string of the lessons (names, teachers, rooms, classes) is sent once
+    in a string table, and every lesson is sent as a list of the indices
+    of its fields' values in it (or null for None).
+    Lessons that don't have exactly the expected fields are kept as is'''
+
+    def __init__(self, key: str):
+        '''Initializes self for the data with the given key,
+        which has to be in `layouts`'''
+        self.path, self.fields = layouts[key]
+        self.strings = []
+        self.indices = {}
+
+    def index(self, string: str) -> int:
+        '''Returns the index of a string in the string table'''
+        try:
+            return self.indices[string]
+        except KeyError:
+            self.indices[string] = len(self.strings)
+            self.strings.append(string)
+            return self.indices[string]
+
+    def encode_lesson(self, lesson):
+        if (not isinstance(lesson, dict) or
+                set(lesson) != set(self.fields) or
+                any(i is not None and not isinstance(i, str)
+                    for i in lesson.values())):
+            return lesson
+
+        return [None if lesson[i] is None else self.index(lesson[i])
+                for i in self.fields]
+
+    def encode(self, value) -> dict:
+        '''Returns the compact form of a value, ready to be encoded
+        in JSON'''
+        data = walk(value, self.path.split('/'), self.encode_lesson)
+        return {'v': version,
+                'path': self.path,
+                'fields': list(self.fields),
+                'strings': self.strings,
+                'data': data}
+
+    @staticmethod
+    def decode(payload: dict):
+        '''Reference decoder: returns the original value of
+        a JSON-decoded compact form'''
+        if payload.get('v') != version:
+            raise ValueError('unsupported compact format version: {}'
+                             .format(payload.get('v')))
+
+        fields, strings = payload['fields'], payload['strings']
+
+        def decode_lesson(lesson):
+            if not isinstance(lesson, list):
+                return lesson
+            return {field: None if idx is None else strings[idx]
+                    for field, idx in zip(fields, lesson)}
+
+        return walk(payload['data'], payload['path'].split('/'),
+                    decode_lesson)
@@ -1,14 +1,12 @@
+import copy
 import json
 import logging
 import os
 import sys
 from urllib.parse import urlparse
 
-import requests
-
-from diff_computer import DiffComputer, NoUpdate
-from gatherer import DataGatherer
-from storage import Storage
+# Modules that load heavy dependencies (requests, psycopg2, odfpy)
+# are imported when a command actually needs them
 
 
 log_fmt = logging.Formatter('[{asctime}] [{levelname}] [{name}]\n{message}\n',
@@ -23,8 +21,6 @@ class OneSignal:
     '''Class to communicate with the OneSignal API
     for sending push notifications'''
 
-    headers = {'Content-Type': 'application/json',
-               'Authorization': os.environ['ONESIGNAL_AUTH']}
     api_url = 'https://onesignal.com/api/v1/notifications'
     app_id = '928a41eb-7482-4dd3-b6e3-45fe9789fee1'
     error_msg = 'push notification rejected ({})'
@@ -33,17 +29,25 @@ class OneSignal:
     log.addHandler(cns_log)
     log.setLevel(logging.DEBUG)
 
+    @classmethod
+    def headers(cls) -> dict:
+        '''Returns the request headers with the credentials'''
+        return {'Content-Type': 'application/json',
+                'Authorization': os.environ['ONESIGNAL_AUTH']}
+
     @classmethod
     def send(cls, key: str, value: str):
         '''Sends a push notification that consists of a key and a value.
         The key is sent as the heading, the value is sent as the body'''
+        import requests
+
         payload = {'app_id': cls.app_id,
                    'included_segments': ['Active Users', 'Inactive Users'],
                    'headings': {'en': key},
                    'contents': {'en': value}}
 
         resp = requests.post(cls.api_url,
-                             headers=cls.headers,
+                             headers=cls.headers(),
                              data=json.dumps(payload))
 
         if resp.status_code != 200:
@@ -51,59 +55,226 @@ class OneSignal:
 
 
 class DataUpdater:
-    '''Class to control the data updating and delivery'''
-    url = urlparse(os.environ['DATABASE_URL'])
-    store = Storage(host=url.hostname,
-                    dbname=url.path[1:],
-                    user=url.username,
-                    password=url.password)
-    gth = DataGatherer()
-    comp = DiffComputer(store)
+    '''Class to control the data updating and delivery.
+    The database connection and the helpers are created on first use'''
+    store = None
+    gth = None
+    comp = None
+    norm = None
 
     log = logging.Logger('OneSignal')
     log.addHandler(cns_log)
     log.setLevel(logging.DEBUG)
 
-    cmd_map = {'class_list': (gth.get_class_list,
-                              comp.diff_class_list),
-               'study_plan': (gth.get_study_plan,
-                              comp.diff_study_plan),
-               'rings_timetable': (gth.get_rings_timetable,
-                                   comp.diff_rings_timetable),
-               'full_perm_timetable': (gth.get_full_perm_timetable,
-                                       comp.diff_full_perm_timetable),
-               'teachers': (gth.get_teachers,
-                            comp.diff_teachers),
-               'changes': (gth.get_changes,
-                           comp.diff_changes),
-               'vacant_rooms': (gth.get_vacant_rooms,
-                                comp.diff_vacant_rooms),
-               'class_teachers': (gth.get_class_teachers,
-                                  comp.diff_class_teachers)}
+    # Command to the names of its gathering and diffing methods
+    cmd_map = {'class_list': ('get_class_list',
+                              'diff_class_list'),
+               'study_plan': ('get_study_plan',
+                              'diff_study_plan'),
+               'rings_timetable': ('get_rings_timetable',
+                                   'diff_rings_timetable'),
+               'full_perm_timetable': ('get_full_perm_timetable',
+                                       'diff_full_perm_timetable'),
+               'teachers': ('get_teachers',
+                            'diff_teachers'),
+               'teacher_timetables': ('get_teacher_timetables',
+                                      'diff_teacher_timetables'),
+               'changes': ('get_changes',
+                           'diff_changes'),
+               'vacant_rooms': ('get_vacant_rooms',
+                                'diff_vacant_rooms'),
+               'class_teachers': ('get_class_teachers',
+                                  'diff_class_teachers')}
+
+    # Data that commands pass to the gathering methods: the name of
+    # the argument, the helper and the method that gets it, the method's
+    # arguments and the inputs it depends on
+    input_map = {'cls_list': ('gth', 'get_class_list', {'group': False}, ()),
+                 'full_tmtbl': ('gth', 'get_full_perm_timetable', {},
+                                ('cls_list',)),
+                 'stored_tmtbl': ('comp', 'load',
+                                  {'key': 'full_perm_timetable'}, ()),
+                 'dirty': ('comp', 'dirty_teachers', {}, ())}
+    cmd_inputs = {'class_list': ('cls_list',),
+                  'full_perm_timetable': ('full_tmtbl',),
+                  'teachers': ('full_tmtbl',),
+                  'teacher_timetables': ('stored_tmtbl', 'dirty'),
+                  'vacant_rooms': ('full_tmtbl',),
+                  'class_teachers': ('full_tmtbl',)}
+
+    modes = {'daemon': 'run every command at its update interval',
+             'all': 'run every command, fetching shared data once'}
+
     @classmethod
-    def get_cmd(cls) -> str:
-        '''Retrieves a command from the program's arguments or
+    def get_cmds(cls) -> list:
+        '''Retrieves commands from the program's arguments or
         prints a help message on failure'''
-        if len(sys.argv) < 2 or sys.argv[1] not in cls.cmd_map:
-            print('Usage: {} cmd'.format(sys.argv[0]))
+        args = sys.argv[1:]
+        if (not args or
+                args[0] not in cls.modes and
+                any(i not in cls.cmd_map for i in args)):
+            print('Usage: {} cmd [cmd ...]'.format(sys.argv[0]))
             print('cmd can be one of the following:')
             for cmd in cls.cmd_map:
                 print(' -', cmd)
+            for mode, descr in cls.modes.items():
+                print(' -', mode, '-', descr)
             sys.exit(0)
 
-        return sys.argv[1]
+        if args[0] == 'all':
+            return list(cls.cmd_map)
+        return args
 
     @classmethod
-    def update(cls):
-        '''Activates the updating process'''
-        cmd = cls.get_cmd()
-        gather, diff = cls.cmd_map[cmd]
+    def setup(cls):
+        '''Connects to the database and creates the helpers
+        unless it's already done'''
+        if cls.store is not None:
+            return
+
+        from cache import Fingerprints, ResponseCache
+        from checkpoint import Checkpoints
+        from diff_computer import DiffComputer
+        from gatherer import DataGatherer
+        from lessons import LessonPool
+        from normalizer import Normalizer
+        from session import ApiSession
+        from storage import Storage
+
+        url = urlparse(os.environ['DATABASE_URL'])
+        cls.store = Storage(host=url.hostname,
+                            dbname=url.path[1:],
+                            user=url.username,
+                            password=url.password)
+        lessons = LessonPool()
+        cls.gth = DataGatherer(session=ApiSession(
+                                   cache=ResponseCache(cls.store)),
+                               fingerprints=Fingerprints(cls.store),
+                               checkpoints=Checkpoints(cls.store),
+                               lessons=lessons)
+        diff_format = os.environ.get('DIFF_FORMAT')
+        layout = os.environ.get('STORAGE_LAYOUT')
+        cls.comp = DiffComputer(cls.store, sharded=layout == 'sharded',
+                                patches=diff_format == 'patch',
+                                compact=diff_format == 'compact',
+                                lessons=lessons)
+        cls.norm = Normalizer()
+
+    @classmethod
+    def plan(cls, cmds: list) -> list:
+        '''Returns the list of inputs needed by the given commands,
+        ordered so that every input comes after its dependencies'''
+        order = []
+
+        def visit(name: str):
+            if name in order:
+                return
+            for dep in cls.input_map[name][3]:
+                visit(dep)
+            order.append(name)
+
+        for cmd in cmds:
+            for name in cls.cmd_inputs.get(cmd, ()):
+                visit(name)
+
+        return order
+
+    @classmethod
+    def get_input(cls, name: str, inputs: dict):
+        '''Gets an input, given the inputs that it depends on'''
+        helper, method, kwargs, deps = cls.input_map[name]
+        kwargs = dict(kwargs, **{i: inputs[i] for i in deps})
+        return getattr(getattr(cls, helper), method)(**kwargs)
+
+    @classmethod
+    def run_many(cls, cmds: list):
+        '''Runs several commands, fetching the inputs that they share once.
+        A failure of one command doesn't stop the rest'''
+        cls.setup()
+        cls.store.ensure_connection()
+        # Only the fetched inputs are shared, the rest may be changed by
+        # the previous commands and are read by `run`
+        plan = [i for i in cls.plan(cmds) if cls.input_map[i][0] == 'gth']
+        cls.log.info('fetching shared inputs: {}'.format(', '.join(plan)))
+
+        inputs = {}
+        for name in plan:
+            inputs[name] = cls.get_input(name, inputs)
+
+        for cmd in cmds:
+            cmd_inputs = {i: inputs[i] for i in cls.cmd_inputs.get(cmd, ())
+                          if i in inputs}
+            try:
+                # Diffing changes the data in place
+                cls.run(cmd, **copy.deepcopy(cmd_inputs))
+            except Exception:
+                cls.log.exception('{} failed'.format(cmd))
+
+    @classmethod
+    def run(cls, cmd: str, **inputs):
+        '''Gathers the data for a command, computes the difference
+        and sends it out. `inputs` are passed to the gathering method'''
+        from diff_computer import NoUpdate
+
+        cls.setup()
+        cls.store.ensure_connection()
+        gather, diff = (getattr(cls.gth, cls.cmd_map[cmd][0]),
+                        getattr(cls.comp, cls.cmd_map[cmd][1]))
+        # Inputs that are not fetched over the network are not
+        # gathered by the gathering methods themselves
+        for name in cls.cmd_inputs.get(cmd, ()):
+            if name not in inputs and cls.input_map[name][0] != 'gth':
+                inputs[name] = cls.get_input(name, inputs)
         try:
-            result = diff(gather())
+            result = diff(cls.norm.normalize(cmd, gather(**inputs)))
             cls.log.debug('computed diff for {}'.format(cmd))
             cls.log.debug(result)
             OneSignal.send(cmd, result)
         except NoUpdate:
             cls.log.info('no update needed')
+        except Exception:
+            # The data wasn't stored, so the next run has to process
+            # the same responses again
+            cls.gth.discard()
+            raise
+        cls.gth.confirm()
+
+        cls.log.debug('request statistics: {}'.format(
+            cls.gth.http.stats.summary()))
+
+    @classmethod
+    def daemon(cls):
+        '''Runs every command periodically in this process, reusing
+        the connections and caches between the runs. Changes and vacant
+        rooms are polled according to the study plan'''
+        from polling import PollingPolicy
+        from scheduler import AdaptiveJob, Scheduler
+
+        cls.setup()
+        policy = PollingPolicy(cls.store)
+        jobs = []
+        for job in Scheduler.default_jobs:
+            if job.cmd in policy.commands:
+                job = AdaptiveJob(job.cmd, policy,
+                                  jitter=job.jitter,
+                                  weekdays=job.weekdays,
+                                  months=job.months)
+            jobs.append(job)
+
+        Scheduler(cls.run, cls.store, jobs=jobs, log=cls.log,
+                  tz=policy.tz).run_forever()
+
+    @classmethod
+    def update(cls):
+        '''Activates the updating process'''
+        cmds = cls.get_cmds()
+        if cmds[0] == 'daemon':
+            cls.daemon()
+        elif len(cmds) == 1:
+            cls.run(cmds[0])
+        else:
+            cls.run_many(cmds)
+
 
-DataUpdater.update()
+if __name__ == '__main__':
+    DataUpdater.update()
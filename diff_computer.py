@@ -1,6 +1,10 @@
-import json
-from encoder import NoWSEncoder
-from storage import Storage
+from typing import Tuple
+from compact import CompactEncoder, layouts
+from lessons import LessonPool
+from merkle import HashTree
+from patch import PatchEngine, list_keys
+from serializer import Serializer, get_serializer
+from storage import Storage, content_hash
 
 
 class NoUpdate(Exception):
@@ -10,33 +14,332 @@ class NoUpdate(Exception):
 class DiffComputer:
     '''Computes differences between the old and newly fetched data.
     This is to reduce data transfer and not to update identical data.
-    Diffing methods return the processed data in JSON'''
-
-    def __init__(self, storage: Storage):
+    Diffing methods return the processed data in JSON: the new data with
+    the unchanged parts set to None or, if `patches` is True, a list of
+    JSON Patch operations that turn the old data into the new one.
+    If `compact` is True, the data with lessons is sent in the compact
+    form (see `compact`)'''
+
+    # Fields of a teacher that are compared as a whole
+    teacher_fields = ('full', 'dep', 'job', 'classes')
+
+    # Teachers whose lessons changed since the teachers were last updated
+    dirty_key = 'dirty_teachers'
+
+    # Levels of the hash tree below every shard or the data's root:
+    # class → day → lesson, teacher → field → day → lesson,
+    # day → lesson → floor
+    tree_depths = {'full_perm_timetable': 2,
+                   'teachers': 3,
+                   'vacant_rooms': 3}
+
+    # Data that is stored in shards if `sharded` is True
+    sharded_keys = ('full_perm_timetable', 'teachers')
+
+    # Data whose old lessons are shared with the new ones when decoded
+    pooled_keys = {'full_perm_timetable', 'teachers', 'class_teachers'}
+
+    def __init__(self, storage: Storage, sharded: bool = False,
+                 patches: bool = False, compact: bool = False,
+                 lessons: LessonPool = None,
+                 serializer: Serializer = None):
+        '''Initializes self. If `sharded` is True, the full permanent
+        timetable and the teachers are stored as one row per class or
+        teacher plus a manifest of the rows' hashes. If `patches` is True,
+        diffs are computed as JSON Patch operations. If `compact` is True,
+        the lessons in the diffs are dictionary-encoded. Decoded old
+        lessons are shared through `lessons` (see `pooled_keys`), so
+        passing the gatherer's pool makes them the same objects as
+        the new lessons. `serializer` is the JSON backend, the fastest
+        available one is used by default'''
         self.storage = storage
-        self.json = NoWSEncoder()
+        self.sharded = sharded
+        self.patches = patches
+        self.compact = compact
+        self.lessons = lessons if lessons is not None else LessonPool()
+        self.serializer = serializer if serializer is not None else \
+            get_serializer()
+        self.json = self.serializer.encoder()
+        self.canon = self.serializer.encoder(sort_keys=True)
+        self.tree = HashTree(self.canon)
+
+    @staticmethod
+    def patch_engine(key: str) -> PatchEngine:
+        return PatchEngine(list_keys.get(key))
+
+    def patch(self, key: str, old, new, encoded: str = None) -> str:
+        '''Returns the JSON Patch operations that turn the old data with
+        the given key into the new one, in JSON. `encoded` is the new
+        data already encoded, it's reused if the data is new'''
+        if old is None and encoded is not None:
+            return '[{{"op":"replace","path":"","value":{}}}]'.format(
+                encoded)
+        return self.json.encode(self.patch_engine(key).diff(old, new))
+
+    def decode(self, key: str, text: str):
+        '''Decodes the stored data with the given key'''
+        if key in self.pooled_keys:
+            return self.serializer.loads(text, object_hook=self.lessons.hook)
+        return self.serializer.loads(text)
+
+    def payload(self, key: str, value, encoded: str = None) -> str:
+        '''Encodes a diff of the data with the given key in JSON.
+        `encoded` is the diff already encoded, e.g. by `exchange_encoded`
+        when the whole value is sent'''
+        if self.compact and key in layouts:
+            return self.json.encode(CompactEncoder(key).encode(value))
+        if encoded is not None:
+            return encoded
+        return self.json.encode(value)
+
+    def hash(self, value) -> str:
+        '''Returns a hash of the value's canonical JSON representation'''
+        return content_hash(self.canon.encode(value))
 
     def exchange(self, key: str, value):
         '''Exchanges the old data with the given key for a new value.
         Returns the old data piece, JSON-decoded.
         If the new value is equal to what already was in the storage or
-        new data failed to get fetched, raises NoUpdate'''
+        new data failed to get fetched, raises NoUpdate.
+        The value is stored in the canonical form, so that an unchanged
+        value is detected by its hash without reading the old data'''
+        return self.exchange_encoded(key, value)[0]
+
+    def exchange_encoded(self, key: str, value) -> Tuple:
+        '''Same as `exchange`, but returns a pair of the old data and
+        the stored encoding of the new value, so that it's not encoded
+        again when it's sent as a whole'''
+        if value is None:
+            raise NoUpdate
+
+        encoded = self.canon.encode(value)
         try:
-            old = json.loads(self.storage[key])
+            if self.storage.get_hash(key) == content_hash(encoded):
+                raise NoUpdate
+            old = self.decode(key, self.storage[key])
             if old == value:
+                # The hash didn't match, so the row was written before
+                # the canonical encoding or without a hash. It's rewritten
+                # so that the next call only checks the hash
+                self.storage[key] = encoded
                 raise NoUpdate
         except KeyError:
+            # Data that was sharded before is merged back first
+            if self.merge_shards(key) is not None:
+                return self.exchange_encoded(key, value)
             old = None
 
-        if value is None:
+        self.storage[key] = encoded
+        return old, encoded
+
+    def exchange_shards(self, key: str, shards: list,
+                        read_old: bool = True):
+        '''Exchanges the sharded data with the given key for new shards
+        given as a list of (name, value) pairs. Only the shards whose hashes
+        changed are read and rewritten, shards that are gone are deleted.
+        Shards with the value of None failed to get fetched, the old ones
+        are kept for them.
+        Keys with a hash tree (see `tree_depths`) get it updated as well.
+        Returns a tuple of the old manifest (a dictionary of shard names to
+        hashes), a dictionary of the changed shards' old values,
+        JSON-decoded, and the old and the new hash trees. The manifest is
+        None if there was no data before. The old values are only read
+        if `read_old` is True or there was no old tree.
+        If nothing changed, raises NoUpdate'''
+        manifest_key = key + '/manifest'
+        shard_key = key + '/{}'
+
+        try:
+            old_manifest = self.serializer.loads(self.storage[manifest_key])
+        except KeyError:
+            old_manifest = self.migrate_shards(key)
+
+        old_hashes = dict(old_manifest or [])
+        new_manifest = []
+        changed = {}
+        writes = {}
+        for name, value in shards:
+            if value is None:
+                if name in old_hashes:
+                    new_manifest.append([name, old_hashes[name]])
+                continue
+
+            encoded = self.canon.encode(value)
+            value_hash = content_hash(encoded)
+            new_manifest.append([name, value_hash])
+            if old_hashes.get(name) != value_hash:
+                changed[name] = value
+                writes[shard_key.format(name)] = encoded
+
+        if new_manifest == old_manifest:
             raise NoUpdate
-        self.storage[key] = self.json.encode(value)
-        return old
+
+        kept = {name for name, value_hash in new_manifest}
+        removed = [shard_key.format(i) for i in old_hashes if i not in kept]
+
+        writes[manifest_key] = self.json.encode(new_manifest)
+
+        old_tree = new_tree = None
+        if key in self.tree_depths:
+            old_tree = self.load_tree(key)
+            new_tree = self.shards_tree(key, new_manifest, changed, old_tree)
+            writes[key + '/tree'] = self.json.encode(new_tree)
+
+        old = {}
+        if read_old or old_tree is None:
+            old_keys = [shard_key.format(i)
+                        for i in changed if i in old_hashes]
+            old = {name[len(key) + 1:]: self.decode(key, value)
+                   for name, value in self.storage.get_many(old_keys).items()}
+
+        self.storage.set_many(writes)
+        self.storage.delete_many(removed)
+
+        if old_manifest is None:
+            return None, old, old_tree, new_tree
+        return old_hashes, old, old_tree, new_tree
+
+    def load(self, key: str):
+        '''Returns the stored data with the given key, JSON-decoded,
+        or None if there's no data. Sharded data is put together from
+        its shards; if some of them are missing, returns None'''
+        try:
+            manifest = self.serializer.loads(self.storage[key + '/manifest'])
+        except KeyError:
+            try:
+                return self.decode(key, self.storage[key])
+            except KeyError:
+                return None
+
+        names = [name for name, value_hash in manifest]
+        stored = self.storage.get_many('{}/{}'.format(key, name)
+                                       for name in names)
+        if len(stored) != len(names):
+            return None
+
+        shards = [(name, self.decode(key, stored['{}/{}'.format(key, name)]))
+                  for name in names]
+        if key == 'teachers':
+            return [value for name, value in shards]
+        return dict(shards)
+
+    def load_tree(self, key: str):
+        '''Returns the stored hash tree of the data with the given key
+        or None if there's no tree'''
+        try:
+            return self.serializer.loads(self.storage[key + '/tree'])
+        except KeyError:
+            return None
+
+    def shards_tree(self, key: str, manifest: list, changed: dict,
+                    old_tree) -> list:
+        '''Returns the hash tree of sharded data. The subtrees of
+        the unchanged shards are taken from the old tree; if it's missing,
+        the shards are read to build them'''
+        depth = self.tree_depths[key]
+        children = {}
+        missing = []
+        for name, value_hash in manifest:
+            if name in changed:
+                children[name] = self.tree.build(changed[name], depth)
+            elif self.tree.child(old_tree, name) is not None:
+                children[name] = self.tree.child(old_tree, name)
+            else:
+                missing.append('{}/{}'.format(key, name))
+
+        for name, value in self.storage.get_many(missing).items():
+            children[name[len(key) + 1:]] = self.tree.build(
+                self.serializer.loads(value), depth)
+
+        # Keep the manifest's order
+        return self.tree.node({name: children[name]
+                               for name, value_hash in manifest})
+
+    def version(self, key: str, *path) -> str:
+        '''Returns the hash of the stored data with the given key or of
+        its part, e.g. version('full_perm_timetable', '8А', 0) for
+        the Monday of a class. The hash changes whenever the data does,
+        so it can be used as a version token. Returns None if there is
+        no hash tree for the data'''
+        tree = self.load_tree(key)
+        for i in path:
+            tree = self.tree.child(tree, i)
+        return self.tree.root(tree)
+
+    def migrate_shards(self, key: str) -> list:
+        '''Splits the data stored under the given key as a whole into shards.
+        Returns the manifest or None if there is no such data'''
+        try:
+            old = self.serializer.loads(self.storage[key])
+        except KeyError:
+            return None
+        if old is None:
+            return None
+
+        manifest = []
+        writes = {}
+        for name, value in self.shard(key, old):
+            encoded = self.canon.encode(value)
+            manifest.append([name, content_hash(encoded)])
+            writes['{}/{}'.format(key, name)] = encoded
+        self.storage.set_many(writes)
+
+        # The data is only removed once the shards are read back intact
+        if self.storage.get_many(list(writes)) != writes:
+            raise RuntimeError('failed to migrate {} to shards'.format(key))
+        self.storage[key + '/manifest'] = self.json.encode(manifest)
+        self.storage.delete_many([key])
+        return manifest
+
+    def merge_shards(self, key: str):
+        '''Puts the sharded data with the given key back into a single row,
+        so that sharding can be turned off. Returns the data, JSON-decoded,
+        or None if the data is not sharded'''
+        if self.sharded or key not in self.sharded_keys:
+            return None
+        value = self.load(key)
+        if value is None:
+            return None
+
+        manifest_key = key + '/manifest'
+        encoded = self.canon.encode(value)
+        self.storage[key] = encoded
+        if self.storage.get_hash(key) != content_hash(encoded):
+            raise RuntimeError('failed to merge the shards of {}'.format(key))
+
+        manifest = self.serializer.loads(self.storage[manifest_key])
+        self.storage.delete_many(['{}/{}'.format(key, name)
+                                  for name, value_hash in manifest] +
+                                 [manifest_key, key + '/tree'])
+        return value
+
+    @staticmethod
+    def shard(key: str, value) -> list:
+        '''Splits a value into a list of (name, shard) pairs.
+        Teachers are named by the abbreviated names, which are not always
+        unique: the next teachers with the same one get the names
+        '<abbr>#2', '<abbr>#3' and so on'''
+        if key == 'teachers':
+            shards = []
+            names = set()
+            for idx, tchr in enumerate(value):
+                name = base = tchr.get('abbr', '#{}'.format(idx))
+                count = 1
+                while name in names:
+                    count += 1
+                    name = '{}#{}'.format(base, count)
+                names.add(name)
+                shards.append((name, tchr))
+            return shards
+
+        return list(value.items())
 
     def diff_class_list(self, new: dict) -> str:
-        old = self.exchange('class_list', new)
+        old, encoded = self.exchange_encoded('class_list', new)
+        if self.patches:
+            return self.patch('class_list', old, new, encoded)
         if old is None:
-            return self.json.encode(new)
+            return encoded
 
         for form, classes in old.items():
             if form in new and classes == new[form]:
@@ -45,9 +348,11 @@ class DiffComputer:
         return self.json.encode(new)
 
     def diff_study_plan(self, new: list) -> str:
-        old = self.exchange('study_plan', new)
+        old, encoded = self.exchange_encoded('study_plan', new)
+        if self.patches:
+            return self.patch('study_plan', old, new, encoded)
         if old is None:
-            return self.json.encode(new)
+            return encoded
 
         for m_idx, month in enumerate(old):
             if month == new[m_idx]:
@@ -56,33 +361,220 @@ class DiffComputer:
         return self.json.encode(new)
 
     def diff_rings_timetable(self, new: list) -> str:
-        self.exchange('rings_timetable', new)
-        return self.json.encode(new)
+        old, encoded = self.exchange_encoded('rings_timetable', new)
+        if self.patches:
+            return self.patch('rings_timetable', old, new, encoded)
+        return encoded
 
     @staticmethod
     def diff_timetable(old: list, new: list) -> list:
         for d_idx, day in enumerate(old):
+            # Days without lessons are None in teachers' timetables
+            if day is None or new[d_idx] is None:
+                continue
             for l_idx, lesson in enumerate(day):
                 if lesson == new[d_idx][l_idx]:
                     new[d_idx][l_idx] = None
 
         return new
 
+    @staticmethod
+    def unchanged_timetable(tmtbl: list) -> list:
+        '''Returns the diff of a timetable that is equal to the old one'''
+        return [None if day is None else [None] * len(day) for day in tmtbl]
+
+    def diff_timetable_tree(self, old_tree, new: list, new_tree) -> list:
+        '''Computes the difference between timetables by their hash trees,
+        descending only into the days that changed'''
+        if self.tree.same(old_tree, new_tree):
+            return self.unchanged_timetable(new)
+
+        for d_idx, day in enumerate(new):
+            old_day = self.tree.child(old_tree, d_idx)
+            new_day = self.tree.child(new_tree, d_idx)
+            if day is None or old_day is None:
+                continue
+            if self.tree.same(old_day, new_day):
+                new[d_idx] = [None] * len(day)
+                continue
+            for l_idx in range(len(day)):
+                if self.tree.same(self.tree.child(old_day, l_idx),
+                                  self.tree.child(new_day, l_idx)):
+                    day[l_idx] = None
+
+        return new
+
+    @staticmethod
+    def timetable_teachers(old: list, new: list) -> set:
+        '''Returns the teachers of the lessons that differ between two
+        timetables of a class, both the old and the new ones'''
+        teachers = set()
+        old = old or []
+        new = new or []
+        for d_idx in range(max(len(old), len(new))):
+            old_day = old[d_idx] if d_idx < len(old) else []
+            new_day = new[d_idx] if d_idx < len(new) else []
+            for l_idx in range(max(len(old_day), len(new_day))):
+                old_lsn = old_day[l_idx] if l_idx < len(old_day) else []
+                new_lsn = new_day[l_idx] if l_idx < len(new_day) else []
+                if old_lsn == new_lsn:
+                    continue
+                for lesson in (old_lsn, new_lsn):
+                    for group in lesson or []:
+                        if isinstance(group, dict):
+                            teachers.add(group.get('teacher'))
+
+        teachers.discard(None)
+        return teachers
+
+    def dirty_teachers(self) -> list:
+        '''Returns the teachers whose lessons changed since the teachers
+        were last updated or None if it's unknown'''
+        try:
+            return self.serializer.loads(self.storage[self.dirty_key])
+        except KeyError:
+            return None
+
+    def mark_dirty(self, teachers: set):
+        '''Adds teachers whose lessons changed. None means that it's not
+        known which ones did, so all of them have to be updated'''
+        if teachers is None:
+            self.storage.delete_many([self.dirty_key])
+            return
+
+        dirty = self.dirty_teachers()
+        if dirty is not None and not teachers.issubset(dirty):
+            self.storage[self.dirty_key] = self.json.encode(
+                sorted(teachers.union(dirty)))
+
+    def clear_dirty(self):
+        '''Marks every teacher as up to date'''
+        self.storage[self.dirty_key] = self.json.encode([])
+
     def diff_full_perm_timetable(self, new: dict) -> str:
-        old = self.exchange('full_perm_timetable', new)
+        if self.sharded:
+            return self.diff_sharded_full_perm_timetable(new)
+
+        old, encoded = self.exchange_encoded('full_perm_timetable', new)
         if old is None:
-            return self.json.encode(new)
+            self.mark_dirty(None)
+            if self.patches:
+                return self.patch('full_perm_timetable', old, new, encoded)
+            return self.payload('full_perm_timetable', new, encoded)
+
+        dirty = set()
+        for cls in set(old).union(new):
+            dirty.update(self.timetable_teachers(old.get(cls),
+                                                 new.get(cls)))
+        self.mark_dirty(dirty)
+        if self.patches:
+            return self.patch('full_perm_timetable', old, new)
 
         for cls, tmtbl in old.items():
             if cls in new:
                 new[cls] = self.diff_timetable(tmtbl, new[cls])
 
-        return self.json.encode(new)
+        return self.payload('full_perm_timetable', new)
+
+    def diff_sharded_full_perm_timetable(self, new: dict) -> str:
+        if new is None:
+            raise NoUpdate
+
+        key = 'full_perm_timetable'
+        old_hashes, old, old_tree, new_tree = self.exchange_shards(
+            key, self.shard(key, new))
+        if old_hashes is None or not set(old_hashes).issubset(new):
+            # Old values of the removed classes are not read
+            self.mark_dirty(None)
+        else:
+            dirty = set()
+            for cls, tmtbl in old.items():
+                dirty.update(self.timetable_teachers(tmtbl, new[cls]))
+            for cls, tmtbl in new.items():
+                if cls not in old_hashes:
+                    dirty.update(self.timetable_teachers(None, tmtbl))
+            self.mark_dirty(dirty)
+
+        if self.patches:
+            return self.patch_shards(key, old_hashes, old,
+                                     self.shard(key, new))
+        if old_hashes is None:
+            # In the canonical form, as the data that is not sharded
+            return self.payload(key, new, self.canon.encode(new))
+
+        for cls, tmtbl in new.items():
+            if tmtbl is None:
+                continue
+            if old_tree is not None:
+                if cls in old_hashes:
+                    new[cls] = self.diff_timetable_tree(
+                        self.tree.child(old_tree, cls), tmtbl,
+                        self.tree.child(new_tree, cls))
+            elif cls in old:
+                new[cls] = self.diff_timetable(old[cls], tmtbl)
+            elif cls in old_hashes:
+                new[cls] = self.unchanged_timetable(tmtbl)
+
+        return self.payload(key, new)
+
+    def patch_shards(self, key: str, old_hashes: dict, old: dict,
+                     shards: list) -> str:
+        '''Returns the JSON Patch operations for sharded data, given
+        the result of `exchange_shards` and the new shards'''
+        ordered = key == 'teachers'
+        if old_hashes is None:
+            value = [i[1] for i in shards] if ordered else \
+                {name: value for name, value in shards if value is not None}
+            return self.json.encode([{'op': 'replace', 'path': '',
+                                      'value': value}])
+
+        # Shards that failed to get fetched keep their old values
+        shards = [(name, value) for name, value in shards
+                  if value is not None or name in old_hashes]
+        ops = self.patch_engine(key).diff_members('', list(old_hashes),
+                                                  shards, old, ordered)
+        return self.json.encode(ops)
+
+    def diff_teacher(self, old: dict, new: dict):
+        '''Computes the difference between the old and the new data of
+        a teacher in place'''
+        for field in self.teacher_fields:
+            try:
+                if new[field] == old[field]:
+                    new[field] = None
+            except KeyError:
+                pass
+        try:
+            new['timetable'] = self.diff_timetable(old['timetable'],
+                                                   new['timetable'])
+        except KeyError:
+            pass
+
+    def diff_teacher_tree(self, old_tree, new: dict, new_tree):
+        '''Computes the difference between the old and the new data of
+        a teacher in place by their hash trees'''
+        for field in self.teacher_fields:
+            if field in new and self.tree.same(
+                    self.tree.child(old_tree, field),
+                    self.tree.child(new_tree, field)):
+                new[field] = None
+
+        old_tmtbl = self.tree.child(old_tree, 'timetable')
+        if 'timetable' in new and old_tmtbl is not None:
+            new['timetable'] = self.diff_timetable_tree(
+                old_tmtbl, new['timetable'],
+                self.tree.child(new_tree, 'timetable'))
 
     def diff_teachers(self, new: list) -> str:
-        old = self.exchange('teachers', new)
+        if self.sharded:
+            return self.diff_sharded_teachers(new)
+
+        old, encoded = self.exchange_encoded('teachers', new)
+        self.clear_dirty()
+        if self.patches:
+            return self.patch('teachers', old, new, encoded)
         if old is None:
-            return self.json.encode(new)
+            return self.payload('teachers', new, encoded)
 
         name_lookup = {i['abbr']: i for i in new if 'abbr' in i}
 
@@ -92,24 +584,170 @@ class DiffComputer:
             except KeyError:
                 continue
 
-            for field in ('full', 'dep', 'job', 'classes'):
-                try:
-                    if new_tchr[field] == teacher[field]:
-                        new_tchr[field] = None
-                except KeyError:
-                    pass
+            self.diff_teacher(teacher, new_tchr)
+
+        return self.payload('teachers', new)
+
+    def diff_sharded_teachers(self, new: list) -> str:
+        if new is None:
+            raise NoUpdate
+
+        key = 'teachers'
+        old_hashes, old, old_tree, new_tree = self.exchange_shards(
+            key, self.shard(key, new), read_old=self.patches)
+        self.clear_dirty()
+        if self.patches:
+            return self.patch_shards(key, old_hashes, old,
+                                     self.shard(key, new))
+        if old_hashes is None:
+            # In the canonical form, as the data that is not sharded
+            return self.payload(key, new, self.canon.encode(new))
+
+        for name, tchr in self.shard('teachers', new):
+            if 'abbr' not in tchr:
+                continue
+            if old_tree is not None:
+                if name in old_hashes:
+                    self.diff_teacher_tree(self.tree.child(old_tree, name),
+                                           tchr,
+                                           self.tree.child(new_tree, name))
+            elif name in old:
+                self.diff_teacher(old[name], tchr)
+            elif name in old_hashes:
+                for field in self.teacher_fields:
+                    if field in tchr:
+                        tchr[field] = None
+                if 'timetable' in tchr:
+                    tchr['timetable'] = self.unchanged_timetable(
+                        tchr['timetable'])
+
+        return self.payload(key, new)
+
+    @staticmethod
+    def update_teacher(tchr: dict, tmtbl: dict) -> dict:
+        '''Returns a copy of a teacher with the timetable and classes
+        replaced by the given ones'''
+        tchr = dict(tchr)
+        if tmtbl['timetable'] is None:
+            tchr.pop('timetable', None)
+            tchr.pop('classes', None)
+        else:
+            tchr['timetable'] = tmtbl['timetable']
+            tchr['classes'] = tmtbl['classes']
+        return tchr
+
+    def diff_teacher_timetables(self, new: dict) -> str:
+        '''Updates the timetables and classes of the given teachers
+        (a dictionary of abbreviated names to the timetable and classes)
+        in the stored teachers. The rest of the teachers are not read.
+        Returns the diffs of the teachers that changed (JSON Patch
+        operations are applied to the whole teachers list)'''
+        if new is None:
+            raise NoUpdate
+
+        key = 'teachers'
+        if self.sharded:
             try:
-                new_tchr['timetable'] = self.diff_timetable(
-                    teacher['timetable'],
-                    new_tchr['timetable'])
+                manifest = self.serializer.loads(
+                    self.storage[key + '/manifest'])
             except KeyError:
-                pass
+                manifest = self.migrate_shards(key)
+            if manifest is None:
+                raise NoUpdate
 
-        return self.json.encode(new)
+            positions = {name: idx for idx, (name, h) in enumerate(manifest)}
+            # Teachers that share an abbreviated name have suffixes
+            # (see `shard`), they are told apart by the stored one
+            stored = self.storage.get_many(
+                ['{}/{}'.format(key, name) for name in positions
+                 if name in new or name.split('#')[0] in new])
+            old = {}
+            updated = {}
+            for shard_key, value in stored.items():
+                name = shard_key[len(key) + 1:]
+                tchr = self.decode(key, value)
+                if tchr.get('abbr') in new:
+                    old[name] = tchr
+                    updated[name] = self.update_teacher(tchr,
+                                                        new[tchr['abbr']])
+
+            try:
+                self.exchange_shards(
+                    key, [(name, updated.get(name)) for name, h in manifest],
+                    read_old=False)
+            finally:
+                self.clear_dirty()
+        else:
+            try:
+                teachers = self.decode(key, self.storage[key])
+            except KeyError:
+                teachers = self.merge_shards(key)
+                if teachers is None:
+                    raise NoUpdate
+
+            old = {}
+            updated = {}
+            positions = {}
+            for idx, tchr in enumerate(teachers):
+                if tchr.get('abbr') in new:
+                    positions[idx] = idx
+                    old[idx] = tchr
+                    teachers[idx] = updated[idx] = \
+                        self.update_teacher(tchr, new[tchr['abbr']])
+
+            try:
+                self.exchange(key, teachers)
+            finally:
+                self.clear_dirty()
+
+        if self.patches:
+            engine = self.patch_engine(key)
+            ops = []
+            for name in sorted(updated, key=positions.get):
+                ops.extend(engine.diff(old[name], updated[name],
+                                       engine.join('', positions[name])))
+            return self.json.encode(ops)
+
+        diff = []
+        for name, tchr in updated.items():
+            if old[name] != tchr:
+                self.diff_teacher(old[name], tchr)
+                diff.append(tchr)
+
+        return self.payload('teacher_timetables', diff)
 
     def diff_vacant_rooms(self, new: list) -> str:
-        old = self.exchange('vacant_rooms', new)
+        key = 'vacant_rooms'
+        old_tree = self.load_tree(key)
+        try:
+            old, encoded = self.exchange_encoded(key, new)
+        except NoUpdate:
+            if old_tree is None and new is not None:
+                self.storage[key + '/tree'] = self.json.encode(
+                    self.tree.build(new, self.tree_depths[key]))
+            raise
+
+        new_tree = self.tree.build(new, self.tree_depths[key])
+        self.storage[key + '/tree'] = self.json.encode(new_tree)
+        if self.patches:
+            return self.patch(key, old, new, encoded)
         if old is None:
+            return encoded
+
+        if old_tree is not None:
+            child = self.tree.child
+            for d_idx, day in enumerate(new):
+                old_day = child(old_tree, d_idx)
+                new_day = child(new_tree, d_idx)
+                same_day = self.tree.same(old_day, new_day)
+                for l_idx, lesson in enumerate(day):
+                    old_lsn = child(old_day, l_idx)
+                    new_lsn = child(new_day, l_idx)
+                    same = same_day or self.tree.same(old_lsn, new_lsn)
+                    for floor in lesson:
+                        if same or self.tree.same(child(old_lsn, floor),
+                                                  child(new_lsn, floor)):
+                            lesson[floor] = None
             return self.json.encode(new)
 
         for day_idx, old_day in enumerate(old):
@@ -121,9 +759,11 @@ class DiffComputer:
         return self.json.encode(new)
 
     def diff_changes(self, new: list) -> str:
-        old = self.exchange('changes', new)
+        old, encoded = self.exchange_encoded('changes', new)
+        if self.patches:
+            return self.patch('changes', old, new, encoded)
         if old is None:
-            return self.json.encode(new)
+            return encoded
 
         day_lookup = {(i['day'], i['month']): i for i in new}
 
@@ -144,5 +784,7 @@ class DiffComputer:
         return self.json.encode(new)
 
     def diff_class_teachers(self, new: dict) -> str:
-        self.exchange('class_teachers', new)
-        return self.json.encode(new)
+        old, encoded = self.exchange_encoded('class_teachers', new)
+        if self.patches:
+            return self.patch('class_teachers', old, new, encoded)
+        return self.payload('class_teachers', new, encoded)
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, Tuple
+import logging
+
+
+class FetchEngine:
+    '''Runs fetching functions concurrently with a bounded amount of
+    worker threads. Results keep the order of the input items'''
+
+    def __init__(self, workers: int = 8, log: logging.Logger = None):
+        '''Initializes self. `workers` limits the amount of requests
+        that are in flight at the same time'''
+        if workers < 1:
+            raise ValueError('at least one worker is required')
+
+        self.workers = workers
+        self.log = log if log is not None else logging.Logger('FetchEngine')
+
+    def call(self, func: Callable, item):
+        '''Calls `func` for a single item, turning exceptions into
+        a (None, exception) pair instead of propagating them'''
+        try:
+            return func(item), None
+        except Exception as exc:
+            return None, exc
+
+    def map(self, func: Callable, items: Iterable) -> Tuple[list, list]:
+        '''Calls `func` for every item and returns a tuple of the results
+        (ordered the same way as `items`) and the list of failed items.
+        An item fails if `func` raised an exception or returned None.
+        Failed items get None in place of their result'''
+        items = list(items)
+        if not items:
+            return [], []
+
+        workers = min(self.workers, len(items))
+        if workers == 1:
+            outcomes = [self.call(func, i) for i in items]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(lambda i: self.call(func, i),
+                                         items))
+
+        results = []
+        failed = []
+        for item, (result, exc) in zip(items, outcomes):
+            if exc is not None:
+                self.log.error('fetching {} raised {!r}'.format(item, exc))
+            if result is None:
+                failed.append(item)
+            results.append(result)
+
+        if failed:
+            self.log.warning('{} of {} items failed: {}'.format(
+                len(failed), len(items), ', '.join(map(str, failed))))
+
+        return results, failed
+
+    def imap(self, func: Callable, items: Iterable) -> Iterator[tuple]:
+        '''Calls `func` for every item and yields (item, result) pairs
+        as soon as each call completes, so that the results can be
+        processed while the rest are being fetched. The result is None
+        for failed items'''
+        items = list(items)
+        if not items:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.workers,
+                                                len(items))) as pool:
+            futures = {pool.submit(self.call, func, i): i for i in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                result, exc = future.result()
+                if exc is not None:
+                    self.log.error('fetching {} raised {!r}'.format(item,
+                                                                    exc))
+                yield item, result
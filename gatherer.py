@@ -1,13 +1,20 @@
-from typing import Tuple
+from typing import Callable, Tuple
 from urllib.parse import urlencode, quote_plus
+import io
 import json
 import logging
-import os
 import re
-import odf.opendocument
-import odf.table
-import odf.style
+import xml.etree.ElementTree as ET
+import zipfile
 import requests
+from cache import Fingerprints
+from checkpoint import Checkpoints
+from diff_computer import NoUpdate
+from fetcher import FetchEngine
+from html_parsers import ChangesParser, StaffParser
+from indexes import RoomOccupancy, StaffIndex, TeacherIndex
+from lessons import LessonPool
+from session import ApiSession
 
 
 log_fmt = logging.Formatter('[{asctime}] [{levelname}] [{name}]\n{message}\n',
@@ -103,6 +110,9 @@ class ODTParser:
 
     def __init__(self, filename: str):
         '''Initializes self. Requires the filename of an ODT file'''
+        # odfpy is slow to import and only needed for the study plan
+        import odf.opendocument
+
         self.doc = odf.opendocument.load(filename)
 
         content = self.doc.body.firstChild.childNodes
@@ -130,6 +140,8 @@ class ODTParser:
              cell type
           3. Go through styles and map their names to cell types by color
           4. Collect styles that represent weekends'''
+        import odf.style
+        import odf.table
 
         st_key = self.style_name_key
         # Step 1
@@ -167,6 +179,8 @@ class ODTParser:
 
     def parse(self) -> Calendar:
         '''Iterates over the table and collects the cells' data'''
+        import odf.table
+
         self.collect_styles()
 
         rows = self.table.getElementsByType(odf.table.TableRow)
@@ -207,7 +221,7 @@ class ODTParser:
 
         return clnd
 
-    def cell_to_day(self, cell: odf.table.TableCell) -> Tuple[int, Day]:
+    def cell_to_day(self, cell: 'odf.table.TableCell') -> Tuple[int, Day]:
         '''Extracts the data from a table cell and constructs a Day object'''
         day = str(cell)
         if not day:
@@ -227,11 +241,179 @@ class ODTParser:
         return day_num, obj
 
 
+class ODTStreamParser:
+    '''Parser for the ODT table that reads the document from memory and
+    streams its content in one pass instead of building a DOM.
+    Produces the same Calendar as ODTParser'''
+
+    table_ns = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+    style_ns = '{urn:oasis:names:tc:opendocument:xmlns:style:1.0}'
+    text_ns = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+    fo_ns = '{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}'
+
+    table_tag = table_ns + 'table'
+    row_tag = table_ns + 'table-row'
+    cell_tag = table_ns + 'table-cell'
+    style_tag = style_ns + 'style'
+    text_props_tag = style_ns + 'text-properties'
+
+    cell_style_key = table_ns + 'style-name'
+    span_key = table_ns + 'number-columns-spanned'
+    style_name_key = style_ns + 'name'
+    style_family_key = style_ns + 'family'
+    color_key = fo_ns + 'background-color'
+    text_key = fo_ns + 'color'
+    text_style_key = text_ns + 'style-name'
+
+    # Rows in a month section: a header and a row for every weekday
+    section_rows = 8
+
+    def __init__(self, data: bytes):
+        '''Initializes self. Requires the contents of an ODT file'''
+        self.data = data
+
+        self.cell_types = {'учебные дни': 'study',
+                           'сессия': 'session',
+                           'каникулы': 'holidays'}
+
+        self.style_colors = {}
+        self.weekends = set()
+
+    def parse(self) -> Calendar:
+        '''Reads the document's content and collects the cells' data'''
+        with zipfile.ZipFile(io.BytesIO(self.data)) as odt:
+            with odt.open('content.xml') as content:
+                return self.parse_content(content)
+
+    def parse_content(self, content) -> Calendar:
+        '''Parses the content.xml stream. Styles come before the tables,
+        so weekends are known by the time the days are read. The legend
+        comes after the calendar table, so the days' types are set
+        at the end'''
+        clnd = Calendar()
+        tables = 0
+        row_num = -1
+        row = []
+        legend = []
+        header_widths = []
+        # Days waiting for their type with the names of their styles
+        pending = []
+
+        for event, elem in ET.iterparse(content, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == self.table_tag:
+                    tables += 1
+                elif elem.tag == self.row_tag and tables == 1:
+                    row_num += 1
+                    row = []
+                continue
+
+            if elem.tag == self.style_tag:
+                self.add_style(elem)
+            elif elem.tag == self.cell_tag and tables == 1:
+                row.append(elem)
+                continue
+            elif elem.tag == self.cell_tag and tables == 2:
+                legend.append((elem.get(self.cell_style_key),
+                               ''.join(elem.itertext())))
+            elif elem.tag == self.row_tag and tables == 1:
+                pos = row_num % self.section_rows
+                if pos == 0:
+                    header_widths = []
+                    for hdr in row[1:]:
+                        month = ''.join(hdr.itertext())
+                        header_widths.append((month,
+                                              int(hdr.get(self.span_key))))
+                        clnd.add_month(month)
+                else:
+                    self.add_days(clnd, row[1:], header_widths, pos - 1,
+                                  pending)
+            else:
+                continue
+            elem.clear()
+
+        style_to_cell = self.legend_styles(legend)
+        for day, style in pending:
+            day.day_type = style_to_cell.get(style)
+
+        return clnd
+
+    def add_style(self, elem: ET.Element):
+        '''Remembers the background color of a cell style and
+        whether a paragraph style marks weekends'''
+        name = elem.get(self.style_name_key)
+        if elem.get(self.style_family_key) == 'table-cell' and len(elem):
+            color = elem[0].get(self.color_key)
+            if color is not None:
+                self.style_colors[name] = color
+
+        for props in elem.iter(self.text_props_tag):
+            if props.get(self.text_key) is not None:
+                self.weekends.add(name)
+
+    def add_days(self, clnd: Calendar, cells: list,
+                 header_widths: list, weekday: int, pending: list):
+        '''Adds the days from a row of a month section to the calendar'''
+        curr_header_idx = 0
+        curr_month, max_cells = header_widths[curr_header_idx]
+        curr_cells = 0
+
+        for cell in cells:
+            if curr_cells == max_cells:
+                curr_header_idx += 1
+                curr_month, max_cells = header_widths[curr_header_idx]
+                curr_cells = 0
+
+            curr_cells += 1
+            text = ''.join(cell.itertext())
+            if not text:
+                continue
+
+            day_num = int(text)
+            is_wknd = (len(cell) > 0 and
+                       cell[0].get(self.text_style_key) in self.weekends)
+            day = Day(day_num, is_wknd=is_wknd)
+            pending.append((day, cell.get(self.cell_style_key)))
+
+            if day_num == 1:
+                clnd.set_padding(curr_month, weekday)
+            clnd.set_day(curr_month, day_num, day)
+
+    def legend_styles(self, legend: list) -> dict:
+        '''Maps every cell style to a cell type by its color.
+        The legend's cells are pairs of a sample cell and its type'''
+        color_to_cell = {}
+        for i in range(1, len(legend), 2):
+            c_type = self.cell_types[legend[i][1].lower()]
+            color = self.style_colors.get(legend[i - 1][0])
+            if color is not None:
+                color_to_cell[color] = c_type
+
+        return {name: color_to_cell[color]
+                for name, color in self.style_colors.items()
+                if color in color_to_cell}
+
+
 class DataGatherer:
     '''Class to collect data that is relevant to the application'''
     bad_get = '{}: unsuccessful fetch ({})'
 
-    def __init__(self, silent: bool = False):
+    def __init__(self, silent: bool = False, workers: int = 8,
+                 session: ApiSession = None,
+                 fingerprints: Fingerprints = None,
+                 checkpoints: Checkpoints = None,
+                 lessons: LessonPool = None):
+        '''Initializes self. `workers` sets the amount of concurrent
+        requests for the methods that fetch data for many items.
+        `session` is the HTTP session to use, a new one with the default
+        policies is created if it's not given.
+        If `fingerprints` are given, methods that depend on a single page
+        raise NoUpdate when the page hasn't changed since the last call
+        whose result was confirmed (see `confirm`).
+        If `checkpoints` are given, the methods that fetch data for many
+        items resume after an interrupted run.
+        Equal lessons are shared through `lessons`, a new pool is created
+        if it's not given'''
         self.log = logging.Logger('DataGatherer')
         if not silent:
             self.log.addHandler(cns_log)
@@ -239,6 +421,104 @@ class DataGatherer:
         else:
             self.log.setLevel(logging.CRITICAL)
 
+        self.fetcher = FetchEngine(workers, log=self.log)
+        if session is None:
+            session = ApiSession(pool_size=workers, log=self.log)
+        self.http = session
+        self.fingerprints = fingerprints
+        # Fingerprints of the processed responses that are not saved yet
+        self.pending = {}
+        self.checkpoints = checkpoints
+        self.lessons = lessons if lessons is not None else LessonPool()
+
+    def gather(self, job: str, func: Callable, items: list,
+               url: str) -> dict:
+        '''Calls `func` for every item concurrently and returns
+        a dictionary of the results. If there are checkpoints, every result
+        is saved as soon as it's fetched and the items saved by
+        an interrupted run are not fetched again. The checkpoints are
+        cleared once every item is done.
+        Returns None if the server of `url` went down in the process'''
+        results = {}
+        if self.checkpoints is not None:
+            results = self.checkpoints.load(job, items)
+            if results:
+                self.log.info('{}: resuming, {} of {} items are done'.format(
+                    job, len(results), len(set(items))))
+
+        todo = [i for i in items if i not in results]
+        for item, result in self.fetcher.imap(func, todo):
+            # Results fetched during an outage may be incomplete
+            if result is None or self.http.is_open(url):
+                continue
+            results[item] = result
+            if self.checkpoints is not None:
+                self.checkpoints.save(job, item, result)
+
+        failed = [i for i in items if i not in results]
+        if failed and self.http.is_open(url):
+            self.log.error('{}: server is down, {} items are left'.format(
+                job, len(failed)))
+            return None
+
+        if failed:
+            self.log.warning('{}: {} of {} items failed: {}'.format(
+                job, len(failed), len(items), ', '.join(map(str, failed))))
+        elif self.checkpoints is not None:
+            self.checkpoints.clear(job, items)
+
+        return results
+
+    def fetch(self, name: str, url: str,
+              method: str = 'GET',
+              conditional: bool = False,
+              **kwargs) -> requests.Response:
+        '''Sends a request through the session. Returns the response if
+        it was successful, otherwise logs the failure under the given name
+        and returns None.
+        If `conditional` is True and the response is the same as the one
+        last saved with `confirm`, raises NoUpdate'''
+        conditional = conditional and self.fingerprints is not None
+        if conditional:
+            headers = dict(kwargs.get('headers') or {})
+            headers.update(self.fingerprints.headers(name))
+            kwargs['headers'] = headers
+
+        try:
+            resp = self.http.request(method, url, **kwargs)
+        except requests.RequestException as exc:
+            self.log.error(self.bad_get.format(name, exc))
+            return None
+
+        if conditional and self.fingerprints.unchanged(name, resp):
+            self.log.info('{}: not modified'.format(name))
+            raise NoUpdate
+
+        if resp.status_code != 200:
+            self.log.error(self.bad_get.format(name, resp.status_code))
+            return None
+
+        return resp
+
+    def remember(self, name: str, resp: requests.Response):
+        '''Keeps the fingerprint of a response that was processed
+        successfully until `confirm` saves it'''
+        if self.fingerprints is not None:
+            self.pending[name] = resp
+
+    def confirm(self):
+        '''Saves the fingerprints kept by `remember`, so that the next
+        conditional fetches can skip the same responses. Called once their
+        data is stored: if storing it fails, the responses are processed
+        again by the next call'''
+        while self.pending:
+            name, resp = self.pending.popitem()
+            self.fingerprints.save(name, resp)
+
+    def discard(self):
+        '''Drops the fingerprints kept by `remember` without saving them'''
+        self.pending.clear()
+
     def api_url(self, **kwargs) -> str:
         '''Returns a properly formed and encoded URL for the SESC API'''
         api_base = 'http://lyceum.urfu.ru/study/mobile.php?'
@@ -246,18 +526,18 @@ class DataGatherer:
         self.log.debug('assembled URL is "{}"'.format(url))
         return url
 
-    def get_class_list(self, group=True) -> dict:
+    def get_class_list(self, group=True, cls_list: list = None) -> dict:
         '''Gets the list of classes grouped by form
-        If `group` is False, returns a list of classes without grouping'''
+        If `group` is False, returns a list of classes without grouping.
+        If `cls_list` is given, it's grouped instead of being fetched'''
 
-        url = self.api_url(f=4)
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('class_list',
-                                               resp.status_code))
-            return None
+        if cls_list is None:
+            url = self.api_url(f=4)
+            resp = self.fetch('class_list', url)
+            if resp is None:
+                return None
 
-        cls_list = resp.text.upper().splitlines()
+            cls_list = resp.text.upper().splitlines()
 
         if not group:
             return cls_list
@@ -275,20 +555,13 @@ class DataGatherer:
     def get_study_plan(self) -> list:
         '''Gets the study plan'''
         url = 'http://lyceum.urfu.ru/study/calgraf.odt'
-        filename = 'study_plan.odt'
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('study_plan',
-                                               resp.status_code))
+        resp = self.fetch('study_plan', url, conditional=True)
+        if resp is None:
             return None
 
-        with open(filename, 'wb') as file:
-            file.write(resp.content)
-
-        plan = ODTParser(filename).parse()
-
-        os.remove(filename)
+        plan = ODTStreamParser(resp.content).parse()
 
+        self.remember('study_plan', resp)
         return plan.to_list()
 
     def get_rings_timetable(self) -> list:
@@ -297,10 +570,8 @@ class DataGatherer:
                          '(?:<td>(?:&nbsp;)?([0-9]{1,2}):([0-9]{2})</td>)' * 2)
 
         url = 'http://lyceum.urfu.ru/study/?id=0'
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('rings_timetable',
-                                               resp.status_code))
+        resp = self.fetch('rings_timetable', url, conditional=True)
+        if resp is None:
             return None
 
         lessons = ptn.findall(resp.text)
@@ -319,6 +590,7 @@ class DataGatherer:
             except IndexError:
                 pass
 
+        self.remember('rings_timetable', resp)
         return table
 
     def get_perm_timetable(self, cls: str) -> list:
@@ -326,10 +598,8 @@ class DataGatherer:
         timetable = [[] for i in range(6)]
 
         url = self.api_url(f=1, k=cls.lower())
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('perm_timetable',
-                                               resp.status_code))
+        resp = self.fetch('perm_timetable', url)
+        if resp is None:
             return None
 
         try:
@@ -347,21 +617,34 @@ class DataGatherer:
                     day_tmtbl.append([])
                 form_lsns = []
                 for group in lesson['LessonsByGroups']:
-                    form_lsns.append({'name': group['Subject'],
-                                      'teacher': group['Teacher'],
-                                      'room': group['Classroom']})
+                    form_lsns.append(self.lessons.get(
+                        name=group['Subject'],
+                        teacher=group['Teacher'],
+                        room=group['Classroom']))
 
                 day_tmtbl.append(form_lsns)
 
         return timetable
 
-    def get_full_perm_timetable(self) -> dict:
-        '''Returns the permanent timetable for all classes'''
-        cls_list = self.get_class_list(group=False)
+    def get_full_perm_timetable(self, cls_list: list = None,
+                                full_tmtbl: dict = None) -> dict:
+        '''Returns the permanent timetable for all classes.
+        The list of classes is fetched if `cls_list` is not given.
+        If the timetables were already fetched (`full_tmtbl`), they are
+        returned as they are. Returns None if the server went down
+        while fetching them'''
+        if full_tmtbl is not None:
+            return full_tmtbl
+        if cls_list is None:
+            cls_list = self.get_class_list(group=False)
         if cls_list is None:
             return None
 
-        full_tmtb = {cls: self.get_perm_timetable(cls) for cls in cls_list}
+        tmtbls = self.gather('full_perm_timetable', self.get_perm_timetable,
+                             cls_list, self.api_url(f=1))
+        if tmtbls is None:
+            return None
+        full_tmtb = {cls: tmtbls.get(cls) for cls in cls_list}
 
         return full_tmtb
 
@@ -371,10 +654,8 @@ class DataGatherer:
         week_days = ['Понедельник', 'Вторник', 'Среда', 'Четверг',
                      'Пятница', 'Суббота']
         url = self.api_url(f=2, p=abbr_name)
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('teacher_timetable',
-                                               resp.status_code))
+        resp = self.fetch('teacher_timetable', url)
+        if resp is None:
             return None
 
         try:
@@ -390,179 +671,229 @@ class DataGatherer:
             day_number = week_days.index(day['Day'])
             lessons = [None] * 7
             for lsn in day['Lessons']:
-                lsn_obj = {}
                 lsn_number = int(lsn['Number']) - 1
                 cls = lsn['Class'].upper()
                 classes.add(cls)
 
-                lsn_obj['class'] = cls
-                lsn_obj['room'] = lsn['Classroom']
-                lsn_obj['name'] = lsn['Subject']
-
-                lessons[lsn_number] = lsn_obj
+                lessons[lsn_number] = self.lessons.get(
+                    **{'class': cls,
+                       'room': lsn['Classroom'],
+                       'name': lsn['Subject']})
 
             if any(lessons):
                 timetable[day_number] = lessons
 
         return timetable, sorted(classes)
 
-    def get_teachers(self) -> list:
-        '''Returns full information about every teacher'''
-        info_url = 'http://lyceum.urfu.ru/offic/?id=6'
-        info_ptn = re.compile('<tr>'
-                              '<td>([^<]+?)</td>'  # Full name
-                              '<td>([^<]+?)</td>'  # Department
-                              '<td>([^<]+?)</td>'  # Job
-                              '<td class=\'c\'>')
+    def search_staff(self, surname: str = '') -> list:
+        '''Searches the staff directory by surname and returns the rows
+        of the result. An empty surname returns the whole directory'''
+        url = 'http://lyceum.urfu.ru/offic/?id=6'
+        req_data = {'subStaff': '%C8%F1%EA%E0%F2%FC',  # "Искать"
+                    'unitStaff': '0',
+                    'famStaff': quote_plus(surname, encoding='cp1251')}
+        data_str = '&'.join(k + '=' + v for k, v in req_data.items())
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        resp = self.fetch('staff', url,
+                          method='POST',
+                          data=data_str,
+                          headers=headers)
+        if resp is None:
+            return None
 
-        url = self.api_url(f=7)
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('teachers',
-                                               resp.status_code))
+        return StaffParser().parse(resp.text)
+
+    def get_staff(self) -> StaffIndex:
+        '''Downloads the whole staff directory in one request and indexes
+        it by full name. Returns None if the directory is unavailable'''
+        rows = self.search_staff()
+        if not rows:
             return None
 
-        tch_list = resp.text.splitlines()
-        teachers = []
-        for full_name in tch_list:
-            tch_obj = {}
-            tch_obj['full'] = full_name
-
-            last, first, patr = full_name.split()
-            abbr_name = last + ' {}. {}.'.format(first[0], patr[0])
-            tch_obj['abbr'] = abbr_name
-
-            # Collect timetable
-            tmtbl, classes = self.get_teacher_timetable(abbr_name)
-            if tmtbl is not None:
-                tch_obj['timetable'] = tmtbl
-                tch_obj['classes'] = classes
-
-            # Collect job and department
-            req_data = {'subStaff': '%C8%F1%EA%E0%F2%FC',  # "Искать"
-                        'unitStaff': '0',
-                        'famStaff': quote_plus(last, encoding='cp1251')}
-            data_str = '&'.join(k + '=' + v for k, v in req_data.items())
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            resp = requests.post(info_url,
-                                 data=data_str,
-                                 headers=headers)
-
-            if resp.status_code != 200:
-                self.log.error(self.bad_get.format('teacher_data',
-                                                   resp.status_code))
-            else:
-                clean = resp.text.replace('&nbsp;', ' ')
-                for match in info_ptn.findall(clean):
-                    if full_name == match[0]:
-                        tch_obj['dep'] = match[1]
-                        tch_obj['job'] = match[2]
-                        break
+        return StaffIndex(rows)
 
-            teachers.append(tch_obj)
+    def get_teacher(self, full_name: str, index: TeacherIndex = None,
+                    staff: StaffIndex = None) -> dict:
+        '''Returns full information about a teacher by the full name.
+        The timetable is taken from `index` if the teacher is found there,
+        otherwise it's fetched from the API. The job and the department
+        are taken from `staff` or searched for in the staff directory'''
+        tch_obj = {}
+        tch_obj['full'] = full_name
 
-        return teachers
+        last, first, patr = full_name.split()
+        abbr_name = last + ' {}. {}.'.format(first[0], patr[0])
+        tch_obj['abbr'] = abbr_name
 
-    def get_changes(self) -> list:
-        '''Returns the changes in the timetable'''
-        wkday_map = {'ПОНЕДЕЛЬНИК': 'Понедельник',
-                     'ВТОРНИК': 'Вторник',
-                     'СРЕДУ': 'Среда',
-                     'ЧЕТВЕРГ': 'Четверг',
-                     'ПЯТНИЦУ': 'Пятница',
-                     'СУББОТУ': 'Суббота'}
-        url = 'http://lyceum.urfu.ru/study/izmenHtml.php'
+        # Collect timetable
+        if index is not None and abbr_name in index:
+            tmtbl, classes = index.get(abbr_name)
+        else:
+            tmtbl, classes = (self.get_teacher_timetable(abbr_name) or
+                              (None, None))
+        if tmtbl is not None:
+            tch_obj['timetable'] = tmtbl
+            tch_obj['classes'] = classes
+
+        # Collect job and department
+        if staff is not None and full_name in staff:
+            tch_obj['dep'], tch_obj['job'] = staff.get(full_name)
+            return tch_obj
+
+        for row in self.search_staff(last) or []:
+            if full_name == row['full']:
+                tch_obj['dep'] = row['dep']
+                tch_obj['job'] = row['job']
+                break
+
+        return tch_obj
+
+    def get_teachers(self, full_tmtbl: dict = None) -> list:
+        '''Returns full information about every teacher.
+        Teachers' timetables are derived from the timetables of all classes,
+        which are fetched if `full_tmtbl` is not given. The teacher timetable
+        API is only used for teachers that are missing from them.
+        Jobs and departments come from the staff directory
+        that is downloaded once'''
+        url = self.api_url(f=7)
+        resp = self.fetch('teachers', url)
+        if resp is None:
+            return None
+
+        if full_tmtbl is None:
+            full_tmtbl = self.get_full_perm_timetable()
 
-        sect_ptn = re.compile('ИЗМЕНЕНИЯ В РАСПИСАНИИ НА '
-                              '([А-Я]+), ([0-9]+) ([А-Я]+)\\s*?'
-                              '</h1>(.+?)(?=(?:</body>|<h1>))', re.S)
+        if full_tmtbl is None or None in full_tmtbl.values():
+            self.log.warning('class timetables are incomplete, '
+                             'fetching every teacher\'s timetable')
+            index = None
+        else:
+            index = TeacherIndex(full_tmtbl, self.lessons)
 
-        class_chg_ptn = re.compile('<h2>([0-9]{1,2}[А-Яа-я])</h2>'
-                                   '(.+?)(?=(?:<h2>|$))', re.S)
-        chg_item_ptn = re.compile('<p>([^<]+?)</p>')
+        staff = self.get_staff()
+        if staff is None:
+            self.log.warning('staff directory is unavailable, '
+                             'searching for every teacher')
 
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('changes',
-                                               resp.status_code))
+        tch_list = resp.text.splitlines()
+        teachers = self.gather('teachers',
+                               lambda name: self.get_teacher(name, index,
+                                                             staff),
+                               tch_list, url)
+        if teachers is None:
             return None
 
-        days = []
-        for wkday, day, month, content in sect_ptn.findall(resp.text):
-            chg_obj = {'wkday': wkday_map[wkday],
-                       'day': day,
-                       'month': month.lower()}
+        return [teachers[i] for i in tch_list if i in teachers]
+
+    def get_teacher_timetables(self, full_tmtbl: dict = None,
+                               dirty: list = None,
+                               stored_tmtbl: dict = None) -> dict:
+        '''Returns the timetables and classes of the teachers in `dirty`
+        (abbreviated names) or of every teacher with lessons if it's None.
+        They are derived from the timetables of all classes: `full_tmtbl`
+        or the ones stored by the last update of the full timetable
+        (`stored_tmtbl`), which the teachers were marked by. The timetables
+        are fetched if neither is given, so nothing else is requested.
+        Teachers that no longer have lessons get the timetable of None'''
+        if dirty is not None and not dirty:
+            return {}
+
+        if full_tmtbl is None:
+            full_tmtbl = stored_tmtbl
+        if full_tmtbl is None:
+            full_tmtbl = self.get_full_perm_timetable()
+        if full_tmtbl is None or None in full_tmtbl.values():
+            self.log.error('class timetables are incomplete')
+            return None
 
-            for cls, chg_content in class_chg_ptn.findall(content):
-                changes = []
-                for chg_item in chg_item_ptn.findall(chg_content):
-                    changes.append(chg_item.replace('&nbsp;&mdash;', ' –'))
+        index = TeacherIndex(full_tmtbl, self.lessons)
+        if dirty is None:
+            dirty = index.timetables
 
-                chg_obj[cls.upper()] = changes
+        tmtbls = {}
+        for abbr in dirty:
+            if abbr in index:
+                tmtbl, classes = index.get(abbr)
+            else:
+                tmtbl, classes = None, None
+            tmtbls[abbr] = {'timetable': tmtbl, 'classes': classes}
 
-            days.append(chg_obj)
+        return tmtbls
 
+    def get_changes(self) -> list:
+        '''Returns the changes in the timetable'''
+        url = 'http://lyceum.urfu.ru/study/izmenHtml.php'
+
+        resp = self.fetch('changes', url, conditional=True)
+        if resp is None:
+            return None
+
+        days = ChangesParser().parse(resp.text)
+
+        self.remember('changes', resp)
         return days
 
-    def get_vacant_rooms(self) -> list:
-        '''Returns vacant rooms for every lesson for every weekday
-        grouped by floors'''
+    def get_occupied_rooms(self, wkday_idx: int) -> list:
+        '''Returns a list of sets of occupied rooms for every lesson on
+        a given weekday (1 is Monday)'''
         weekdays = ['Понедельник', 'Вторник', 'Среда', 'Четверг',
                     'Пятница', 'Суббота']
-        room_list_url = self.api_url(f=6)
-        resp = requests.get(room_list_url)
-        if resp.status_code != 200:
-            self.log.error(self.bad_get.format('room_list',
-                                               resp.status_code))
+        occ_rooms_url = self.api_url(f=3, d=wkday_idx)
+        resp = self.fetch('vacant_rooms', occ_rooms_url)
+        if resp is None:
             return None
 
-        room_list = {i for i in resp.text.splitlines() if i.isdigit()}
+        try:
+            wkday = weekdays[wkday_idx - 1]
+            lsns = json.loads(resp.text)[wkday]['Timetable']
+        except json.decoder.JSONDecodeError:
+            self.log.error('failed to decode response')
+            self.log.debug(resp.text)
+            return None
 
-        vacant_rooms = []
-        for wkday_idx in range(1, 7):
-            occ_rooms_url = self.api_url(f=3, d=wkday_idx)
-            resp = requests.get(occ_rooms_url)
-            if resp.status_code != 200:
-                self.log.error(self.bad_get.format('vacant_rooms',
-                                                   resp.status_code))
-                return None
+        occ_rooms = []
+        for lsn in lsns:
+            occ_rooms.append({i['Classroom'] for i in lsn['Classrooms']})
 
-            try:
-                wkday = weekdays[wkday_idx - 1]
-                lsns = json.loads(resp.text)[wkday]['Timetable']
-            except json.decoder.JSONDecodeError:
-                self.log.error('failed to decode response')
-                self.log.debug(resp.text)
-                return None
+        return occ_rooms
 
-            occ_rooms = []
-            for lsn in lsns:
-                occ_rooms.append({i['Classroom'] for i in lsn['Classrooms']})
+    def get_vacant_rooms(self, full_tmtbl: dict = None) -> list:
+        '''Returns vacant rooms for every lesson for every weekday
+        grouped by floors. If the timetables of all classes are given,
+        room occupation is computed from them, otherwise it's fetched
+        from the API'''
+        room_list_url = self.api_url(f=6)
+        resp = self.fetch('room_list', room_list_url)
+        if resp is None:
+            return None
 
-            curr_day = []
-            for lesson_rooms in occ_rooms:
-                grouped = {'1': [], '2': [], '3': []}
-                for i in room_list.difference(lesson_rooms):
-                    grouped[i[0]].append(i)
+        room_list = [i for i in resp.text.splitlines() if i.isdigit()]
 
-                curr_day.append(grouped)
-            vacant_rooms.append(curr_day)
+        if full_tmtbl is not None and None not in full_tmtbl.values():
+            occ = RoomOccupancy.from_timetables(room_list, full_tmtbl)
+        else:
+            week, failed = self.fetcher.map(self.get_occupied_rooms,
+                                            range(1, 7))
+            if failed:
+                return None
+            occ = RoomOccupancy.from_occupied(room_list, week)
 
-        return vacant_rooms
+        return occ.vacant_by_floor()
 
-    def get_class_teachers(self) -> dict:
+    def get_class_teachers(self, full_tmtbl: dict = None) -> dict:
         '''Returns teachers' abbreviated names for each class
-        with their subject'''
+        with their subject. The timetables of all classes are fetched
+        if `full_tmtbl` is not given'''
         class_teachers = {}
 
-        cls_list = self.get_class_list(group=False)
-        if cls_list is None:
+        if full_tmtbl is None:
+            full_tmtbl = self.get_full_perm_timetable()
+        if full_tmtbl is None:
             return None
 
-        for cls in cls_list:
+        for cls, tmtbl in full_tmtbl.items():
             teachers = []
             used_subjects = set()
-            tmtbl = self.get_perm_timetable(cls)
             if tmtbl is None:
                 self.log.error('failed to collect the timetable for ' + cls)
                 continue
@@ -576,8 +907,8 @@ class DataGatherer:
 
                         tchr = group['teacher']
                         if tchr is not None:
-                            teachers.append({'teacher': tchr,
-                                             'subject': subj})
+                            teachers.append(self.lessons.get(teacher=tchr,
+                                                             subject=subj))
                         used_subjects.add(subj)
 
             class_teachers[cls] = teachers
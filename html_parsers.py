@@ -0,0 +1,169 @@
+import re
+
+
+class HTMLTokenizer:
+    '''Minimal single-pass HTML tokenizer. Splits a page into tags and
+    text in one scan and calls the handlers for them. Entities are left
+    as they are in the text. Subclasses override the handlers'''
+
+    token_ptn = re.compile('<!--.*?-->|<(/?)([A-Za-z][A-Za-z0-9]*)([^>]*)>',
+                           re.S)
+
+    def parse(self, page: str):
+        '''Feeds the page to the handlers and returns the result'''
+        pos = 0
+        for match in self.token_ptn.finditer(page):
+            if match.start() > pos:
+                self.handle_data(page[pos:match.start()])
+            pos = match.end()
+
+            closing, tag, attrs = match.groups()
+            if tag is None:
+                continue
+            if closing:
+                self.handle_endtag(tag.lower())
+            else:
+                self.handle_starttag(tag.lower(), attrs.strip(' /'))
+
+        if pos < len(page):
+            self.handle_data(page[pos:])
+
+        return self.result()
+
+    def handle_starttag(self, tag: str, attrs: str):
+        pass
+
+    def handle_endtag(self, tag: str):
+        pass
+
+    def handle_data(self, data: str):
+        pass
+
+    def result(self):
+        return None
+
+
+class ChangesParser(HTMLTokenizer):
+    '''Single-pass parser for the page with the changes in the timetable.
+    The page consists of sections that start with an <h1> header with
+    the date, followed by <h2> headers with a class name and <p> items'''
+
+    wkday_map = {'ПОНЕДЕЛЬНИК': 'Понедельник',
+                 'ВТОРНИК': 'Вторник',
+                 'СРЕДУ': 'Среда',
+                 'ЧЕТВЕРГ': 'Четверг',
+                 'ПЯТНИЦУ': 'Пятница',
+                 'СУББОТУ': 'Суббота'}
+
+    sect_ptn = re.compile('ИЗМЕНЕНИЯ В РАСПИСАНИИ НА '
+                          '([А-Я]+), ([0-9]+) ([А-Я]+)\\s*$')
+    class_ptn = re.compile('^[0-9]{1,2}[А-Яа-я]$')
+
+    def __init__(self):
+        self.days = []
+        self.day = None
+        self.changes = None
+        # Text of the header or the item being read, None outside of them
+        self.text = None
+        # Whether the current element contains only text
+        self.plain = False
+
+    def result(self) -> list:
+        '''Returns the list of days with changes'''
+        return self.days
+
+    def handle_starttag(self, tag: str, attrs: str):
+        if tag in ('h1', 'h2', 'p'):
+            self.text = []
+            self.plain = not attrs
+        else:
+            self.plain = False
+
+    def handle_endtag(self, tag: str):
+        if tag == 'body':
+            self.day = self.changes = None
+            return
+        if tag not in ('h1', 'h2', 'p') or self.text is None:
+            return
+
+        text = ''.join(self.text)
+        self.text = None
+        if tag == 'h1':
+            self.start_day(text)
+        elif tag == 'h2':
+            self.start_class(text if self.plain else '')
+        elif self.plain and text and self.changes is not None:
+            self.changes.append(text.replace('&nbsp;&mdash;', ' –'))
+
+    def start_day(self, header: str):
+        '''Starts a new section. Headers without a date end
+        the previous section'''
+        self.changes = None
+        match = self.sect_ptn.search(header)
+        if match is None:
+            self.day = None
+            return
+
+        wkday, day, month = match.groups()
+        self.day = {'wkday': self.wkday_map[wkday],
+                    'day': day,
+                    'month': month.lower()}
+        self.days.append(self.day)
+
+    def start_class(self, header: str):
+        '''Starts the list of changes for a class'''
+        if self.day is None or not self.class_ptn.match(header):
+            self.changes = None
+            return
+
+        self.changes = self.day[header.upper()] = []
+
+    def handle_data(self, data: str):
+        if self.text is not None:
+            self.text.append(data)
+
+
+class StaffParser(HTMLTokenizer):
+    '''Single-pass parser for the staff directory. Collects the rows
+    of the table with the full name, the department and the job'''
+
+    fields = ('full', 'dep', 'job')
+
+    def __init__(self):
+        self.rows = []
+        self.cells = None
+        # Text of the cell being read, None outside of cells
+        self.text = None
+        self.plain = False
+
+    def result(self) -> list:
+        '''Returns the list of rows as dictionaries'''
+        return self.rows
+
+    def handle_starttag(self, tag: str, attrs: str):
+        if tag == 'tr':
+            self.cells = []
+        elif tag == 'td' and self.cells is not None:
+            self.text = []
+            self.plain = not attrs
+        else:
+            self.plain = False
+
+    def handle_endtag(self, tag: str):
+        if tag == 'td' and self.text is not None:
+            text = ''.join(self.text).replace('&nbsp;', ' ')
+            self.cells.append(text if self.plain else '')
+            self.text = None
+        elif tag == 'tr' and self.cells is not None:
+            self.add_row(self.cells)
+            self.cells = None
+
+    def add_row(self, cells: list):
+        '''Adds a row if it has the information about a person'''
+        n = len(self.fields)
+        if len(cells) > n and all(cells[:n]):
+            self.rows.append(dict(zip(self.fields, cells)))
+
+    def handle_data(self, data: str):
+        if self.text is not None:
+            self.text.append(data)
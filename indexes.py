@@ -0,0 +1,146 @@
+from typing import Tuple
+from lessons import LessonPool
+
+
+class TeacherIndex:
+    '''Inverted index of the class timetables. Maps a teacher's abbreviated
+    name to the teacher's timetable and the classes that have lessons with
+    this teacher, in the same format as the teacher timetable API'''
+
+    def __init__(self, full_tmtbl: dict, lessons: LessonPool = None):
+        '''Builds the index in one pass over the permanent timetables of
+        all classes (as returned by `DataGatherer.get_full_perm_timetable`).
+        Teachers' lessons are shared through `lessons` if it's given'''
+        self.timetables = {}
+        self.classes = {}
+        self.lessons = lessons if lessons is not None else LessonPool()
+
+        for cls, tmtbl in full_tmtbl.items():
+            for d_idx, day in enumerate(tmtbl):
+                for l_idx, lesson in enumerate(day):
+                    for group in lesson:
+                        self.add(group['teacher'], cls, d_idx, l_idx, group)
+
+    def add(self, teacher: str, cls: str, d_idx: int, l_idx: int,
+            group: dict):
+        '''Registers a lesson group of a class with a teacher'''
+        if teacher is None:
+            return
+
+        try:
+            tmtbl = self.timetables[teacher]
+        except KeyError:
+            tmtbl = self.timetables[teacher] = [None] * 6
+            self.classes[teacher] = set()
+
+        if tmtbl[d_idx] is None:
+            tmtbl[d_idx] = [None] * 7
+
+        tmtbl[d_idx][l_idx] = self.lessons.get(**{'class': cls,
+                                                  'room': group['room'],
+                                                  'name': group['name']})
+        self.classes[teacher].add(cls)
+
+    def __contains__(self, teacher: str) -> bool:
+        return teacher in self.timetables
+
+    def get(self, teacher: str) -> Tuple[list, list]:
+        '''Returns a timetable and a sorted list of classes for a given
+        teacher's abbreviated name. Raises KeyError if the teacher doesn't
+        have any lessons in the indexed timetables'''
+        return self.timetables[teacher], sorted(self.classes[teacher])
+
+
+class StaffIndex:
+    '''Staff directory indexed by full name. Built from the rows of
+    the directory page, so looking up a teacher doesn't need a request'''
+
+    def __init__(self, rows: list):
+        '''Builds the index from the rows returned by
+        `html_parsers.StaffParser`'''
+        self.staff = {row['full']: row for row in rows}
+
+    def __contains__(self, full_name: str) -> bool:
+        return full_name in self.staff
+
+    def __len__(self) -> int:
+        return len(self.staff)
+
+    def get(self, full_name: str) -> Tuple[str, str]:
+        '''Returns the department and the job of a person by the full
+        name. Raises KeyError if the person is not in the directory'''
+        row = self.staff[full_name]
+        return row['dep'], row['job']
+
+
+class RoomOccupancy:
+    '''Dense day × lesson × room occupancy bitmap. Every (day, lesson) slot
+    holds an integer whose bits mark the occupied rooms, so a query over
+    all rooms of a slot is a single bitwise operation'''
+
+    def __init__(self, rooms, days: int = 6, lessons: int = 7):
+        '''Initializes self with an empty bitmap. Requires the list of rooms
+        that are tracked; rooms outside of it are ignored'''
+        self.rooms = sorted(set(rooms))
+        self.bits = {room: 1 << idx for idx, room in enumerate(self.rooms)}
+        self.all_rooms = (1 << len(self.rooms)) - 1
+        self.slots = [[0] * lessons for i in range(days)]
+
+        # Rooms are grouped by floors, the floor is the first digit
+        self.floors = {'1': [], '2': [], '3': []}
+        for room in self.rooms:
+            self.floors.setdefault(room[0], []).append((room,
+                                                        self.bits[room]))
+
+    @classmethod
+    def from_timetables(cls, rooms, full_tmtbl: dict) -> 'RoomOccupancy':
+        '''Builds the bitmap from the permanent timetables of all classes'''
+        occ = cls(rooms)
+        for tmtbl in full_tmtbl.values():
+            for d_idx, day in enumerate(tmtbl):
+                for l_idx, lesson in enumerate(day):
+                    for group in lesson:
+                        occ.occupy(d_idx, l_idx, group['room'])
+
+        return occ
+
+    @classmethod
+    def from_occupied(cls, rooms, week: list) -> 'RoomOccupancy':
+        '''Builds the bitmap from the occupied rooms API data: a list of days,
+        each one is a list of sets of rooms occupied during a lesson.
+        The bitmap has the same slots as the one built from the timetables,
+        so vacant rooms have the same shape whatever the source'''
+        occ = cls(rooms)
+        for d_idx, day in enumerate(week):
+            for l_idx, lesson_rooms in enumerate(day):
+                for room in lesson_rooms:
+                    occ.occupy(d_idx, l_idx, room)
+
+        return occ
+
+    def occupy(self, d_idx: int, l_idx: int, room: str):
+        '''Marks a room as occupied during a given lesson'''
+        try:
+            self.slots[d_idx][l_idx] |= self.bits[room]
+        except (KeyError, IndexError):
+            pass
+
+    def vacant(self, d_idx: int, l_idx: int) -> list:
+        '''Returns a sorted list of rooms vacant during a given lesson'''
+        free = self.all_rooms & ~self.slots[d_idx][l_idx]
+        return [room for room, bit in self.bits.items() if free & bit]
+
+    def vacant_by_floor(self) -> list:
+        '''Returns vacant rooms grouped by floors for every lesson
+        of every day'''
+        vacant_rooms = []
+        for day in self.slots:
+            curr_day = []
+            for occupied in day:
+                free = self.all_rooms & ~occupied
+                curr_day.append({floor: [r for r, bit in rooms if free & bit]
+                                 for floor, rooms in self.floors.items()})
+
+            vacant_rooms.append(curr_day)
+
+        return vacant_rooms
@@ -0,0 +1,66 @@
+import sys
+
+
+class Lesson(dict):
+    '''Lesson (or a lesson group) of a timetable. Equal lessons are
+    shared by all the timetables that have them (see LessonPool), so
+    lessons are read-only. They are dictionaries, so they are encoded
+    in JSON and compared with the decoded data as they are'''
+    __slots__ = ()
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError('lessons are shared and read-only')
+
+    __setitem__ = __delitem__ = read_only
+    clear = pop = popitem = setdefault = update = read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo: dict):
+        return self
+
+    def __reduce__(self):
+        return Lesson, (dict(self),)
+
+
+class LessonPool:
+    '''Keeps one shared Lesson for every distinct lesson, with its
+    strings interned. Timetables of the whole school repeat the same
+    lessons many times, and shared lessons also make comparing
+    timetables cheap, since identical objects are equal right away'''
+
+    # Fields of the lessons in the class and the teacher timetables and
+    # of the teachers of a class
+    field_sets = {frozenset(('name', 'teacher', 'room')),
+                  frozenset(('class', 'name', 'room')),
+                  frozenset(('teacher', 'subject'))}
+
+    def __init__(self):
+        self.lessons = {}
+
+    @staticmethod
+    def intern(value):
+        return sys.intern(value) if isinstance(value, str) else value
+
+    def get(self, **fields) -> Lesson:
+        '''Returns the shared lesson with the given fields'''
+        key = tuple(sorted(fields.items(), key=lambda i: i[0]))
+        try:
+            return self.lessons[key]
+        except KeyError:
+            lesson = Lesson((k, self.intern(v)) for k, v in key)
+            return self.lessons.setdefault(key, lesson)
+        except TypeError:
+            # Unhashable values
+            return Lesson(fields)
+
+    def hook(self, obj: dict) -> dict:
+        '''`object_hook` for json.loads that replaces the decoded lessons
+        with the shared ones'''
+        if frozenset(obj) in self.field_sets:
+            return self.get(**obj)
+        return obj
+
+    def __len__(self) -> int:
+        return len(self.lessons)
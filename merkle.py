@@ -0,0 +1,68 @@
+import hashlib
+from encoder import NoWSEncoder
+
+
+class HashTree:
+    '''Builds and compares hash trees of nested data: every list or
+    dictionary down to a given depth is a node whose hash is computed
+    from its children's hashes, everything below is a leaf.
+    Leaves are stored as hash strings, nodes as [hash, children] pairs,
+    where children are a list or a dictionary of the child nodes.
+    Equal hashes mean equal subtrees, so a diff only needs to descend
+    into the children whose hashes differ'''
+
+    # Hex digits of a hash that are kept
+    hash_len = 16
+
+    def __init__(self, canon: NoWSEncoder = None):
+        '''Initializes self. `canon` is the encoder of the leaves,
+        it has to sort the keys of dictionaries'''
+        self.canon = canon if canon is not None else \
+            NoWSEncoder(sort_keys=True)
+
+    def digest(self, text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()[:self.hash_len]
+
+    def build(self, value, depth: int):
+        '''Returns the tree of a value with `depth` levels of nodes'''
+        if depth > 0 and isinstance(value, list):
+            return self.node([self.build(i, depth - 1) for i in value])
+        if depth > 0 and isinstance(value, dict):
+            return self.node({k: self.build(v, depth - 1)
+                              for k, v in value.items()})
+        return self.digest(self.canon.encode(value))
+
+    def node(self, children):
+        '''Returns a node with the given children (a list or a dictionary
+        of trees)'''
+        if isinstance(children, dict):
+            hashes = [[k, self.root(v)] for k, v in sorted(children.items())]
+        else:
+            hashes = [self.root(i) for i in children]
+        return [self.digest(self.canon.encode(hashes)), children]
+
+    @staticmethod
+    def root(tree) -> str:
+        '''Returns the hash of a tree or None if there's no tree'''
+        if tree is None or isinstance(tree, str):
+            return tree
+        return tree[0]
+
+    @staticmethod
+    def child(tree, key):
+        '''Returns the subtree by a list index or a dictionary key or None
+        if there's no such subtree'''
+        if tree is None or isinstance(tree, str):
+            return None
+
+        children = tree[1]
+        if isinstance(children, dict):
+            return children.get(key)
+        if isinstance(key, int) and 0 <= key < len(children):
+            return children[key]
+        return None
+
+    @classmethod
+    def same(cls, old, new) -> bool:
+        '''Checks whether two trees are known to be equal'''
+        return old is not None and cls.root(old) == cls.root(new)
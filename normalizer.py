@@ -0,0 +1,66 @@
+import re
+
+
+class Normalizer:
+    '''Brings gathered data to a canonical form before diffing.
+    Collections without a meaningful order are sorted and free text is
+    cleaned up, so that equal data always compares and encodes equally'''
+
+    space_ptn = re.compile('\\s+')
+
+    def normalize(self, cmd: str, data):
+        '''Normalizes data gathered by a given command. Data of commands
+        without a normalization step and None are returned as is'''
+        if data is None:
+            return None
+
+        try:
+            norm = getattr(self, 'norm_' + cmd)
+        except AttributeError:
+            return data
+
+        return norm(data)
+
+    @staticmethod
+    def room_key(room: str):
+        '''Sorting key for room numbers'''
+        return (len(room), room)
+
+    def clean_text(self, text: str) -> str:
+        '''Strips the text and collapses whitespace sequences'''
+        return self.space_ptn.sub(' ', text).strip()
+
+    def norm_class_list(self, data: dict) -> dict:
+        return {form: sorted(classes) for form, classes in data.items()}
+
+    def norm_vacant_rooms(self, data: list) -> list:
+        for day in data:
+            for lesson in day:
+                for floor, rooms in lesson.items():
+                    lesson[floor] = sorted(rooms, key=self.room_key)
+
+        return data
+
+    def norm_teachers(self, data: list) -> list:
+        for tchr in data:
+            if tchr.get('classes') is not None:
+                tchr['classes'] = sorted(set(tchr['classes']))
+
+        return data
+
+    def norm_changes(self, data: list) -> list:
+        reserved = {'day', 'month', 'wkday'}
+        for day in data:
+            for cls, items in day.items():
+                if cls in reserved or items is None:
+                    continue
+                day[cls] = [self.clean_text(i) for i in items]
+
+        return data
+
+    def norm_class_teachers(self, data: dict) -> dict:
+        for cls, teachers in data.items():
+            teachers.sort(key=lambda i: (i['subject'] or '',
+                                         i['teacher'] or ''))
+
+        return data
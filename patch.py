@@ -0,0 +1,188 @@
+from typing import Iterable, Tuple
+
+
+# Fields that identify the items of lists in the data of every command,
+# by the JSON Pointer of the list ('*' matches any token). Other lists
+# are compared item by item
+list_keys = {'teachers': {'': ('abbr',)},
+             'teacher_timetables': {'': ('abbr',)},
+             'changes': {'': ('day', 'month')}}
+
+
+class PatchEngine:
+    '''Computes the difference between two JSON values as a list of
+    JSON Patch (RFC 6902) operations: add, remove and replace.
+    Paths are JSON Pointers (RFC 6901); the operations are applied
+    in order, so list indices refer to the list as it is after
+    the previous operations.
+    Items of the lists with key fields are matched by them, so that
+    removing an item doesn't show up as a change of every next one'''
+
+    def __init__(self, list_keys: dict = None):
+        '''Initializes self. `list_keys` maps JSON Pointers of lists to
+        the fields that identify their items'''
+        self.list_keys = {}
+        for pointer, fields in (list_keys or {}).items():
+            self.list_keys[tuple(self.tokens(pointer))] = tuple(fields)
+
+    @staticmethod
+    def escape(token) -> str:
+        return str(token).replace('~', '~0').replace('/', '~1')
+
+    @staticmethod
+    def tokens(pointer: str) -> list:
+        '''Splits a JSON Pointer into its unescaped tokens'''
+        if not pointer:
+            return []
+        return [i.replace('~1', '/').replace('~0', '~')
+                for i in pointer.split('/')[1:]]
+
+    def join(self, path: str, token) -> str:
+        return '{}/{}'.format(path, self.escape(token))
+
+    def key_fields(self, path: str) -> tuple:
+        '''Returns the key fields of the list at a path or None'''
+        tokens = self.tokens(path)
+        for pattern, fields in self.list_keys.items():
+            if len(pattern) == len(tokens) and all(
+                    i == '*' or i == j for i, j in zip(pattern, tokens)):
+                return fields
+        return None
+
+    @staticmethod
+    def item_key(item, idx: int, fields: tuple):
+        '''Returns the key of a list item, items without the key fields
+        are identified by their position'''
+        if isinstance(item, dict) and all(i in item for i in fields):
+            return tuple(item[i] for i in fields)
+        return ('#', idx)
+
+    def diff(self, old, new, path: str = '') -> list:
+        '''Returns the operations that turn `old` into `new`'''
+        if old == new:
+            return []
+        if isinstance(old, dict) and isinstance(new, dict):
+            return self.diff_dict(old, new, path)
+        if isinstance(old, list) and isinstance(new, list):
+            fields = self.key_fields(path)
+            if fields is not None:
+                return self.diff_keyed(old, new, path, fields)
+            return self.diff_list(old, new, path)
+
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    @staticmethod
+    def kept(ops: list, path: str) -> bool:
+        '''Checks whether a member at a path is at least partly kept,
+        given the operations on it'''
+        return len(ops) != 1 or ops[0]['path'] != path
+
+    def diff_dict(self, old: dict, new: dict, path: str) -> list:
+        return self.diff_members(path, list(old), list(new.items()), old,
+                                 ordered=False)
+
+    def diff_list(self, old: list, new: list, path: str) -> list:
+        ops = []
+        kept = 0
+        for idx in range(min(len(old), len(new))):
+            item_path = self.join(path, idx)
+            item_ops = self.diff(old[idx], new[idx], item_path)
+            ops.extend(item_ops)
+            kept += self.kept(item_ops, item_path)
+
+        for idx in reversed(range(len(new), len(old))):
+            ops.append({'op': 'remove', 'path': self.join(path, idx)})
+        for idx in range(len(old), len(new)):
+            ops.append({'op': 'add', 'path': self.join(path, idx),
+                        'value': new[idx]})
+
+        # Containers that changed as a whole are replaced
+        if not kept and len(ops) > 1:
+            return [{'op': 'replace', 'path': path, 'value': new}]
+        return ops
+
+    def diff_keyed(self, old: list, new: list, path: str,
+                   fields: tuple) -> list:
+        old_keys = [self.item_key(item, idx, fields)
+                    for idx, item in enumerate(old)]
+        new_keys = [self.item_key(item, idx, fields)
+                    for idx, item in enumerate(new)]
+        if (len(set(old_keys)) != len(old_keys) or
+                len(set(new_keys)) != len(new_keys)):
+            return self.diff_list(old, new, path)
+
+        return self.diff_members(path, old_keys, list(zip(new_keys, new)),
+                                 dict(zip(old_keys, old)), ordered=True)
+
+    def diff_members(self, path: str, old_keys: list,
+                     new_items: Iterable[Tuple], old_values: dict,
+                     ordered: bool) -> list:
+        '''Returns the operations that turn a dictionary (or a list whose
+        items are identified by keys if `ordered` is True) with the keys
+        `old_keys` into one with the given (key, value) pairs.
+        `old_values` holds the old values of the members that might have
+        changed, the rest of the members present in both are unchanged'''
+        new_items = list(new_items)
+        new_keys = {key for key, value in new_items}
+        old_set = set(old_keys)
+
+        ops = []
+        for idx in reversed(range(len(old_keys))):
+            if old_keys[idx] not in new_keys:
+                token = idx if ordered else old_keys[idx]
+                ops.append({'op': 'remove', 'path': self.join(path, token)})
+
+        if ordered and ([i for i in old_keys if i in new_keys] !=
+                        [key for key, value in new_items if key in old_set]):
+            # The items were reordered
+            return [{'op': 'replace', 'path': path,
+                     'value': [value for key, value in new_items]}]
+
+        kept = 0
+        for idx, (key, value) in enumerate(new_items):
+            item_path = self.join(path, idx if ordered else key)
+            if key not in old_set:
+                ops.append({'op': 'add', 'path': item_path, 'value': value})
+            elif key in old_values:
+                item_ops = self.diff(old_values[key], value, item_path)
+                ops.extend(item_ops)
+                kept += self.kept(item_ops, item_path)
+            else:
+                kept += 1
+
+        if not kept and len(ops) > 1:
+            value = [i[1] for i in new_items] if ordered else dict(new_items)
+            return [{'op': 'replace', 'path': path, 'value': value}]
+        return ops
+
+    @classmethod
+    def apply(cls, doc, ops: list):
+        '''Applies operations to a document in place (the document itself
+        is replaced by an operation on the root). Returns the document'''
+        for op in ops:
+            tokens = cls.tokens(op['path'])
+            if not tokens:
+                if op['op'] == 'remove':
+                    doc = None
+                else:
+                    doc = op['value']
+                continue
+
+            parent = doc
+            for token in tokens[:-1]:
+                parent = parent[int(token) if isinstance(parent, list)
+                                else token]
+
+            last = tokens[-1]
+            if isinstance(parent, list):
+                last = len(parent) if last == '-' else int(last)
+                if op['op'] == 'add':
+                    parent.insert(last, op['value'])
+                    continue
+
+            if op['op'] == 'remove':
+                del parent[last]
+            else:
+                parent[last] = op['value']
+
+        return doc
@@ -0,0 +1,122 @@
+from typing import Tuple
+import datetime
+import json
+import time
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+class PollingPolicy:
+    '''Decides how often to poll the upstream server based on the stored
+    study plan and rings timetable: often during school hours on study
+    days, rarely after hours and not at all on holidays'''
+
+    # Same order as in `Calendar.months_order`
+    months = [9, 10, 11, 12, 1, 2, 3, 4, 5, 6]
+    school_days = {'study', 'session'}
+
+    busy_interval = 15 * MINUTE
+    idle_interval = 2 * HOUR
+    # How long before the first lesson polling becomes frequent
+    morning_margin = HOUR
+    default_hours = (8 * 60, 16 * 60)
+    reload_interval = HOUR
+
+    commands = {'changes', 'vacant_rooms'}
+
+    def __init__(self, storage, utc_offset: int = 5):
+        '''Initializes self. `storage` is a mapping-like object with
+        the stored study plan and rings timetable. `utc_offset` is
+        the school's time zone (Yekaterinburg by default)'''
+        self.storage = storage
+        self.tz = datetime.timezone(datetime.timedelta(hours=utc_offset))
+        self.loaded = None
+        self.plan = None
+        self.hours = self.default_hours
+
+    def load(self, now: float):
+        '''Reloads the study plan and the rings timetable from the storage
+        if they were loaded too long ago'''
+        if self.loaded is not None and now - self.loaded < self.reload_interval:
+            return
+        self.loaded = now
+
+        try:
+            self.plan = json.loads(self.storage['study_plan'])
+        except KeyError:
+            self.plan = None
+
+        try:
+            rings = json.loads(self.storage['rings_timetable'])
+        except KeyError:
+            rings = None
+        self.hours = self.school_hours(rings)
+
+    def school_hours(self, rings: list) -> Tuple[int, int]:
+        '''Returns the start and the end of the lessons in minutes
+        since midnight'''
+        lessons = [i for i in rings or [] if i['type'] == 'lesson']
+        if not lessons:
+            return self.default_hours
+
+        def minutes(hhmm: str) -> int:
+            hours, mins = hhmm.split(':')
+            return int(hours) * 60 + int(mins)
+
+        return minutes(lessons[0]['start']), minutes(lessons[-1]['end'])
+
+    def day_type(self, date: datetime.date) -> str:
+        '''Returns the type of a day from the study plan: "study",
+        "session", "holidays", or None for days outside of the plan.
+        Weekends are of the type "weekend"'''
+        try:
+            month = self.plan[self.months.index(date.month)]
+        except (TypeError, ValueError, IndexError):
+            return None
+
+        for day in month:
+            if day is not None and day['num'] == date.day:
+                if day.get('wknd'):
+                    return 'weekend'
+                return day['type']
+
+        return None
+
+    def is_school_day(self, date: datetime.date) -> bool:
+        return self.day_type(date) in self.school_days
+
+    def interval(self, cmd: str, now: float = None) -> float:
+        '''Returns the polling interval for a command at a given time in
+        seconds or None if the command shouldn't be run at the moment.
+        If the study plan is unknown, polling is always frequent'''
+        if now is None:
+            now = time.time()
+        self.load(now)
+
+        dt = datetime.datetime.fromtimestamp(now, self.tz)
+        today = dt.date()
+        tomorrow = today + datetime.timedelta(days=1)
+
+        if cmd == 'vacant_rooms':
+            if self.plan is not None and not self.is_school_day(today):
+                return None
+            return DAY
+
+        if self.plan is None:
+            return self.busy_interval
+
+        # Changes are published in advance, so the day before a school day
+        # is polled as well
+        if not self.is_school_day(today):
+            if self.is_school_day(tomorrow):
+                return self.idle_interval
+            return None
+
+        start, end = self.hours
+        minute = dt.hour * 60 + dt.minute
+        if start - self.morning_margin // MINUTE <= minute < end:
+            return self.busy_interval
+        return self.idle_interval
@@ -1,6 +1,22 @@
 import unittest
 from __tests__.test_gatherer import TestDataGatherer
-from __tests__.test_diff_computer import TestDiffComputer
-from __tests__.test_storage import TestStorage
+from __tests__.test_diff_computer import TestDiffComputer, TestShardedDiffComputer, TestPatchDiffComputer
+from __tests__.test_storage import TestStorage, TestMemoryStorage
+from __tests__.test_fetcher import TestFetchEngine
+from __tests__.test_session import TestApiSession
+from __tests__.test_indexes import TestTeacherIndex, TestRoomOccupancy, TestStaffIndex
+from __tests__.test_cache import TestResponseCache, TestFingerprints
+from __tests__.test_normalizer import TestNormalizer
+from __tests__.test_scheduler import TestScheduler
+from __tests__.test_polling import TestPollingPolicy
+from __tests__.test_data_updater import TestDataUpdater
+from __tests__.test_html_parsers import TestChangesParser, TestStaffParser
+from __tests__.test_throttle import TestTokenBucket, TestCircuitBreaker, TestEndpointStats
+from __tests__.test_checkpoint import TestCheckpoints
+from __tests__.test_merkle import TestHashTree
+from __tests__.test_patch import TestPatchEngine
+from __tests__.test_compact import TestCompactEncoder
+from __tests__.test_lessons import TestLessonPool
+from __tests__.test_serializer import TestSerializer
 
 unittest.main()
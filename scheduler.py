@@ -0,0 +1,187 @@
+from typing import Callable, Iterable
+import datetime
+import json
+import logging
+import random
+import time
+
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+class Job:
+    '''A command that is run periodically'''
+
+    def __init__(self, cmd: str, interval: float,
+                 jitter: float = 0,
+                 weekdays: Iterable[int] = None,
+                 months: Iterable[int] = None,
+                 follows: str = None):
+        '''Initializes self. Requires the command and the interval in
+        seconds. Every run is delayed by a random amount of seconds up to
+        `jitter`. If `weekdays` (0 is Monday) or `months` (1 is January)
+        are given, the job is only run on those days or months.
+        If the job `follows` another command, it's run right after every
+        successful run of that command instead of at its own interval
+        (the interval is kept for the case the command is not scheduled)'''
+        self.cmd = cmd
+        self.interval = interval
+        self.jitter = jitter
+        self.follows = follows
+        self.weekdays = set(weekdays) if weekdays is not None else None
+        self.months = set(months) if months is not None else None
+
+    def allowed(self, now: float, tz: datetime.tzinfo = None) -> bool:
+        '''Checks whether the job may run at a given time. Days and months
+        are those of the time zone `tz`, the local one if it's None'''
+        date = datetime.datetime.fromtimestamp(now, tz)
+        if self.weekdays is not None and date.weekday() not in self.weekdays:
+            return False
+        if self.months is not None and date.month not in self.months:
+            return False
+        return True
+
+    def next_run(self, last: float, rand: random.Random) -> float:
+        '''Returns the time of the next run after a run at `last`'''
+        return last + self.interval + rand.uniform(0, self.jitter)
+
+
+class AdaptiveJob(Job):
+    '''A job whose interval is decided by a polling policy
+    (see `polling.PollingPolicy`) at the time of every run'''
+
+    def __init__(self, cmd: str, policy, jitter: float = 0, **kwargs):
+        '''Initializes self. `policy.interval(cmd, now)` must return
+        the interval in seconds or None if the job shouldn't run.
+        Other keyword arguments are the same as for Job'''
+        super().__init__(cmd, policy.busy_interval, jitter=jitter, **kwargs)
+        self.policy = policy
+
+    def allowed(self, now: float, tz: datetime.tzinfo = None) -> bool:
+        return (super().allowed(now, tz) and
+                self.policy.interval(self.cmd, now) is not None)
+
+    def next_run(self, last: float, rand: random.Random) -> float:
+        interval = self.policy.interval(self.cmd, last)
+        if interval is None:
+            interval = self.interval
+        return last + interval + rand.uniform(0, self.jitter)
+
+
+class Scheduler:
+    '''Runs jobs in a single long-running process.
+    Times of the last runs are saved to the storage, so restarting
+    the process doesn't rerun the jobs that are not due'''
+
+    # Update intervals from the README
+    default_jobs = [Job('changes', 15 * MINUTE, jitter=MINUTE),
+                    Job('full_perm_timetable', DAY, jitter=30 * MINUTE),
+                    # Updates the teachers marked by the timetables job
+                    Job('teacher_timetables', DAY,
+                        follows='full_perm_timetable'),
+                    Job('vacant_rooms', DAY, jitter=30 * MINUTE,
+                        weekdays=range(6)),
+                    Job('teachers', 30 * DAY, jitter=HOUR),
+                    Job('class_teachers', 30 * DAY, jitter=HOUR),
+                    Job('study_plan', 7 * DAY, jitter=HOUR,
+                        months=(9, 10)),
+                    Job('rings_timetable', 300 * DAY, jitter=HOUR,
+                        months=(9,)),
+                    Job('class_list', 300 * DAY, jitter=HOUR,
+                        months=(9,))]
+
+    state_key = 'scheduler/last_run'
+    retry_delay = 10 * MINUTE
+    max_sleep = MINUTE
+
+    def __init__(self, run: Callable, storage,
+                 jobs: list = None,
+                 clock: Callable = time.time,
+                 sleep: Callable = time.sleep,
+                 rand: random.Random = None,
+                 log: logging.Logger = None,
+                 tz: datetime.tzinfo = None):
+        '''Initializes self. `run` is called with a command name to run
+        a job, `storage` is a mapping-like object to keep the state in.
+        Days and months of the jobs are those of the time zone `tz`
+        (the local one if it's not given), it should be the same as
+        the polling policy's'''
+        self.run = run
+        self.storage = storage
+        self.jobs = jobs if jobs is not None else self.default_jobs
+        self.clock = clock
+        self.sleep = sleep
+        self.rand = rand if rand is not None else random.Random()
+        self.log = log if log is not None else logging.Logger('Scheduler')
+        self.tz = tz
+
+        try:
+            self.last_run = json.loads(self.storage[self.state_key])
+        except KeyError:
+            self.last_run = {}
+
+        # Jobs that have never run are due immediately
+        self.due = {}
+        for job in self.jobs:
+            last = self.last_run.get(job.cmd)
+            if last is None:
+                self.due[job.cmd] = self.clock()
+            else:
+                self.due[job.cmd] = self.next_run(job, last)
+
+    def chained(self, job: Job) -> bool:
+        '''Checks whether a job is run after the job that it follows'''
+        return (job.follows is not None and
+                any(i.cmd == job.follows for i in self.jobs))
+
+    def next_run(self, job: Job, last: float) -> float:
+        '''Returns the time of the next run of a job after a run at `last`.
+        Chained jobs are not due until the job they follow runs'''
+        if self.chained(job):
+            return float('inf')
+        return job.next_run(last, self.rand)
+
+    def run_job(self, job: Job, now: float):
+        '''Runs a job and schedules its next run. The jobs that follow it
+        are run right after it succeeds'''
+        self.log.info('running {}'.format(job.cmd))
+        try:
+            self.run(job.cmd)
+        except Exception:
+            self.log.exception('{} failed'.format(job.cmd))
+            self.due[job.cmd] = now + min(job.interval, self.retry_delay)
+            return
+
+        self.last_run[job.cmd] = now
+        self.storage[self.state_key] = json.dumps(self.last_run)
+        self.due[job.cmd] = self.next_run(job, now)
+
+        for follower in self.jobs:
+            if follower.follows == job.cmd:
+                now = self.clock()
+                if follower.allowed(now, self.tz):
+                    self.run_job(follower, now)
+
+    def run_pending(self) -> float:
+        '''Runs the jobs that are due. Returns the time until
+        the next job is due'''
+        for job in self.jobs:
+            now = self.clock()
+            if self.due[job.cmd] > now:
+                continue
+
+            if job.allowed(now, self.tz):
+                self.run_job(job, now)
+            else:
+                # Check again later, the job stays overdue
+                self.due[job.cmd] = now + self.max_sleep
+
+        return max(0, min(self.due.values()) - self.clock())
+
+    def run_forever(self):
+        '''Runs the jobs until the process is stopped'''
+        self.log.info('scheduler started')
+        while True:
+            self.sleep(min(self.run_pending(), self.max_sleep))
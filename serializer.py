@@ -0,0 +1,62 @@
+import json
+from encoder import NoWSEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Serializer:
+    '''JSON backend of the standard library. Encoders have the interface
+    of json.JSONEncoder and produce the same output in every backend,
+    so stored hashes don't change when the backend does'''
+    name = 'json'
+
+    def encoder(self, sort_keys: bool = False):
+        '''Returns an encoder without whitespace, sorting the keys of
+        dictionaries if `sort_keys` is True'''
+        return NoWSEncoder(sort_keys=sort_keys)
+
+    def loads(self, text: str, object_hook=None):
+        return json.loads(text, object_hook=object_hook)
+
+
+class OrjsonEncoder:
+    '''Encoder based on orjson with the interface of NoWSEncoder'''
+
+    def __init__(self, sort_keys: bool = False):
+        self.option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            self.option |= orjson.OPT_SORT_KEYS
+
+    def encode(self, value) -> str:
+        return orjson.dumps(value, option=self.option).decode()
+
+
+class OrjsonSerializer(Serializer):
+    '''JSON backend based on orjson. orjson has no object hooks, so
+    decoding with a hook falls back to the standard library'''
+    name = 'orjson'
+
+    def encoder(self, sort_keys: bool = False) -> OrjsonEncoder:
+        return OrjsonEncoder(sort_keys=sort_keys)
+
+    def loads(self, text: str, object_hook=None):
+        if object_hook is not None:
+            return super().loads(text, object_hook=object_hook)
+        return orjson.loads(text)
+
+
+# Backends by name, those that can't be imported are left out
+backends = {'json': Serializer}
+if orjson is not None:
+    backends['orjson'] = OrjsonSerializer
+
+
+def get_serializer(name: str = None) -> Serializer:
+    '''Returns the backend with the given name or the fastest available
+    one. Raises KeyError if the backend is not available'''
+    if name is None:
+        name = 'orjson' if 'orjson' in backends else 'json'
+    return backends[name]()
@@ -0,0 +1,237 @@
+from collections import namedtuple
+from typing import Callable, Tuple
+from urllib.parse import urlparse, parse_qs
+import logging
+import threading
+import time
+import requests
+import requests.adapters
+from cache import ResponseCache
+from throttle import CircuitBreaker, CircuitOpen, EndpointStats, TokenBucket
+
+
+# Timeout is a (connect, read) pair in seconds, `backoff` is the delay before
+# the first retry, doubled for every next one
+Policy = namedtuple('Policy', ['timeout', 'retries', 'backoff'])
+
+
+class ApiSession:
+    '''Shared HTTP session for the SESC server. Keeps keep-alive connections
+    pooled and applies a timeout and a retry policy for every endpoint.
+    Requests to every host are rate-limited and stop being sent while
+    the host keeps failing (see `throttle`)'''
+
+    # `f` parameter of the mobile API to the endpoint name
+    api_endpoints = {'1': 'perm_timetable',
+                     '2': 'teacher_timetable',
+                     '3': 'occupied_rooms',
+                     '4': 'class_list',
+                     '6': 'room_list',
+                     '7': 'teacher_list'}
+    path_endpoints = {'/study/izmenHtml.php': 'changes',
+                      '/study/calgraf.odt': 'study_plan',
+                      '/study/': 'rings_timetable',
+                      '/offic/': 'staff'}
+
+    default_policies = {'perm_timetable': Policy((3.05, 15), 3, 0.5),
+                        'teacher_timetable': Policy((3.05, 15), 3, 0.5),
+                        'occupied_rooms': Policy((3.05, 15), 3, 0.5),
+                        'class_list': Policy((3.05, 10), 3, 0.5),
+                        'room_list': Policy((3.05, 10), 3, 0.5),
+                        'teacher_list': Policy((3.05, 10), 3, 0.5),
+                        'changes': Policy((3.05, 10), 2, 0.5),
+                        'study_plan': Policy((3.05, 30), 3, 1),
+                        'rings_timetable': Policy((3.05, 10), 3, 0.5),
+                        'staff': Policy((3.05, 20), 3, 0.5),
+                        None: Policy((3.05, 15), 2, 0.5)}
+
+    retry_statuses = {500, 502, 503, 504}
+
+    def __init__(self, policies: dict = None,
+                 pool_size: int = 8,
+                 cache: ResponseCache = None,
+                 rate: float = 10,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 60,
+                 sleep: Callable = time.sleep,
+                 clock: Callable = time.monotonic,
+                 log: logging.Logger = None):
+        '''Initializes self. `policies` maps endpoint names to Policy objects
+        and overrides the default ones. `pool_size` is the amount of
+        connections kept alive per host. If `cache` is given, successful
+        responses are cached and served from it.
+        `rate` is the maximum amount of requests per second to a host,
+        None disables the limit. After `failure_threshold` requests in
+        a row fail (after their retries), the host's circuit opens for
+        `reset_timeout` seconds'''
+        self.policies = dict(self.default_policies)
+        if policies is not None:
+            self.policies.update(policies)
+
+        self.cache = cache
+        self.rate = rate
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.log = log if log is not None else logging.Logger('ApiSession')
+
+        self.limiters = {}
+        self.breakers = {}
+        self.hosts_lock = threading.Lock()
+        self.stats = EndpointStats()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4,
+                                                pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def endpoint(self, url: str) -> str:
+        '''Returns the name of the endpoint a URL belongs to or None if
+        the endpoint is unknown'''
+        parsed = urlparse(url)
+        if parsed.path.endswith('/mobile.php'):
+            func = parse_qs(parsed.query).get('f', [None])[0]
+            return self.api_endpoints.get(func)
+
+        return self.path_endpoints.get(parsed.path)
+
+    def policy(self, url: str) -> Policy:
+        '''Returns the policy for a given URL'''
+        return self.policies.get(self.endpoint(url), self.policies[None])
+
+    def host(self, url: str) -> Tuple[TokenBucket, CircuitBreaker]:
+        '''Returns the rate limiter (None if there's no limit) and
+        the circuit breaker for the host of a URL'''
+        host = urlparse(url).netloc
+        with self.hosts_lock:
+            if host not in self.breakers:
+                if self.rate is not None:
+                    self.limiters[host] = TokenBucket(self.rate,
+                                                      burst=self.pool_size,
+                                                      clock=self.clock,
+                                                      sleep=self.sleep)
+                self.breakers[host] = CircuitBreaker(self.failure_threshold,
+                                                     self.reset_timeout,
+                                                     clock=self.clock)
+            return self.limiters.get(host), self.breakers[host]
+
+    def is_open(self, url: str) -> bool:
+        '''Checks whether requests to the host of a URL are being skipped
+        because it kept failing'''
+        return self.host(url)[1].is_open()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        '''Sends a request, using the cache if there is one.
+        A fresh cached response is returned without contacting the server.
+        If the server fails (an exception or a 5xx response), a stale
+        cached response is returned instead of the failure if there is one.
+        Other responses, e.g. 304 Not Modified to a conditional request,
+        are returned as they are'''
+        endpoint = self.endpoint(url)
+        if self.cache is None or not self.cache.ttl(endpoint):
+            return self.send(method, url, **kwargs)
+
+        key = self.cache.key(method, url, kwargs.get('data'))
+        resp = self.cache.get(key, endpoint)
+        if resp is not None:
+            self.log.debug('cache hit for {}'.format(url))
+            return resp
+
+        try:
+            resp = self.send(method, url, **kwargs)
+        except requests.RequestException:
+            stale = self.cache.get(key, endpoint, stale=True)
+            if stale is None:
+                raise
+            self.log.warning('serving stale {}'.format(url))
+            return stale
+
+        if resp.status_code == 200:
+            self.cache.put(key, resp)
+            return resp
+        if resp.status_code == 304:
+            self.cache.refresh(key, kwargs.get('headers'))
+            return resp
+        if resp.status_code < 500:
+            return resp
+
+        stale = self.cache.get(key, endpoint, stale=True)
+        if stale is None:
+            return resp
+        self.log.warning('serving stale {}'.format(url))
+        return stale
+
+    def send(self, method: str, url: str, **kwargs) -> requests.Response:
+        '''Sends a request according to the endpoint's policy.
+        Connection errors, timeouts and 5xx responses are retried with
+        an exponential backoff. After the last attempt the response is
+        returned as is or the exception is raised.
+        Raises CircuitOpen without sending anything if the host's
+        circuit is open'''
+        endpoint = self.endpoint(url)
+        policy = self.policy(url)
+        limiter, breaker = self.host(url)
+        kwargs.setdefault('timeout', policy.timeout)
+
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                delay = policy.backoff * 2 ** (attempt - 1)
+                self.log.warning('retrying {} in {}s'.format(url, delay))
+                self.sleep(delay)
+
+            if not breaker.allow():
+                raise CircuitOpen('circuit is open, skipping {}'.format(url))
+            if limiter is not None:
+                limiter.acquire()
+
+            start = self.clock()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.attempted(endpoint, start, False, limiter)
+                if attempt == policy.retries:
+                    self.failed(breaker)
+                    raise
+                continue
+
+            ok = resp.status_code not in self.retry_statuses
+            self.attempted(endpoint, start, ok, limiter)
+            if ok:
+                breaker.success()
+                break
+        else:
+            self.failed(breaker)
+
+        return resp
+
+    def attempted(self, endpoint: str, start: float, ok: bool,
+                  limiter: TokenBucket):
+        '''Records the outcome of an attempt that started at `start`'''
+        self.stats.record(endpoint, self.clock() - start, ok)
+        if limiter is None:
+            return
+        if ok:
+            limiter.success()
+        else:
+            limiter.failure()
+
+    def failed(self, breaker: CircuitBreaker):
+        '''Records a request that failed after all of its attempts'''
+        was_open = breaker.is_open()
+        breaker.failure()
+        if breaker.is_open() and not was_open:
+            self.log.error('too many failures, circuit is open '
+                           'for {}s'.format(self.reset_timeout))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        '''Closes the pooled connections'''
+        self.session.close()
@@ -1,4 +1,14 @@
+from typing import Iterable
+import hashlib
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+
+def content_hash(value: str) -> str:
+    '''Returns the hash that is stored next to a value'''
+    return hashlib.sha256(str(value).encode()).hexdigest()
+
 
 class Storage:
     '''Key-value storage using the PostgreSQL database with a
@@ -6,39 +16,125 @@ class Storage:
 
     def __init__(self, host: str, dbname: str, user: str, password: str):
         '''Establishes a database connection, creates a table if necessary'''
-        self.db = psycopg2.connect(host=host,
-                                   dbname=dbname,
-                                   user=user,
-                                   password=password)
+        self.params = {'host': host,
+                       'dbname': dbname,
+                       'user': user,
+                       'password': password}
+        self.db = psycopg2.connect(**self.params)
         c = self.db.cursor()
         c.execute('''CREATE TABLE IF NOT EXISTS storage (key text PRIMARY KEY,
-                                                         value text)''')
+                                                         value text,
+                                                         hash text)''')
+        c.execute('''ALTER TABLE storage ADD COLUMN IF NOT EXISTS hash text''')
         self.db.commit()
         c.close()
 
-    def get(self, key: str) -> str:
-        '''Returns a value by key given as a string'''
+    def ensure_connection(self):
+        '''Reconnects to the database if the connection was lost and
+        ends a transaction that was left aborted.
+        Long-running processes call it before using the storage'''
+        if self.db.closed:
+            self.db = psycopg2.connect(**self.params)
+        elif (self.db.get_transaction_status() ==
+                psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+            self.db.rollback()
+
+    def query(self, query: str, args: tuple) -> list:
+        '''Runs a read-only query and returns the rows. The transaction is
+        ended right away, so the connection is not left idle in it
+        between the updates or aborted if the query fails'''
         c = self.db.cursor()
-        c.execute('''SELECT value FROM storage WHERE key = %s''', (key,))
         try:
-            value = c.fetchone()[0]
-        except TypeError:
+            c.execute(query, args)
+            return c.fetchall()
+        finally:
+            c.close()
+            if not self.db.closed:
+                self.db.rollback()
+
+    def get(self, key: str) -> str:
+        '''Returns a value by key given as a string'''
+        rows = self.query('''SELECT value FROM storage WHERE key = %s''',
+                          (key,))
+        if not rows:
             raise KeyError('no value with this key: {}'.format(key))
-        c.close()
-        return value
+        return rows[0][0]
+
+    def get_hash(self, key: str) -> str:
+        '''Returns the hash of a value by key without reading the value.
+        Returns None for values stored before hashes were introduced'''
+        rows = self.query('''SELECT hash FROM storage WHERE key = %s''',
+                          (key,))
+        if not rows:
+            raise KeyError('no value with this key: {}'.format(key))
+        return rows[0][0]
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        '''Returns a dictionary of values for the given keys in one query.
+        Keys that are not in the storage are left out'''
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        return dict(self.query('''SELECT key, value FROM storage
+                                  WHERE key = ANY(%s)''', (keys,)))
 
     def set(self, key: str, value: str):
         '''Sets the given key to the given value'''
         c = self.db.cursor()
-        c.execute('''SELECT value FROM storage WHERE key = %s''', (key,))
-        if c.fetchone() is None:
-            c.execute('''INSERT INTO storage
-                         VALUES (%s, %s)''', (key, str(value)))
-        else:
-            c.execute('''UPDATE storage SET value = %s
-                         WHERE key = %s''', (str(value), key))
-        self.db.commit()
-        c.close()
+        try:
+            c.execute('''INSERT INTO storage VALUES (%s, %s, %s)
+                         ON CONFLICT (key)
+                         DO UPDATE SET value = EXCLUDED.value,
+                                       hash = EXCLUDED.hash''',
+                      (key, str(value), content_hash(value)))
+            self.db.commit()
+        except psycopg2.Error:
+            self.db.rollback()
+            raise
+        finally:
+            c.close()
+
+    def set_many(self, items: dict):
+        '''Sets every key of a dictionary to its value
+        in one statement and one transaction'''
+        if not items:
+            return
+
+        c = self.db.cursor()
+        try:
+            psycopg2.extras.execute_values(
+                c,
+                '''INSERT INTO storage VALUES %s
+                   ON CONFLICT (key)
+                   DO UPDATE SET value = EXCLUDED.value,
+                                 hash = EXCLUDED.hash''',
+                [(key, str(value), content_hash(value))
+                 for key, value in items.items()],
+                page_size=len(items))
+            self.db.commit()
+        except psycopg2.Error:
+            self.db.rollback()
+            raise
+        finally:
+            c.close()
+
+    def delete_many(self, keys: Iterable[str]):
+        '''Deletes the given keys in one statement. Missing keys
+        are ignored'''
+        keys = list(keys)
+        if not keys:
+            return
+
+        c = self.db.cursor()
+        try:
+            c.execute('''DELETE FROM storage WHERE key = ANY(%s)''', (keys,))
+            self.db.commit()
+        except psycopg2.Error:
+            self.db.rollback()
+            raise
+        finally:
+            c.close()
 
     def __getitem__(self, key: str) -> str:
         return self.get(key)
@@ -49,3 +145,41 @@ class Storage:
     def close(self):
         '''Closes the database connection'''
         self.db.close()
+
+
+class MemoryStorage(dict):
+    '''In-memory storage with the same interface as Storage.
+    Useful for tests and dry runs without a database'''
+
+    def get(self, key: str) -> str:
+        '''Returns a value by key given as a string'''
+        return self[key]
+
+    def get_hash(self, key: str) -> str:
+        '''Returns the hash of a value by key'''
+        return content_hash(self[key])
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        '''Returns a dictionary of values for the given keys.
+        Keys that are not in the storage are left out'''
+        return {key: self[key] for key in keys if key in self}
+
+    def set(self, key: str, value: str):
+        '''Sets the given key to the given value'''
+        self[key] = str(value)
+
+    def set_many(self, items: dict):
+        '''Sets every key of a dictionary to its value'''
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete_many(self, keys: Iterable[str]):
+        '''Deletes the given keys. Missing keys are ignored'''
+        for key in keys:
+            self.pop(key, None)
+
+    def ensure_connection(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,147 @@
+from typing import Callable
+import threading
+import time
+import requests
+
+
+class CircuitOpen(requests.ConnectionError):
+    '''Raised instead of sending a request to a host whose circuit is open.
+    It's a connection error, so it's handled like the server being down'''
+
+
+class TokenBucket:
+    '''Adaptive token-bucket rate limiter. Every request takes a token,
+    tokens are refilled at `rate` per second up to `burst`. Failures halve
+    the rate, successes bring it back up step by step'''
+
+    def __init__(self, rate: float = 10, burst: int = 8,
+                 min_rate: float = 0.5,
+                 clock: Callable = time.monotonic,
+                 sleep: Callable = time.sleep):
+        '''Initializes self with a full bucket'''
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        '''Takes a token, waiting for one if the bucket is empty.
+        Returns the time spent waiting'''
+        waited = 0
+        while True:
+            with self.lock:
+                self.refill(self.clock())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+
+            self.sleep(delay)
+            waited += delay
+
+    def success(self):
+        '''Raises the rate after a successful request'''
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def failure(self):
+        '''Halves the rate after a failed request'''
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+class CircuitBreaker:
+    '''Stops sending requests to a host after `threshold` failures in a row.
+    After `reset_timeout` seconds one trial request is let through:
+    the circuit closes if it succeeds and opens again if it fails'''
+
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half-open'
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 60,
+                 clock: Callable = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.state = self.closed
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        '''Checks whether a request may be sent'''
+        with self.lock:
+            if self.state == self.closed:
+                return True
+            if (self.state == self.open and
+                    self.clock() - self.opened >= self.reset_timeout):
+                self.state = self.half_open
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        return self.state != self.closed
+
+    def success(self):
+        with self.lock:
+            self.state = self.closed
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if (self.state == self.half_open or
+                    self.failures >= self.threshold):
+                self.state = self.open
+                self.opened = self.clock()
+
+
+class EndpointStats:
+    '''Latency and error statistics of the requests per endpoint'''
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float, ok: bool):
+        '''Records a request that took `latency` seconds'''
+        with self.lock:
+            try:
+                stat = self.stats[endpoint]
+            except KeyError:
+                stat = self.stats[endpoint] = {'requests': 0,
+                                               'errors': 0,
+                                               'total_latency': 0,
+                                               'max_latency': 0}
+            stat['requests'] += 1
+            stat['errors'] += not ok
+            stat['total_latency'] += latency
+            stat['max_latency'] = max(stat['max_latency'], latency)
+
+    def summary(self) -> dict:
+        '''Returns the amount of requests and errors and the average and
+        the maximum latency in seconds for every endpoint'''
+        with self.lock:
+            return {endpoint: {'requests': stat['requests'],
+                               'errors': stat['errors'],
+                               'avg_latency': (stat['total_latency'] /
+                                               stat['requests']),
+                               'max_latency': stat['max_latency']}
+                    for endpoint, stat in self.stats.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()